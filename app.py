@@ -1,16 +1,24 @@
 # app.py
-import os
-import io
 import math
 import base64
-import json
-import matplotlib.pyplot as plt
+import threading
+import uuid
+from matplotlib.figure import Figure
 import streamlit as st
 from io import BytesIO
-from typing import List, Dict, Any
 
 # --- your existing logic ---
-from vic import unified_answer  # must return a str
+from vic import VicEngine, get_engine  # cheap: the engine builds data/index lazily
+
+
+@st.cache_resource(show_spinner=False)
+def load_engine() -> VicEngine:
+    """One engine per process, shared by every session; warms the index in the background."""
+    engine = get_engine()
+    engine.serve_metrics()  # Prometheus /metrics when VIC_METRICS_PORT is set
+    engine.watch_dataset()  # hot-swap investment_updates.json when it changes
+    threading.Thread(target=engine.warm_up, daemon=True).start()
+    return engine
 
 # =========================
 # UI CONFIG
@@ -19,12 +27,32 @@ st.set_page_config(page_title="Investment Updates Chat", layout="centered")
 st.title("Investment Updates Chat")
 st.caption("Ask about a company or compare multiple companies. Beep + chart demo are in the sidebar.")
 
+engine = load_engine()
+
+CHART_KPIS = {
+    "revenue": "Latest Revenue",
+    "monthly_burn": "Monthly Burn",
+    "runway": "Runway (months)",
+    "current_cash_balance": "Cash Balance",
+    "customers": "Customers",
+}
+CHART_WINDOWS = {None: "All time", 3: "Last 3 months", 6: "Last 6 months", 12: "Last 12 months"}
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def kpi_chart_data(dataset_version: str, kpi: str, k: int, window_months):
+    """Top-k (company, value) pairs for the chart; cached per dataset version and options."""
+    return [(t[0], t[1]) for t in engine.kpi_series.top_k(kpi, k=k, window_months=window_months)]
+
 # =========================
 # SESSION STATE
 # =========================
 if "messages" not in st.session_state:
     st.session_state.messages = []  # [{role: "user"/"assistant", content: str}]
 
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex  # keys this browser session's chat memory
+
 if "sound_enabled" not in st.session_state:
     st.session_state.sound_enabled = True  # default ON
 
@@ -37,64 +65,51 @@ with st.sidebar:
 
     st.divider()
     st.subheader("Chart demo")
-    st.caption("Renders a simple chart using investment_updates.json (top 10 by latest revenue).")
+    st.caption("Renders a chart from the shared KPI store (top 10 by latest value).")
 
-    if st.button("Show revenue chart"):
-        try:
-            # Load your dataset (same file vic.py uses)
-            with open("investment_updates.json", "r", encoding="utf-8") as f:
-                payload = json.load(f)
-
-            def latest_revenue(entry: Dict[str, Any]):
-                updates = entry.get("investmentUpdates") or []
-                best = None
-                for u in updates:
-                    try:
-                        rev = u["kpis"].get("revenue")
-                        yr = u.get("receivedYear")
-                        mo = u.get("receivedMonth")
-                        if rev is None or yr is None or mo is None:
-                            continue
-                        key = (int(yr), int(mo))
-                        if (best is None) or (key > best[0]):
-                            best = (key, float(rev))
-                    except Exception:
-                        continue
-                return best[1] if best else None
-
-            rows = []
-            for d in payload.get("data", []):
-                name = d.get("companyName", "Unknown")
-                rev = latest_revenue(d)
-                if rev is not None:
-                    rows.append((name, rev))
-
-            rows.sort(key=lambda x: x[1], reverse=True)
-            top = rows[:10]
+    chart_kpi = st.selectbox("KPI", list(CHART_KPIS), format_func=CHART_KPIS.get)
+    chart_window = st.selectbox("Window", list(CHART_WINDOWS), format_func=CHART_WINDOWS.get)
 
+    if st.button("Show revenue chart" if chart_kpi == "revenue" else "Show chart"):
+        try:
+            top = kpi_chart_data(engine.dataset_version, chart_kpi, 10, chart_window)
             if not top:
-                st.warning("No revenue data found to chart.")
+                st.warning(f"No {CHART_KPIS[chart_kpi].lower()} data found to chart.")
             else:
                 # Make matplotlib chart
                 names = [t[0] for t in top]
                 values = [t[1] for t in top]
-                fig, ax = plt.subplots(figsize=(8, 5))
+                fig = Figure(figsize=(8, 5))  # not registered with pyplot, so nothing global holds on to it
+                ax = fig.subplots()
                 ax.barh(names[::-1], values[::-1])  # reverse for top at top
-                ax.set_xlabel("Latest Revenue")
-                ax.set_title("Top 10 by Latest Revenue")
+                ax.set_xlabel(CHART_KPIS[chart_kpi])
+                ax.set_title(f"Top 10 by {CHART_KPIS[chart_kpi]} ({CHART_WINDOWS[chart_window].lower()})")
                 st.pyplot(fig)
 
                 # Also show as an image (PNG) if you want a 'graph image'
-                buf = io.BytesIO()
+                buf = BytesIO()
                 fig.savefig(buf, format="png", dpi=200, bbox_inches="tight")
-                buf.seek(0)
-                st.image(buf, caption="Saved graph image (PNG)", use_container_width=True)
+                st.image(buf.getvalue(), caption="Saved graph image (PNG)", use_container_width=True)
+                st.download_button("Download PNG", buf.getvalue(), file_name=f"top10_{chart_kpi}.png", mime="image/png")
 
         except FileNotFoundError:
             st.error("investment_updates.json not found in the app directory.")
         except Exception as e:
             st.error(f"Chart error: {e}")
 
+    st.divider()
+    st.subheader("Latency")
+    stages = engine.metrics.summary()
+    if stages:
+        st.caption("Per-stage wall time since the server started (p50/p95 over recent requests).")
+        st.dataframe(
+            [{"stage": name, "n": s["count"], "p50 ms": s["p50_ms"], "p95 ms": s["p95_ms"],
+              "tokens": s["prompt_tokens"] + s["completion_tokens"]} for name, s in stages.items()],
+            hide_index=True, use_container_width=True,
+        )
+    else:
+        st.caption("No requests timed yet.")
+
 # =========================
 # SOUND (beep) HELPER
 # =========================
@@ -178,15 +193,27 @@ if prompt:
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Assistant reply
+    # Assistant reply (streamed; tool progress shows as a caption above the text)
     with st.chat_message("assistant"):
+        status = st.empty()
+
+        def reply_tokens():
+            for event in engine.unified_answer_stream(prompt, st.session_state.session_id):
+                if event["type"] == "status":
+                    status.caption(event["text"])
+                else:
+                    status.empty()
+                    yield event["text"]
+
         try:
-            reply = unified_answer(prompt)
+            reply = st.write_stream(reply_tokens())
             if not isinstance(reply, str) or not reply.strip():
                 reply = "I couldn't generate a response. Try rephrasing your question."
+                st.markdown(reply)
         except Exception as e:
+            status.empty()
             reply = f"Error: {e}"
-        st.markdown(reply)
+            st.markdown(reply)
 
     st.session_state.messages.append({"role": "assistant", "content": reply})
     play_beep()  # Ding on new assistant message
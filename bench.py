@@ -0,0 +1,503 @@
+# bench.py
+"""
+Offline benchmarks for vic.py against a deterministic fake OpenAI backend.
+
+    python bench.py --sizes 10 1000 --out bench_results.json
+    python bench.py --sizes 1000 --compare bench_results.json
+
+Nothing here talks to the network: chat completions, embeddings, files and
+responses are served by in-process fakes with configurable latency and
+payload size, and the dataset is synthetic.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace as NS
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+import vic
+
+# =========================
+# Synthetic dataset
+# =========================
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+SECTORS = ["Fintech", "Healthtech", "AI", "Climate", "SaaS", "Marketplace", "Logistics"]
+WORDS = ["growth", "pipeline", "churn", "hiring", "pilot", "launch", "partnership", "runway",
+         "enterprise", "margin", "expansion", "roadmap", "retention", "pricing", "seed", "bridge"]
+
+def _sentence(rng: random.Random, n: int = 14) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+def generate_dataset(n_deals: int, months: int = 12, seed: int = 0) -> Dict[str, Any]:
+    """investment_updates.json-shaped data with `n_deals` deals and `months` monthly updates each."""
+    rng = random.Random(seed)
+    deals = []
+    for i in range(n_deals):
+        name = f"{rng.choice(['Nova', 'Apex', 'Blue', 'Quant', 'Terra', 'Lumen', 'Vector', 'Helio'])}" \
+               f"{rng.choice(['stack', 'labs', 'pay', 'health', 'works', 'grid', 'loop', 'AI'])} {i}"
+        cid = f"deal-{i:06d}"
+        apk, updates = [], []
+        for m in range(months):
+            year, month = 2024 + (m // 12), m % 12 + 1
+            kpis = {
+                "revenue": rng.choice([None, round(rng.uniform(1e4, 3e6), 2)]),
+                "monthly_burn": round(rng.uniform(1e4, 4e5), 2),
+                "runway": rng.randint(2, 36),
+                "current_cash_balance": round(rng.uniform(1e5, 2e7), 2),
+                "customers": rng.randint(0, 2000),
+            }
+            apk.append({"receivedYear": year, "receivedMonth": month, "revenueTooltip": "Monthly",
+                        "currency": "USD", "period": "MONTHLY", "kpis": kpis})
+            updates.append({
+                "id": f"{cid}-u{m}", "dealId": cid, "receivedYear": year, "receivedMonth": month,
+                "receivedDate": f"{year}-{month:02d}-05", "s3Key": f"updates/{cid}/{m}.pdf", "jobs": [], "tags": {},
+                "kpis": {**kpis, "currency": "USD", "revenueType": "MONTHLY", "period_wise_kpis": [],
+                         "fundraising_plans": {"is_raising_funds": m == months - 1, "fundraising_details": _sentence(rng) if m == months - 1 else None},
+                         "pivoting": {"is_pivoting": False, "pivoting_details": None}},
+                "textualData": {
+                    "overview": _sentence(rng, 40), "lowlights": _sentence(rng) if m % 3 == 0 else None,
+                    "update_month": MONTHS[month - 1], "hiring_details": _sentence(rng) if m % 4 == 0 else None,
+                    "is_company_hiring": m % 4 == 0, "is_founder_leaving": False, "founder_leaving_details": None,
+                    "business_updates": {"partnerships": _sentence(rng), "new_customers": _sentence(rng), "team_updates": None,
+                                         "strategic_focus": None, "market_expansion_and_strategy": None,
+                                         "market_trends_and_competitive_analysis": None},
+                    "product_updates": {"product_usage": _sentence(rng), "intellectual_property": None,
+                                        "new_features_and_bug_fixes": _sentence(rng), "product_roadmap_and_future_plans": None},
+                    "company_name_change": {"new_name": None, "is_company_changing_name": False, "company_name_change_details": None},
+                    "attachments": [], "relevantLinks": [], "is_PMF_achieved": False, "PMF_details": None,
+                    "assistance_required": None, "explanation_for_hiring_details": None,
+                },
+                "createdAt": f"{year}-{month:02d}-05T00:00:00Z", "updatedAt": f"{year}-{month:02d}-05T00:00:00Z",
+            })
+        deals.append({
+            "id": cid, "companyName": name, "normalizeCompanyName": name.lower().replace(" ", ""),
+            "sector": rng.choice(SECTORS), "geography": "US", "dealStatus": "ACTIVE",
+            "entityLegalName": f"{name} Inc.", "companyUrl": f"https://www.{name.lower().replace(' ', '')}.com",
+            "lastRoundValuation": f"{rng.randint(5, 200) * 1e6:.2f}", "investedAmount": f"{rng.randint(1, 20) * 5e4:.2f}",
+            "currentValuation": f"{rng.randint(5, 300) * 1e6:.2f}", "moic": f"{rng.uniform(0.5, 4):.2f}",
+            "commentsAndNotes": _sentence(rng, 30), "s3Key": f"deals/{cid}.pdf",
+            "dealHistory": [{"updatedAt": f"202{y}-01-01T00:00:00Z", "currentValuation": f"{rng.randint(5, 300) * 1e6:.2f}"} for y in range(3)],
+            "valuationRoundDetail": [{"id": f"{cid}-v", "date": "2023-06-01", "createdAt": "2023-06-01T00:00:00Z",
+                                      "roundName": "Seed", "valuation": "25000000.00", "defaultRound": True}],
+            "jobs": [{"id": f"{cid}-j{m}", "name": f"{MONTHS[m % 12][:3]}_2024", "status": "COMPLETED"} for m in range(months)],
+            "investmentUpdates": updates, "allPeriodWiseKpis": apk,
+            "createdAt": "2023-01-01T00:00:00Z", "updatedAt": "2024-12-31T00:00:00Z",
+        })
+    return {"data": deals}
+
+# =========================
+# Fake OpenAI backend
+# =========================
+class FakeEmbeddings(Embeddings):
+    """Deterministic hashed unit vectors; `latency` seconds per request."""
+
+    def __init__(self, dim: int = 64, latency: float = 0.0, model: str = "fake-embedding"):
+        self.dim, self.latency, self.model = dim, latency, model
+        self.requests = 0
+
+    def _vector(self, text: str) -> List[float]:
+        raw = hashlib.shake_256(text.casefold().encode("utf-8")).digest(self.dim)
+        vec = [b - 127.5 for b in raw]
+        norm = sum(v * v for v in vec) ** 0.5
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.requests += 1
+        time.sleep(self.latency)
+        return self._vector(text)
+
+class FakeOpenAI:
+    """
+    Sync stand-in for the OpenAI client parts vic.py uses. Routing is
+    keyword-based: multi-company questions call `query_kpis`, anything naming
+    "summary of <company>" calls `get_data_from_name`, averages and medians go
+    to the code interpreter through `run_python_query_on_json`.
+    """
+
+    def __init__(self, latency: float = 0.05, answer_tokens: int = 200, token_latency: float = 0.0):
+        self.latency = latency
+        self.answer_tokens = answer_tokens
+        self.token_latency = token_latency
+        self.api_key = "fake"
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._files: List[str] = []
+        self.chat = NS(completions=NS(create=self._chat))
+        self.embeddings = NS(create=self._embed)
+        self.files = NS(create=self._file_create, delete=self._file_delete)
+        self.responses = NS(create=self._responses)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    @staticmethod
+    def _usage(prompt: int, completion: int):
+        return NS(prompt_tokens=prompt, completion_tokens=completion, total_tokens=prompt + completion,
+                  prompt_tokens_details=NS(cached_tokens=0))
+
+    @staticmethod
+    def route(question: str):
+        q = question.casefold()
+        if "summary of " in q:
+            return "get_data_from_name", {"company_name": question[q.index("summary of ") + 11:].split("#")[0].strip()}
+        if any(w in q for w in ("average", "median")):
+            return "run_python_query_on_json", {"query": question}
+        if any(w in q for w in ("which", "companies", "compare", "top", "list")):
+            return "query_kpis", {"metrics": ["revenue"], "filters": [{"metric": "revenue", "op": ">", "value": 1e6}],
+                                  "sort_by": "revenue", "top_k": 10}
+        return None, None
+
+    def _answer_chunks(self):
+        for i in range(self.answer_tokens):
+            time.sleep(self.token_latency)
+            yield NS(choices=[NS(delta=NS(content=f"w{i} "))], usage=None)
+        yield NS(choices=[], usage=self._usage(1000, self.answer_tokens))
+
+    def _chat(self, **kw):
+        self._count("chat")
+        time.sleep(self.latency)
+        messages = kw.get("messages") or []
+        prompt = sum(len(str(m.get("content") if isinstance(m, dict) else getattr(m, "content", "")) or "") for m in messages) // 4
+        if kw.get("tool_choice") == "auto":
+            user = next((m["content"] for m in reversed(messages) if isinstance(m, dict) and m.get("role") == "user"), "")
+            name, args = self.route(user)
+            if name is None:
+                msg = NS(role="assistant", content="I can only help with investment updates.", tool_calls=None)
+            else:
+                tc = NS(id="call_0", type="function", function=NS(name=name, arguments=json.dumps(args)))
+                msg = NS(role="assistant", content=None, tool_calls=[tc])
+            return NS(choices=[NS(message=msg)], usage=self._usage(prompt, 20))
+        if kw.get("stream"):
+            return self._answer_chunks()
+        text = " ".join(f"w{i}" for i in range(min(self.answer_tokens, 100)))
+        return NS(choices=[NS(message=NS(role="assistant", content=text, tool_calls=None))], usage=self._usage(prompt, 100))
+
+    def _embed(self, model: str, input, **kw):
+        self._count("embeddings")
+        time.sleep(self.latency)
+        texts = [input] if isinstance(input, str) else list(input)
+        emb = FakeEmbeddings()
+        return NS(data=[NS(embedding=emb._vector(t)) for t in texts])
+
+    def _file_create(self, file, purpose):
+        self._count("files.create")
+        fh = file[1] if isinstance(file, tuple) else file
+        while fh.read(1 << 20):
+            pass
+        time.sleep(self.latency)
+        fid = f"file-{len(self._files)}"
+        self._files.append(fid)
+        return NS(id=fid)
+
+    def _file_delete(self, fid):
+        self._count("files.delete")
+        return NS(id=fid, deleted=True)
+
+    def _responses(self, **kw):
+        self._count("responses")
+        time.sleep(self.latency * 10)
+        return NS(output_text="[fake code interpreter output]")
+
+class FakeAsyncOpenAI:
+    """Async wrapper over FakeOpenAI: same behaviour, latency via asyncio.sleep."""
+
+    def __init__(self, sync: FakeOpenAI):
+        self.sync = sync
+        self.api_key = sync.api_key
+        self.chat = NS(completions=NS(create=self._chat))
+        self.embeddings = NS(create=self._wrap("_embed"))
+        self.files = NS(create=self._wrap("_file_create"), delete=self._wrap("_file_delete"))
+        self.responses = NS(create=self._wrap("_responses"))
+
+    def _wrap(self, name: str):
+        async def call(*args, **kw):
+            return await asyncio.to_thread(getattr(self.sync, name), *args, **kw)
+        return call
+
+    async def _chat(self, **kw):
+        await asyncio.sleep(self.sync.latency)
+        saved, self.sync.latency = self.sync.latency, 0.0
+        try:
+            result = self.sync._chat(**kw)
+        finally:
+            self.sync.latency = saved
+        if kw.get("stream"):
+            chunks = list(result)
+
+            async def stream():
+                for chunk in chunks:
+                    await asyncio.sleep(self.sync.token_latency)
+                    yield chunk
+            return stream()
+        return result
+
+# =========================
+# Measurements
+# =========================
+def _timed(fn, *args, **kwargs):
+    t = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - t, result
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    s = sorted(samples)
+    return {
+        "n": len(s),
+        "mean_ms": round(1000 * statistics.fmean(s), 3),
+        "p50_ms": round(1000 * s[len(s) // 2], 3),
+        "p95_ms": round(1000 * s[min(len(s) - 1, int(0.95 * len(s)))], 3),
+        "max_ms": round(1000 * s[-1], 3),
+    }
+
+def _heap_bytes(build) -> int:
+    """Python heap still held by what `build` returns."""
+    tracemalloc.start()
+    try:
+        kept = build()
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+def bench_import() -> Dict[str, float]:
+    samples = []
+    for _ in range(3):
+        t = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import vic"], check=True, cwd=Path(__file__).parent)
+        samples.append(time.perf_counter() - t)
+    return _summary(samples)
+
+def _engine(workdir: Path, data_path: Path, fake: FakeOpenAI, embeddings: FakeEmbeddings, **kwargs) -> "vic.VicEngine":
+    return vic.VicEngine(
+        data_path=data_path,
+        client=fake,
+        async_client=FakeAsyncOpenAI(fake),
+        embeddings=embeddings,
+        index_cache_dir=workdir / "index",
+        memory_dir=workdir / "memory",
+        upload_cache_path=workdir / "uploads.json",
+        query_embed_cache_path=workdir / "query_embeddings.jsonl",
+        metrics_log_path=workdir / "spans.jsonl",
+        snapshot_dir=workdir / "snapshot",
+        narrative_index_dir=workdir / "narratives",
+        digest_dir=workdir / "digests",
+        sandbox_dir=workdir / "sandbox",
+        **kwargs,
+    )
+
+def bench_size(n_deals: int, args) -> Dict[str, Any]:
+    workdir = Path(tempfile.mkdtemp(prefix=f"vic-bench-{n_deals}-"))
+    try:
+        data = generate_dataset(n_deals, months=args.months, seed=args.seed)
+        data_path = workdir / "investment_updates.json"
+        data_path.write_text(json.dumps(data), encoding="utf-8")
+        names = [d["companyName"] for d in data["data"]]
+        rng = random.Random(args.seed)
+        out: Dict[str, Any] = {"deals": n_deals, "dataset_bytes": data_path.stat().st_size}
+
+        fake = FakeOpenAI(latency=args.latency, answer_tokens=args.answer_tokens, token_latency=args.token_latency)
+        emb = FakeEmbeddings(latency=args.embed_latency)
+
+        # startup: data load + index build (cold), then reload from the on-disk index (warm)
+        engine = _engine(workdir, data_path, fake, emb)
+        out["json_parse_s"] = round(_timed(lambda: json.loads(data_path.read_bytes()))[0], 4)
+        out["data_load_cold_s"] = round(_timed(lambda: engine.deal_store)[0], 4)
+        out["data_load_snapshot_s"] = round(_timed(lambda: _engine(workdir, data_path, fake, emb).deal_store)[0], 4)
+        out["heap_bytes"] = {
+            "json_tree": _heap_bytes(lambda: json.loads(data_path.read_bytes())),
+            "deal_store": _heap_bytes(lambda: vic.load_or_build_deal_store(data_path, workdir / "snapshot")),
+        }
+        out["index_build_cold_s"] = round(_timed(lambda: engine.company_vs)[0], 4)
+        out["narrative_index_build_cold_s"] = round(_timed(lambda: engine.narrative_index)[0], 4)
+        warm = _engine(workdir, data_path, fake, FakeEmbeddings(latency=args.embed_latency))
+        out["digest_build_cold_s"] = round(_timed(lambda: engine.digests)[0], 4)
+        out["startup_warm_s"] = round(_timed(warm.warm_up)[0], 4)
+        out["kpi_table_build_s"] = round(_timed(lambda: engine.kpi_table)[0], 4)
+
+        # search_company by tier
+        for label, make in (
+            ("exact", lambda n: n),
+            ("fuzzy", lambda n: n[:-1] + "x" if len(n) > 4 else n),
+            ("vector", lambda n: f"unknown venture {rng.random()}"),
+        ):
+            samples = [_timed(engine.search_company, make(rng.choice(names)))[0] for _ in range(args.iterations)]
+            out[f"search_company_{label}"] = _summary(samples)
+
+        # get_data_from_name payload size: raw deal vs projected view vs digest (the default)
+        sample = [rng.choice(names) for _ in range(min(50, n_deals))]
+        raw = [len(json.dumps(engine.get_data_from_name(n))) for n in sample]
+        view = [len(json.dumps(engine.get_deal_view(n))) for n in sample]
+        digest = [len(json.dumps(engine.get_deal_digest(n))) for n in sample]
+        out["deal_payload_bytes"] = {"raw_mean": int(statistics.fmean(raw)), "view_mean": int(statistics.fmean(view)),
+                                     "digest_mean": int(statistics.fmean(digest))}
+
+        # memory: cold tail read of a long session file, then warm ring-buffer reads
+        store = vic.MemoryStore(workdir / "memory")
+        for i in range(args.memory_turns):
+            store.append("bench", f"question {i}", "answer " * 40)
+        cold = [_timed(vic.MemoryStore(workdir / "memory").load, "bench")[0] for _ in range(args.iterations)]
+        warm_reads = [_timed(store.load, "bench")[0] for _ in range(args.iterations)]
+        out["load_memory"] = {"turns": args.memory_turns, "cold": _summary(cold), "warm": _summary(warm_reads)}
+
+        # end-to-end unified_answer (unique questions so the answer cache stays cold)
+        questions = [f"Give me a summary of {rng.choice(names)} #{i}" if i % 2 else f"Which companies have revenue over $1m #{i}"
+                     for i in range(args.requests)]
+        samples = [_timed(engine.unified_answer, q, f"s{i}")[0] for i, q in enumerate(questions[: args.iterations])]
+        out["unified_answer_sequential"] = _summary(samples)
+        cached = [_timed(engine.unified_answer, questions[0], "cached")[0] for _ in range(args.iterations)]
+        out["unified_answer_cache_hit"] = _summary(cached)
+
+        def run_threads():
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                return list(pool.map(lambda p: _timed(engine.unified_answer, p[1] + " t", f"t{p[0]}")[0], enumerate(questions)))
+
+        elapsed, lat = _timed(run_threads)
+        out["unified_answer_threads"] = {"concurrency": args.concurrency, "requests": len(questions),
+                                         "throughput_rps": round(len(questions) / elapsed, 2), **_summary(lat)}
+
+        async def run_async():
+            sem = asyncio.Semaphore(args.concurrency)
+
+            async def one(i, q):
+                async with sem:
+                    t = time.perf_counter()
+                    await engine.aunified_answer(q + " a", f"a{i}")
+                    return time.perf_counter() - t
+            return await asyncio.gather(*(one(i, q) for i, q in enumerate(questions)))
+
+        elapsed, lat = _timed(lambda: asyncio.run(run_async()))
+        out["unified_answer_async"] = {"concurrency": args.concurrency, "requests": len(questions),
+                                       "throughput_rps": round(len(questions) / elapsed, 2), **_summary(list(lat))}
+        # a burst of the same question from `concurrency` sessions at once: coalesced into one answer
+        burst = "Which companies have revenue over $2m burst"
+        chat_before = fake.calls.get("chat", 0)
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            elapsed, _ = _timed(lambda: list(pool.map(lambda i: engine.unified_answer(burst, f"b{i}"), range(args.concurrency))))
+        out["duplicate_burst"] = {"concurrency": args.concurrency, "wall_s": round(elapsed, 4),
+                                  "chat_calls": fake.calls.get("chat", 0) - chat_before}
+
+        # code interpreter: first query uploads the dataset, later ones (and a restarted engine) reuse the file id
+        def code_interpreter_calls():
+            return {k: fake.calls.get(k, 0) for k in ("files.create", "files.delete", "responses")}
+
+        before = code_interpreter_calls()
+        query = "Average revenue by sector"
+        cold = _timed(engine.run_python_query_on_json, query)[0]
+        warm = [_timed(engine.run_python_query_on_json, f"{query} #{i}")[0] for i in range(args.iterations)]
+        restarted = _timed(_engine(workdir, data_path, fake, emb).run_python_query_on_json, query)[0]
+        routed = _timed(engine.unified_answer, "What is the median revenue by stage?", "ci")[0]
+        out["code_interpreter"] = {"cold_s": round(cold, 4), "warm": _summary(warm), "restarted_s": round(restarted, 4),
+                                   "unified_answer_s": round(routed, 4),
+                                   "calls": {k: v - before[k] for k, v in code_interpreter_calls().items()}}
+
+        # local code backend: sandbox start-up (frames written, workers forked from the forkserver), then warm jobs
+        if hasattr(os, "fork"):
+            local = _engine(workdir, data_path, fake, emb, code_backend="local")
+            out["sandbox_start_s"] = round(_timed(lambda: local.sandbox)[0], 4)
+            code = "kpis.groupby('sector')['revenue'].mean().sort_values(ascending=False).head(5)"
+            samples = [_timed(local.run_pandas_code, f"{code}  # {i}")[0] for i in range(args.iterations)]
+            out["run_pandas_code"] = _summary(samples)
+            local.sandbox.close()
+
+        # hot reload of a daily-style update: 1% of deals renamed or touched, one added
+        for deal in data["data"][: max(1, n_deals // 100)]:
+            deal["companyName"] += " Renamed"
+            deal["updatedAt"] = "2025-01-01T00:00:00Z"
+        data["data"].append({**data["data"][-1], "id": "deal-new", "companyName": "Freshly Added Co"})
+        data_path.write_text(json.dumps(data), encoding="utf-8")
+        requests_before = emb.requests
+        out["reload_s"] = round(_timed(engine.reload)[0], 4)
+        out["reload_embedding_requests"] = emb.requests - requests_before
+
+        out["stages"] = engine.metrics.summary()
+        out["api_calls"] = dict(fake.calls)
+        out["embedding_requests"] = emb.requests
+        return out
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# =========================
+# Reporting
+# =========================
+def _flatten(prefix: str, value, out: Dict[str, float]) -> None:
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}.{k}" if prefix else k, v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    """Print metrics that moved by more than 5% between two result files."""
+    prev_by_size = {r["deals"]: r for r in previous.get("results", [])}
+    for res in current.get("results", []):
+        old = prev_by_size.get(res["deals"])
+        if not old:
+            continue
+        a, b = {}, {}
+        _flatten("", old, a)
+        _flatten("", res, b)
+        print(f"--- {res['deals']} deals ---")
+        for key in sorted(set(a) & set(b)):
+            if key.endswith(".n"):
+                continue
+            if a[key] and abs(b[key] - a[key]) / abs(a[key]) > 0.05:
+                print(f"{key:55s} {a[key]:>12g} -> {b[key]:>12g} ({100 * (b[key] - a[key]) / abs(a[key]):+.1f}%)")
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--sizes", type=int, nargs="+", default=[10, 1000], help="deal counts to benchmark (10 .. 100000)")
+    p.add_argument("--months", type=int, default=12)
+    p.add_argument("--iterations", type=int, default=20)
+    p.add_argument("--requests", type=int, default=40, help="questions per throughput run")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--latency", type=float, default=0.05, help="fake API latency per call (s)")
+    p.add_argument("--embed-latency", type=float, default=0.02, help="fake embedding latency per request (s)")
+    p.add_argument("--token-latency", type=float, default=0.0, help="fake delay per streamed token (s)")
+    p.add_argument("--answer-tokens", type=int, default=200)
+    p.add_argument("--memory-turns", type=int, default=5000)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default="bench_results.json")
+    p.add_argument("--compare", help="previous results file to diff against")
+    args = p.parse_args(argv)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "git": subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip(),
+        "params": vars(args),
+        "import_vic": bench_import(),
+        "results": [],
+    }
+    for n in args.sizes:
+        print(f"benchmarking {n} deals…", flush=True)
+        report["results"].append(bench_size(n, args))
+
+    Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+
+if __name__ == "__main__":
+    main()
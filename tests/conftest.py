@@ -0,0 +1,23 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# flat layout: vic.py, bench.py and app.py live at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bench  # noqa: E402
+
+
+@pytest.fixture
+def fake():
+    return bench.FakeOpenAI(latency=0.0)
+
+
+@pytest.fixture
+def engine(tmp_path, fake):
+    """An engine over a small generated dataset, with fake OpenAI clients and embeddings."""
+    data_path = tmp_path / "investment_updates.json"
+    data_path.write_text(json.dumps(bench.generate_dataset(40, months=6, seed=7)), encoding="utf-8")
+    return bench._engine(tmp_path, data_path, fake, bench.FakeEmbeddings())
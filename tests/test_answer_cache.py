@@ -0,0 +1,51 @@
+import vic
+
+
+def _cache(**kwargs):
+    return vic.AnswerCache(**{"capacity": 3, "ttl_s": 60, "db_path": None, "semantic_threshold": 0, **kwargs})
+
+
+def test_key_scopes_by_version_and_companies():
+    key, scope = vic.AnswerCache.key("What is Rollstack's revenue?", ["d2", "d1"], "v1")
+    assert scope == "v1|d1,d2"
+    assert vic.AnswerCache.key("what is rollstack's revenue", ["d1", "d2"], "v1")[0] == key
+    assert vic.AnswerCache.key("What is Rollstack's revenue?", ["d1", "d2"], "v2")[0] != key
+
+
+def test_lru_evicts_least_recently_used():
+    cache = _cache()
+    for name in "abc":
+        cache.put(name, f"answer {name}", "v1|")
+    assert cache.get("a", "v1|") == "answer a"  # a is now the most recent
+    cache.put("d", "answer d", "v1|")
+    assert cache.get("b", "v1|") is None
+    assert [cache.get(k, "v1|") for k in "acd"] == ["answer a", "answer c", "answer d"]
+    assert (cache.hits, cache.misses) == (4, 1)
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(vic.time, "time", lambda: now[0])
+    cache = _cache(ttl_s=10)
+    cache.put("a", "answer", "v1|")
+    now[0] += 9
+    assert cache.get("a", "v1|") == "answer"
+    now[0] += 2
+    assert cache.get("a", "v1|") is None
+
+
+def test_sqlite_entries_survive_a_restart_and_purge(tmp_path):
+    db = str(tmp_path / "answers.db")
+    _cache(db_path=db).put("a", "answer", "v1|d1")
+    restarted = _cache(db_path=db)
+    assert restarted.get("a", "v1|d1") == "answer"
+    restarted.purge("v2")
+    assert _cache(db_path=db).get("a", "v1|d1") is None
+
+
+def test_semantic_lookup_stays_within_scope():
+    cache = _cache(semantic_threshold=0.9)
+    cache.put("a", "answer", "v1|d1", vector=[1.0, 0.0])
+    assert cache.get("other", "v1|d1", vector=[0.99, 0.05]) == "answer"
+    assert cache.get("other", "v1|d2", vector=[0.99, 0.05]) is None
+    assert cache.get("other", "v1|d1", vector=[0.0, 1.0]) is None
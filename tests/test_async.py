@@ -0,0 +1,74 @@
+import asyncio
+
+import vic
+
+
+class RateLimitError(Exception):
+    """Same name as the openai error, so `_is_transient` retries it."""
+
+
+def test_stream_holds_the_concurrency_slot_until_consumed(engine, monkeypatch):
+    monkeypatch.setattr(vic, "RETRY_BASE_DELAY_S", 0.0)
+
+    async def run():
+        limit = engine._async_resources().limit
+        attempts, during = [], []
+
+        async def create():
+            attempts.append(limit._value)
+            if len(attempts) == 1:
+                raise RateLimitError()
+
+            async def chunks():
+                for i in range(3):
+                    await asyncio.sleep(0)
+                    yield i
+            return chunks()
+
+        async with engine._astream(create) as stream:
+            async for _ in stream:
+                during.append(limit._value)
+        return attempts, during, limit._value
+
+    free = vic.ASYNC_MAX_CONCURRENCY
+    attempts, during, after = asyncio.run(run())
+    assert attempts == [free - 1, free - 1]  # the slot is given back while backing off
+    assert during == [free - 1] * 3
+    assert after == free
+
+
+def test_async_answer_gives_back_every_slot(engine):
+    async def run():
+        answer = await engine.aunified_answer("Give me a summary of Bluelabs 3")
+        return answer, engine._async_resources().limit._value
+
+    answer, free = asyncio.run(run())
+    assert answer
+    assert free == vic.ASYNC_MAX_CONCURRENCY
+
+
+def test_async_path_summarises_on_the_async_client(tmp_path, fake, monkeypatch):
+    import json
+
+    import bench
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    data_path = tmp_path / "investment_updates.json"
+    data_path.write_text(json.dumps(bench.generate_dataset(40, months=6, seed=7)), encoding="utf-8")
+    engine = bench._engine(tmp_path, data_path, fake, bench.FakeEmbeddings())
+    del engine._cache["client"]  # only the async client is injected
+    engine.context.memory_budget = 50
+    for i in range(6):
+        engine.memory.append("s", f"question {i} " * 20, f"answer {i} " * 20)
+
+    async def run():
+        answer = await engine.aunified_answer("Give me a summary of Bluelabs 3", "s")
+        for _ in range(200):
+            if engine.context.summary("s")[0]:
+                break
+            await asyncio.sleep(0.01)
+        return answer
+
+    assert asyncio.run(run())
+    assert engine.context.summary("s")[0]
+    assert "client" not in engine._cache
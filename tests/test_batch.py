@@ -0,0 +1,94 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace as NS
+
+import vic
+
+
+class SlowEngine:
+    """aunified_answer stand-in that records how many questions run at once."""
+
+    def __init__(self, delay=0.02, fail=()):
+        self.delay, self.fail = delay, set(fail)
+        self.active = self.peak = 0
+        self.asked = []
+        self.memory = NS(clear=lambda session: None)
+
+    async def aunified_answer(self, question, session):
+        self.asked.append(question)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if question in self.fail:
+                raise RuntimeError("boom")
+            return f"answer to {question}"
+        finally:
+            self.active -= 1
+
+
+def _records(path):
+    records = []
+    for line in path.read_text().splitlines():
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            pass  # a torn line
+    return records
+
+
+def test_read_questions_skips_blanks_and_comments(tmp_path):
+    path = tmp_path / "q.txt"
+    path.write_text("# portfolio review\nWhich companies burn most?\n\n  Summary of Acme  \n", encoding="utf-8")
+    assert vic.read_questions(path) == ["Which companies burn most?", "Summary of Acme"]
+
+
+def test_duplicates_are_answered_once_and_concurrency_is_bounded(tmp_path):
+    engine = SlowEngine()
+    questions = [f"question {i}" for i in range(10)] + ["Question 1?", "question  2"]
+    summary = asyncio.run(vic.run_batch(questions, tmp_path / "out.jsonl", engine, concurrency=3, rate_per_min=0))
+    assert (summary["questions"], summary["unique"], summary["answered"], summary["errors"]) == (12, 10, 10, 0)
+    assert sorted(engine.asked) == sorted(f"question {i}" for i in range(10))
+    assert engine.peak == 3
+    assert len(_records(tmp_path / "out.jsonl")) == 10
+
+
+def test_resume_skips_successes_and_retries_errors(tmp_path):
+    out = tmp_path / "out.jsonl"
+    questions = ["a", "b", "c"]
+    first = asyncio.run(vic.run_batch(questions, out, SlowEngine(fail={"b"}), rate_per_min=0))
+    assert (first["answered"], first["errors"]) == (2, 1)
+    with open(out, "a") as fh:
+        fh.write('{"key": "torn')  # the previous run died mid-write
+
+    engine = SlowEngine()
+    second = asyncio.run(vic.run_batch(questions, out, engine, rate_per_min=0))
+    assert engine.asked == ["b"]
+    assert (second["resumed"], second["answered"], second["errors"]) == (2, 1, 0)
+    assert sorted(r["key"] for r in _records(out) if r["status"] == "ok") == ["a", "b", "c"]
+
+
+def test_rate_limit_spaces_starts(tmp_path):
+    engine = SlowEngine(delay=0)
+    started = time.monotonic()
+    asyncio.run(vic.run_batch(["a", "b", "c", "d"], tmp_path / "out.jsonl", engine, concurrency=4,
+                              rate_per_min=600))  # one start every 0.1 s
+    assert time.monotonic() - started >= 0.3
+
+
+def test_timeouts_are_recorded(tmp_path):
+    summary = asyncio.run(vic.run_batch(["slow"], tmp_path / "out.jsonl", SlowEngine(delay=1), timeout_s=0.05,
+                                        rate_per_min=0))
+    assert summary["errors"] == 1
+    assert _records(tmp_path / "out.jsonl")[0]["error"] == "timed out after 0.05s"
+
+
+def test_batch_against_the_engine(engine, tmp_path):
+    name = engine.data["data"][0]["companyName"]
+    out = tmp_path / "out.jsonl"
+    summary = asyncio.run(vic.run_batch([f"Give me a summary of {name}", "Which companies have revenue over $1m?"],
+                                        out, engine, rate_per_min=0))
+    assert summary["answered"] == 2
+    assert all(r["status"] == "ok" and r["answer"] for r in _records(out))
+    assert not list(engine.memory_dir.glob("batch-*"))  # throwaway sessions are cleared
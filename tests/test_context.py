@@ -0,0 +1,109 @@
+import threading
+import time
+
+import vic
+
+
+def _turns(*texts):
+    return [m for i, text in enumerate(texts) for m in (
+        {"role": "user", "content": text, "turn": f"t{i}"},
+        {"role": "assistant", "content": f"answer {text}", "turn": f"t{i}"},
+    )]
+
+
+def _wait_for_summary(builder, session, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not builder.summary(session)[0]:
+        assert time.monotonic() < deadline, "summary never landed"
+        time.sleep(0.01)
+
+
+def test_recent_turns_fit_verbatim_without_a_summary():
+    calls = []
+    builder = vic.ContextBuilder(lambda prev, msgs: calls.append(msgs) or "s")
+    history = builder.history(_turns("a", "b"), "s")
+    assert history == [{"role": "user", "content": "a"}, {"role": "assistant", "content": "answer a"},
+                       {"role": "user", "content": "b"}, {"role": "assistant", "content": "answer b"}]
+    assert calls == []
+
+
+def test_summary_is_written_off_the_request_path():
+    release = threading.Event()
+    seen = []
+
+    def summarize(previous, msgs):
+        seen.append(msgs)
+        release.wait(5)
+        return f"{previous}+{len(msgs)}"
+
+    one_turn = sum(vic.message_tokens(m) for m in _turns("q0"))
+    builder = vic.ContextBuilder(summarize, memory_budget=2 * one_turn, pending_budget=one_turn)
+    prior = _turns("q0", "q1", "q2", "q3")
+
+    started = time.monotonic()
+    history = builder.history(prior, "s")
+    assert time.monotonic() - started < 1  # did not wait for the summary
+    # q0, q1 left the window: the newest of them stays verbatim until the summary lands
+    assert [m["content"] for m in history if m["role"] == "user"] == ["q1", "q2", "q3"]
+
+    builder.history(prior, "s")  # a job is already running for this session: no second one
+    release.set()
+    _wait_for_summary(builder, "s")
+    assert len(seen) == 1 and [m["content"] for m in seen[0]] == ["q0", "answer q0", "q1", "answer q1"]
+
+    history = builder.history(prior, "s")
+    assert history[0] == {"role": "system", "content": "Summary of the earlier conversation:\n+4"}
+    assert [m["content"] for m in history[1:] if m["role"] == "user"] == ["q2", "q3"]
+
+
+def test_repeated_identical_turns_are_each_summarised():
+    seen = []
+    one_turn = sum(vic.message_tokens(m) for m in _turns("hi"))
+    builder = vic.ContextBuilder(lambda prev, msgs: seen.append(msgs) or "summary", memory_budget=one_turn,
+                                 pending_budget=0)
+    builder.history(_turns("hi", "hi"), "s")
+    _wait_for_summary(builder, "s")
+    # the second, identical "hi" turn leaves the window too and is not mistaken for the first
+    builder.history(_turns("hi", "hi", "bye"), "s")
+    deadline = time.monotonic() + 5
+    while len(seen) < 2:
+        assert time.monotonic() < deadline, "second turn was never summarised"
+        time.sleep(0.01)
+    assert [m["content"] for m in seen[1]] == ["hi", "answer hi"]
+
+
+def test_failed_summary_is_retried_next_turn():
+    attempts = []
+
+    def summarize(previous, msgs):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("rate limited")
+        return "ok"
+
+    builder = vic.ContextBuilder(summarize, memory_budget=0, pending_budget=0)
+    builder.history(_turns("a"), "s")
+    deadline = time.monotonic() + 5
+    while builder._running:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    builder.history(_turns("a"), "s")
+    _wait_for_summary(builder, "s")
+    assert len(attempts) == 2
+
+
+def test_memory_records_carry_turn_ids(tmp_path):
+    store = vic.MemoryStore(tmp_path)
+    store.append("s", "hi", "hello")
+    store.append("s", "hi", "hello")
+    msgs = vic.MemoryStore(tmp_path).load("s")
+    assert msgs[0]["turn"] == msgs[1]["turn"] != msgs[2]["turn"] == msgs[3]["turn"]
+
+
+def test_tool_outputs_share_the_remaining_budget():
+    builder = vic.ContextBuilder(lambda p, m: "", budget=300)
+    small, big = "x " * 20, "y " * 5000
+    fitted = builder.fit_tool_outputs([{"role": "user", "content": "q"}], [small, big])
+    assert fitted[0] == small
+    assert fitted[1].endswith("[truncated to fit the context budget]")
+    assert sum(vic.count_tokens(c) for c in fitted) <= 300
@@ -0,0 +1,28 @@
+import threading
+
+import vic
+
+
+def test_lazy_builds_once_and_only_blocks_the_same_name():
+    ds = vic.Dataset(store=None, version="v1", stat=(0, 0))
+    started, release = threading.Event(), threading.Event()
+    builds = []
+
+    def slow():
+        builds.append("slow")
+        started.set()
+        release.wait(5)
+        return "narratives"
+
+    threads = [threading.Thread(target=ds.lazy, args=("narrative_index", slow)) for _ in range(3)]
+    for t in threads:
+        t.start()
+    assert started.wait(5)
+    # a different structure is built while the slow one is still running
+    assert ds.lazy("resolver", lambda: "resolver") == "resolver"
+    assert not ds.built("narrative_index")
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert ds.lazy("narrative_index", slow) == "narratives"
+    assert builds == ["slow"]
@@ -0,0 +1,68 @@
+import json
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+import bench
+import vic
+
+
+def _data(n=12):
+    data = bench.generate_dataset(n, months=4, seed=11)
+    data["data"][0]["sector"] = None
+    data["generatedAt"] = "2024-12-31"
+    return data
+
+
+def test_snapshot_round_trip(tmp_path):
+    data = _data()
+    store = vic.DealStore.from_deals(data["data"], {"generatedAt": data["generatedAt"]})
+    store.save(tmp_path / "snap")
+    loaded = vic.DealStore.load(tmp_path / "snap")
+
+    assert isinstance(loaded._blob, mmap.mmap)
+    assert loaded.to_dataset() == data
+    assert list(loaded) == [d["id"] for d in data["data"]]
+    assert loaded["deal-000003"] == data["data"][3]
+    for a, b in zip(store.records, loaded.records):
+        assert [getattr(a, f) for f in vic.DealRecord.__slots__] == [getattr(b, f) for f in vic.DealRecord.__slots__]
+    assert loaded.records[0].sector is None
+    pd.testing.assert_frame_equal(loaded.kpi_table, store.kpi_table, check_dtype=False)
+
+
+def test_snapshot_is_reused_until_the_file_changes(tmp_path):
+    data_path, root = tmp_path / "data.json", tmp_path / "snapshot"
+    data_path.write_text(json.dumps(_data()), encoding="utf-8")
+    store, version, stat = vic.load_or_build_deal_store(data_path, root)
+    assert (root / version / "deals.bin").exists()
+
+    again, same, _ = vic.load_or_build_deal_store(data_path, root)
+    assert same == version and isinstance(again._blob, mmap.mmap)
+
+    # touched but identical: the hash finds the existing snapshot
+    os.utime(data_path, ns=(stat[1] + 10**9, stat[1] + 10**9))
+    assert vic.load_or_build_deal_store(data_path, root)[1] == version
+
+    changed = _data()
+    changed["data"][1]["companyName"] = "Renamed Co"
+    data_path.write_text(json.dumps(changed), encoding="utf-8")
+    store, new_version, _ = vic.load_or_build_deal_store(data_path, root)
+    assert new_version != version
+    assert store.records[1].name == "Renamed Co"
+    assert not (root / version).exists()
+
+
+def test_old_snapshot_format_is_rebuilt(tmp_path, caplog):
+    data_path, root = tmp_path / "data.json", tmp_path / "snapshot"
+    data_path.write_text(json.dumps(_data()), encoding="utf-8")
+    _, version, _ = vic.load_or_build_deal_store(data_path, root)
+    with np.load(root / version / "records.npz") as npz:
+        arrays = {k: npz[k] for k in npz.files}
+    np.savez(root / version / "records.npz", **{**arrays, "format": np.int64(vic.SNAPSHOT_FORMAT - 1)})
+
+    store, again, _ = vic.load_or_build_deal_store(data_path, root)
+    assert again == version and len(store) == 12
+    assert [r.name for r in caplog.records if "unreadable" in r.getMessage()] == ["vic"]
+    assert vic.DealStore.load(root / version).records[0].id == "deal-000000"
@@ -0,0 +1,46 @@
+import json
+
+import bench
+import vic
+
+
+def _deal(**extra):
+    return bench.generate_dataset(1, months=12, seed=3)["data"][0] | extra
+
+
+def test_lookup_by_id_and_name(engine):
+    deal = engine.data["data"][5]
+    assert engine.get_data_from_id(deal["id"]) == deal
+    assert engine.get_data_from_name(deal["companyName"])["id"] == deal["id"]
+    assert engine.get_data_from_id("no-such-deal") is None
+
+
+def test_view_fits_the_budget_and_keeps_the_newest_entries():
+    deal = _deal()
+    view = vic.project_deal(deal, token_budget=600)
+    # the budget is summed per entry, so allow for the separators between them
+    assert vic._approx_tokens({k: v for k, v in view.items() if k != "note"}) <= 600 * 1.05
+    assert view["profile"]["companyName"] == deal["companyName"]
+    assert view["recent_kpis"][0]["period"] == "2024-12"
+    assert "omitted" in view["note"]
+
+    full = vic.project_deal(deal, token_budget=100_000)
+    assert "note" not in full
+    assert len(full["recent_kpis"]) == 12
+    assert len(json.dumps(full)) < len(json.dumps(deal))
+
+
+def test_view_drops_empty_fields_and_clips_narratives():
+    deal = _deal(companyOneLiner="", tags=[])
+    deal["investmentUpdates"][-1]["textualData"]["overview"] = "x" * 5000
+    view = vic.project_deal(deal, token_budget=100_000)
+    assert "companyOneLiner" not in view["profile"] and "tags" not in view["profile"]
+    assert len(view["latest_updates"][0]["overview"]) == vic.NARRATIVE_MAX_CHARS + 1
+
+
+def test_unknown_company_view(engine):
+    assert vic.project_deal(None) == {"error": "company not found"}
+    deal = engine.data["data"][0]
+    view = engine.get_deal_view(deal["companyName"])
+    assert view["match"]["id"] == deal["id"]
+
@@ -0,0 +1,61 @@
+import json
+
+import vic
+
+
+def _deal(revenues, **textual):
+    updates = []
+    for i, revenue in enumerate(revenues):
+        year, month = 2023 + i // 12, i % 12 + 1
+        updates.append({"id": f"u{i}", "receivedYear": year, "receivedMonth": month,
+                        "kpis": {"revenue": revenue, "monthly_burn": 100.0, "currency": "USD"},
+                        "textualData": {"overview": f"Month {i}.", **(textual if i == len(revenues) - 2 else {})}})
+    return {"id": "d1", "companyName": "Acme", "sector": "Fintech", "currentValuation": "5000000.00",
+            "investmentUpdates": updates}
+
+
+def test_latest_kpis_with_mom_and_yoy():
+    digest = vic.build_deal_digest(_deal([100.0 + i for i in range(13)] + [None]))
+    revenue = digest["latest_kpis"]["revenue"]
+    assert revenue == {"value": 112.0, "period": "2024-01", "mom_pct": 0.9, "yoy_pct": 12.0}
+    assert digest["latest_kpis"]["monthly_burn"]["period"] == "2024-02"
+    assert digest["coverage"] == {"kpi_months": 14, "first_period": "2023-01", "last_period": "2024-02", "updates": 14}
+    assert digest["currency"] == "USD"
+    assert digest["latest_update"] == {"period": "2024-02", "overview": "Month 13."}
+
+
+def test_trends_and_flags():
+    digest = vic.build_deal_digest(_deal([100.0, 90.0, 80.0], is_founder_leaving=True,
+                                         founder_leaving_details="CTO leaves in June. " * 40))
+    assert digest["trends"]["revenue"]["direction"] == "falling"
+    assert digest["trends"]["revenue"]["change_pct"] == -20.0
+    assert digest["trends"]["monthly_burn"]["direction"] == "flat"
+    flag = digest["flags"]["founder_leaving"]
+    assert flag["period"] == "2023-02" and flag["mentions"] == 1
+    assert len(flag["details"]) == vic.DIGEST_TEXT_CHARS + 1
+    assert "runway" not in digest["trends"] and "profile" in digest
+
+
+def test_digests_are_persisted_and_reused_per_version(tmp_path):
+    deals = [_deal([1.0, 2.0]), {**_deal([3.0, 4.0]), "id": "d2", "companyName": "Beta"}]
+    store = vic.DealStore.from_deals(deals)
+    digests = vic.load_or_build_digests(store, "v1", tmp_path)
+    assert set(digests) == {"d1", "d2"}
+    assert json.loads((tmp_path / "v1.json").read_text()) == digests
+
+    changed = vic.DealStore.from_deals([deals[0], {**deals[1], "companyName": "Beta Renamed"}])
+    sentinel = {"d1": {"reused": True}, "d2": {"reused": True}}
+    updated = vic.load_or_build_digests(changed, "v2", tmp_path, previous=sentinel, stale=["d2"])
+    assert updated["d1"] == {"reused": True}
+    assert updated["d2"]["profile"]["companyName"] == "Beta Renamed"
+    assert not (tmp_path / "v1.json").exists()
+
+
+def test_digest_is_the_default_tool_result(engine):
+    deal = engine.data["data"][2]
+    content = json.loads(engine._tool_content("get_data_from_name", {"company_name": deal["companyName"]}))
+    assert content["id"] == deal["id"] and "latest_kpis" in content
+    full = json.loads(engine._tool_content("get_data_from_name", {"company_name": deal["companyName"],
+                                                                  "detail": "full"}))
+    assert "recent_kpis" in full
+    assert len(json.dumps(content)) < len(json.dumps(deal))
@@ -0,0 +1,57 @@
+import gc
+import json
+import os
+import time
+
+import bench
+import vic
+
+
+def _names(i):
+    return [f"Company {i} {j}" for j in range(4)]
+
+
+def _build(cache_dir, i):
+    """Build index `i`, then date its folder i seconds after an hour ago so recency is unambiguous."""
+    vs = vic.load_or_build_company_index(_names(i), bench.FakeEmbeddings(), cache_dir, dataset_version=f"v{i}")
+    stamp = time.time() - 3600 + i
+    os.utime(cache_dir / vic.company_index_key(_names(i), "fake-embedding"), (stamp, stamp))
+    return vs
+
+
+def test_save_keeps_recent_and_open_indexes(tmp_path, monkeypatch):
+    monkeypatch.setattr(vic, "INDEX_KEEP", 2)
+    live = _build(tmp_path, 0)
+    for i in range(1, 5):
+        _build(tmp_path, i)
+        gc.collect()
+    kept = {d.name for d in tmp_path.iterdir()}
+    # the two most recent plus the one still open
+    assert kept == {vic.company_index_key(_names(i), "fake-embedding") for i in (0, 3, 4)}
+    del live
+
+
+def test_prune_only_touches_old_unopened_indexes(tmp_path):
+    for i in range(3):
+        _build(tmp_path, i)
+    gc.collect()
+    assert vic.prune_index_cache(tmp_path, keep=2) == [vic.company_index_key(_names(0), "fake-embedding")]
+    assert vic.prune_index_cache(tmp_path, keep=2) == []
+
+
+def test_saved_index_is_reused_and_checked_against_its_manifest(tmp_path):
+    emb = bench.FakeEmbeddings()
+    vic.load_or_build_company_index(_names(0), emb, tmp_path, dataset_version="v0")
+    folder = tmp_path / vic.company_index_key(_names(0), "fake-embedding")
+    manifest = json.loads((folder / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["dataset_version"] == "v0" and manifest["ntotal"] == 4 and manifest["dim"] == emb.dim
+    calls = emb.requests
+    vs = vic.load_or_build_company_index(_names(0), emb, tmp_path)
+    assert emb.requests == calls  # opened from disk, nothing embedded
+    assert vs.index.ntotal == 4
+
+    manifest["ntotal"] = 5
+    (folder / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+    vs = vic.load_or_build_company_index(_names(0), emb, tmp_path)
+    assert emb.requests > calls  # mismatching manifest: rebuilt
+    assert json.loads((folder / "manifest.json").read_text(encoding="utf-8"))["ntotal"] == 4
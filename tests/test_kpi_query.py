@@ -0,0 +1,46 @@
+import pytest
+
+import bench
+import vic
+
+
+@pytest.fixture(scope="module")
+def kpi_table():
+    data = bench.generate_dataset(80, 6, seed=3)
+    return vic.DealStore.from_deals(data["data"], {}).kpi_table
+
+
+@pytest.mark.parametrize("top_k, rows", [(None, vic.KPI_MAX_ROWS), (0, vic.KPI_MAX_ROWS), (5, 5), (5.0, 5),
+                                         (-3, 1), (10 ** 6, vic.KPI_MAX_ROWS)])
+def test_top_k_is_clamped(kpi_table, top_k, rows):
+    result = vic.query_kpi_table(kpi_table, metrics=["revenue"], sort_by="revenue", top_k=top_k)
+    assert result["matched"] == 80
+    assert len(result["rows"]) == rows
+
+
+@pytest.mark.parametrize("top_k", ["5", 2.5, True, [3], float("nan")])
+def test_non_integer_top_k_is_an_error(kpi_table, top_k):
+    result = vic.query_kpi_table(kpi_table, metrics=["revenue"], top_k=top_k)
+    assert set(result) == {"error"}
+    assert "top_k" in result["error"]
+
+
+def test_rows_are_sorted_and_cut(kpi_table):
+    result = vic.query_kpi_table(kpi_table, metrics=["revenue"], sort_by="revenue", descending=True, top_k=3)
+    values = [row["revenue"] for row in result["rows"]]
+    assert values == sorted(values, reverse=True)
+    assert result["truncated"] is True
+
+
+def test_latest_takes_every_metric_from_the_same_period():
+    import pandas as pd
+
+    df = pd.DataFrame({
+        "deal_id": ["d1", "d1"], "company": ["Acme", "Acme"], "sector": ["fintech", "fintech"],
+        "currency": ["USD", "EUR"], "period": [2024 * 12, 2024 * 12 + 5],
+        **{m: [1.0, None] for m in vic.KPI_METRICS},
+    })
+    df.loc[1, "revenue"] = 2.0
+    row = vic.query_kpi_table(df, metrics=["revenue", "monthly_burn"])["rows"][0]
+    assert row["as_of"] == "2024-06"
+    assert (row["revenue"], row["monthly_burn"], row["currency"]) == (2.0, None, "EUR")
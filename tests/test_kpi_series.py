@@ -0,0 +1,58 @@
+import math
+
+import pandas as pd
+import pytest
+
+import vic
+
+P = 2024 * 12  # 2024-01
+
+ROWS = [  # (deal_id, company, period, revenue, monthly_burn)
+    ("a", "Acme", P, 10.0, 5.0),
+    ("a", "Acme", P + 1, None, 4.0),
+    ("a", "Acme", P + 2, 30.0, None),
+    ("b", "Beta", P, 50.0, 1.0),
+    ("c", "Cobalt", P + 1, 20.0, None),
+    ("c", "Cobalt", P + 2, 25.0, 2.0),
+    ("d", "Dune", P + 2, None, None),
+]
+
+
+@pytest.fixture
+def store():
+    table = pd.DataFrame(ROWS, columns=["deal_id", "company", "period", "revenue", "monthly_burn"])
+    for m in vic.KPI_METRICS:
+        if m not in table:
+            table[m] = float("nan")
+    return vic.KpiSeriesStore(table)
+
+
+def test_series_drops_missing_values(store):
+    periods, values = store.series("a", "revenue")
+    assert list(periods) == [P, P + 2]
+    assert list(values) == [10.0, 30.0]
+    assert len(store.series("d", "revenue")[0]) == 0
+
+
+def test_latest_and_latest_value(store):
+    values, periods = store.latest("revenue")
+    assert list(values[:3]) == [30.0, 50.0, 25.0] and math.isnan(values[3])
+    assert list(periods) == [P + 2, P, P + 2, -1]
+    assert store.latest_value("a", "burn") == ("2024-02", 4.0)  # alias of monthly_burn
+    assert store.latest_value("d", "revenue") is None
+    assert store.latest_value("missing", "revenue") is None
+
+
+def test_top_k_ranks_latest_values(store):
+    assert store.top_k("revenue", k=2) == [("Beta", 50.0, "2024-01"), ("Acme", 30.0, "2024-03")]
+    assert [t[0] for t in store.top_k("revenue", descending=False)] == ["Cobalt", "Acme", "Beta"]
+
+
+def test_top_k_window_keeps_recent_values_only(store):
+    assert store.top_k("revenue", window_months=1) == [("Acme", 30.0, "2024-03"), ("Cobalt", 25.0, "2024-03")]
+    assert store.top_k("monthly_burn", window_months=2) == [("Acme", 4.0, "2024-02"), ("Cobalt", 2.0, "2024-03")]
+
+
+def test_unknown_kpi_is_an_error(store):
+    with pytest.raises(ValueError):
+        store.top_k("ebitda")
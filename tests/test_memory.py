@@ -0,0 +1,36 @@
+import os
+import time
+
+import vic
+
+
+def test_rings_and_locks_are_bounded_together(tmp_path, monkeypatch):
+    monkeypatch.setattr(vic, "MEMORY_MAX_SESSIONS", 3)
+    store = vic.MemoryStore(tmp_path)
+    for i in range(10):
+        store.append(f"s{i}", f"question {i}", f"answer {i}")
+    assert list(store._rings) == ["s7", "s8", "s9"]
+    assert list(store._locks) == ["s7", "s8", "s9"]
+    # an evicted session is read back from its file
+    assert [(m["role"], m["content"]) for m in store.load("s0")] == [("user", "question 0"),
+                                                                      ("assistant", "answer 0")]
+
+
+def test_clear_drops_the_lock(tmp_path):
+    store = vic.MemoryStore(tmp_path)
+    store.append("s1", "q", "a")
+    store.clear("s1")
+    assert "s1" not in store._locks and "s1" not in store._rings
+    assert store.load("s1") == []
+
+
+def test_cleanup_by_age_and_count(tmp_path):
+    store = vic.MemoryStore(tmp_path)
+    store._next_cleanup = float("inf")  # no background run racing the explicit ones
+    for i in range(6):
+        store.append(f"s{i}", "q", "a")
+        stamp = time.time() - 86400 * (12 * i + 1)  # s0 is a day old, s5 61 days
+        os.utime(store.path(f"s{i}"), (stamp, stamp))
+    assert store.cleanup(ttl_days=30, max_files=100) == 3  # s3, s4, s5
+    assert store.cleanup(ttl_days=0, max_files=2) == 1     # s2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["s0.jsonl", "s1.jsonl"]
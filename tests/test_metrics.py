@@ -0,0 +1,62 @@
+import json
+import urllib.request
+from types import SimpleNamespace as NS
+
+import pytest
+
+import vic
+
+
+def test_spans_are_timed_counted_and_logged(tmp_path):
+    log = tmp_path / "spans.jsonl"
+    metrics = vic.Metrics(log_path=log)
+    for ms in range(1, 21):
+        metrics.record(vic.Span("route", {}), ms / 1000)
+    with metrics.span("final", model="gpt-4o") as s:
+        s.usage(NS(prompt_tokens=100, completion_tokens=20, prompt_tokens_details=NS(cached_tokens=64)))
+        s.usage(NS(input_tokens=5, output_tokens=1))  # Responses API field names
+        s.bytes = 42
+    with pytest.raises(ValueError):
+        with metrics.span("tool"):
+            raise ValueError
+
+    summary = metrics.summary()
+    assert summary["route"]["count"] == 20
+    assert (summary["route"]["p50_ms"], summary["route"]["p95_ms"]) == (11.0, 20.0)
+    final = summary["final"]
+    assert (final["prompt_tokens"], final["completion_tokens"], final["cached_tokens"]) == (105, 21, 64)
+    assert final["bytes"] == 42 and final["errors"] == 0
+    assert summary["tool"]["errors"] == 1
+
+    lines = [json.loads(line) for line in log.read_text().splitlines()]
+    assert len(lines) == 22
+    assert lines[20]["stage"] == "final" and lines[20]["model"] == "gpt-4o"
+    assert lines[21]["error"] == "ValueError"
+
+
+def test_window_bounds_the_quantiles():
+    metrics = vic.Metrics(log_path=None, window=5)
+    for seconds in [10.0] * 5 + [0.001] * 5:
+        metrics.record(vic.Span("route", {}), seconds)
+    assert metrics.summary()["route"]["p95_ms"] == 1.0
+    assert metrics.summary()["route"]["count"] == 10
+
+
+def test_prometheus_endpoint():
+    metrics = vic.Metrics(log_path=None)
+    metrics.record(vic.Span("route", {}), 0.5)
+    server = vic.serve_metrics(metrics, port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        body = urllib.request.urlopen(url, timeout=5).read().decode()
+    finally:
+        server.shutdown()
+    assert 'vic_stage_seconds_count{stage="route"} 1' in body
+    assert 'vic_tokens_total{stage="route",kind="prompt"} 0' in body
+
+
+def test_a_request_shares_one_id(engine):
+    engine.unified_answer("Which companies have revenue over $1m?", "s")
+    entries = [json.loads(line) for line in engine.metrics.log_path.read_text().splitlines()]
+    assert {e["stage"] for e in entries} >= {"request", "answer_cache", "route.local", "final"}
+    assert len({e["request"] for e in entries}) == 1
@@ -0,0 +1,67 @@
+import bench
+import vic
+
+
+def _deal():
+    deal = bench.generate_dataset(1, months=3, seed=5)["data"][0]
+    deal["investmentUpdates"][0]["textualData"]["overview"] = "First point. " + "Long sentence " * 120 + "end."
+    return deal
+
+
+def test_split_text_respects_the_limit():
+    pieces = vic._split_text("One. Two!\nThree? " + "x" * 25, limit=10)
+    assert pieces == ["One. Two!", "Three?", "x" * 10, "x" * 10, "x" * 5]
+
+
+def test_chunks_carry_company_period_and_section():
+    deal = _deal()
+    chunks = vic.narrative_chunks(deal)
+    ids = [cid for cid, _, _ in chunks]
+    assert len(ids) == len(set(ids))
+    overview = [c for c in chunks if c[2]["section"] == "overview" and c[2]["month"] == 1]
+    assert len(overview) == 3  # "First point." + the unbroken 1680-char run in two pieces
+    assert all(len(text.split(": ", 1)[1]) <= vic.NARRATIVE_CHUNK_CHARS for _, text, _ in overview)
+    cid, text, meta = overview[0]
+    assert text.startswith(f"{deal['companyName']} (2024-01) overview: First point.")
+    assert meta == {"deal_id": deal["id"], "company": deal["companyName"], "sector": deal["sector"],
+                    "year": 2024, "month": 1, "period": 2024 * 12, "section": "overview"}
+    assert {m["section"] for _, _, m in chunks} >= {"overview", "business_updates", "product_updates"}
+
+
+def test_search_filters_select_exact_candidates(engine):
+    deals = engine.data["data"]
+    fintech = {d["id"] for d in deals if d["sector"] == "Fintech"}
+    hits = engine.search_update_narratives("hiring engineers", sector="fintech", sections=["hiring_details"],
+                                           from_period="2024-03", top_k=50)
+    assert 0 < len(hits["passages"]) <= vic.NARRATIVE_MAX_K
+    for p in hits["passages"]:
+        assert p["section"] == "hiring_details" and p["period"] >= "2024-03"
+    found = {doc.metadata["deal_id"] for doc, _ in engine.narrative_index.search(
+        engine.embed_query("hiring"), 20, sector="Fintech")}
+    assert found and found <= fintech
+
+    one = deals[3]["companyName"]
+    hits = engine.search_update_narratives("product", companies=[one, "Nonexistent Zzyzx"])
+    assert {p["company"] for p in hits["passages"]} == {one}
+    assert hits["unmatched_companies"] == ["Nonexistent Zzyzx"]
+    assert engine.search_update_narratives("x", from_period="2030-01")["passages"] == []
+    assert "error" in engine.search_update_narratives("x", sections=["gossip"])
+
+
+def test_index_is_reused_and_updated_incrementally(engine, tmp_path):
+    index = engine.narrative_index
+    requests = engine.embeddings.requests
+    again = vic.load_or_build_narrative_index(engine.deal_store, engine.dataset_version, engine.embeddings,
+                                              engine.narrative_index_dir)
+    assert len(again) == len(index) and engine.embeddings.requests == requests
+
+    deals = engine.data["data"]
+    changed = [dict(deals[0], investmentUpdates=deals[0]["investmentUpdates"][:-1])] + deals[1:]
+    store = vic.DealStore.from_deals(changed)
+    per_update = len(vic.narrative_chunks(deals[0])) - len(vic.narrative_chunks(changed[0]))
+    updated, added, removed = vic.update_narrative_index(index, store, {"added": [], "removed": [],
+                                                                       "updated": [deals[0]["id"]]},
+                                                         "v2", engine.embeddings, tmp_path)
+    assert (added, removed) == (0, per_update)
+    assert len(updated) == len(index) - per_update
+    assert len(engine.narrative_index) == len(index)  # the live index is untouched
@@ -0,0 +1,40 @@
+import vic
+
+
+def test_lru_and_normalised_keys():
+    cache = vic.QueryEmbeddingCache(capacity=2)
+    cache.put("m", "Rollstack  Revenue", [1.0])
+    assert cache.get("m", "rollstack revenue") == [1.0]
+    assert cache.get("other-model", "rollstack revenue") is None
+    cache.put("m", "b", [2.0])
+    cache.get("m", "rollstack revenue")  # now the most recent
+    cache.put("m", "c", [3.0])
+    assert cache.get("m", "b") is None
+    assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5, "size": 2, "capacity": 2}
+
+
+def test_get_or_compute_calls_once():
+    cache = vic.QueryEmbeddingCache()
+    seen = []
+    compute = lambda text: seen.append(text) or [0.5]
+    assert cache.get_or_compute("m", " Acme  Corp ", compute) == [0.5]
+    assert cache.get_or_compute("m", "acme corp", compute) == [0.5]
+    assert seen == ["acme corp"]
+
+
+def test_persisted_entries_reload_and_the_file_is_compacted(tmp_path):
+    path = tmp_path / "q.jsonl"
+    cache = vic.QueryEmbeddingCache(capacity=2, path=path)
+    for i in range(6):
+        cache.put("m", f"q{i}", [float(i)])
+    assert len(path.read_text().splitlines()) <= 4  # compacted at twice the capacity
+    restarted = vic.QueryEmbeddingCache(capacity=2, path=path)
+    assert restarted.get("m", "q5") == [5.0] and restarted.get("m", "q4") == [4.0]
+    assert restarted.get("m", "q0") is None
+
+
+def test_engine_embeds_a_repeated_query_once(engine):
+    before = engine.embeddings.requests
+    first = engine.embed_query("unknown venture")
+    assert engine.embed_query("Unknown   venture") == first
+    assert engine.embeddings.requests == before + 1
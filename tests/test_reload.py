@@ -0,0 +1,56 @@
+import json
+import os
+
+import vic
+
+
+def _rewrite(engine, change):
+    data = json.loads(engine.data_path.read_text(encoding="utf-8"))
+    change(data["data"])
+    engine.data_path.write_text(json.dumps(data), encoding="utf-8")
+    st = engine.data_path.stat()
+    os.utime(engine.data_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))  # coarse mtime filesystems
+
+
+def _rename_and_add(deals):
+    deals[0]["companyName"] = "Renamed Robotics"
+    deals[0]["updatedAt"] = "2025-02-01T00:00:00Z"
+    deals.append({**deals[-1], "id": "deal-new", "companyName": "Freshly Added Co"})
+    del deals[1]
+
+
+def test_diff_deal_stores():
+    deals = [{"id": "a", "companyName": "A", "updatedAt": "1"}, {"id": "b", "companyName": "B", "updatedAt": "1"},
+             {"id": "c", "companyName": "C", "updatedAt": "1"}]
+    old = vic.DealStore.from_deals(deals)
+    new = vic.DealStore.from_deals([{**deals[0], "updatedAt": "2"}, deals[2], {"id": "d", "companyName": "D"}])
+    assert vic.diff_deal_stores(old, new) == {"added": ["d"], "removed": ["b"], "updated": ["a"]}
+
+
+def test_reload_swaps_in_a_new_version_and_embeds_only_changes(engine):
+    engine.warm_up()
+    old_version, old_vs = engine.dataset_version, engine.company_vs
+    removed = engine.data["data"][1]["companyName"]
+    before = engine.embeddings.requests
+    _rewrite(engine, _rename_and_add)
+
+    assert engine.reload()
+    assert engine.dataset_version != old_version
+    assert engine.embeddings.requests - before <= 3  # two new company names plus the changed narratives
+    assert engine.search_company("Renamed Robotics")[0] == "Renamed Robotics"
+    assert engine.search_company("Freshly Added Co")[1] == "deal-new"
+    names = {doc.page_content for doc in engine.company_vs.docstore._dict.values()}
+    assert "Freshly Added Co" in names and removed not in names
+    # the old index is untouched for requests still holding it
+    assert "Freshly Added Co" not in {doc.page_content for doc in old_vs.docstore._dict.values()}
+    assert engine.get_deal_digest("Freshly Added Co")["match"]["id"] == "deal-new"
+
+
+def test_unchanged_or_touched_file_is_not_reloaded(engine):
+    version = engine.dataset_version
+    assert not engine.reload()
+    st = engine.data_path.stat()
+    os.utime(engine.data_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert not engine.reload()
+    assert engine.dataset_version == version
+    assert not engine.reload()  # the new stat was recorded
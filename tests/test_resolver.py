@@ -0,0 +1,65 @@
+import pytest
+
+import vic
+
+DEALS = [
+    {"id": "d1", "companyName": "Rollstack", "companyUrl": "https://app.rollstack.com"},
+    {"id": "d2", "companyName": "Beta Robotics", "companyUrl": "https://medium.com/@beta"},
+    {"id": "d3", "companyName": "Quillpad", "companyUrl": "https://www.quill.co.uk/about",
+     "entityLegalName": "Quillpad Software Ltd"},
+    {"id": "d4", "companyName": "Northwind", "companyUrl": "https://northwindhq.com",
+     "investmentUpdates": [{"textualData": {"company_name_change": {"is_company_changing_name": True,
+                                                                    "new_name": "Southwind"}}}]},
+    {"id": "d5", "companyName": "Kestrel AI", "entityLegalName": "Open",
+     "investmentUpdates": [{"textualData": {"company_name_change": {"is_company_changing_name": True,
+                                                                    "new_name": "The Growth Group"}}}]},
+]
+
+
+@pytest.mark.parametrize("url, stem", [
+    ("https://app.rollstack.com", "rollstack"),
+    ("https://www.rollstack.com/pricing", "rollstack"),
+    ("https://docs.rollstack.co.uk", "rollstack"),
+    ("https://medium.com/@beta", None),
+    ("https://beta.notion.site/deck", None),
+    ("https://docsend.com/view/abc", None),
+    ("https://app.io", None),
+    ("https://abc.com", None),
+    ("https://update.com", None),
+    ("rollstack", None),
+    (None, None),
+])
+def test_domain_stem(url, stem):
+    assert vic._domain_stem(url) == stem
+
+
+@pytest.fixture
+def resolver():
+    return vic.CompanyResolver(DEALS)
+
+
+def test_aliases_resolve(resolver):
+    assert resolver.resolve("rollstack inc")[0]["id"] == "d1"
+    assert resolver.resolve("northwindhq") == [{"name": "Northwind", "id": "d4", "score": 99.0, "method": "alias"}]
+    assert resolver.resolve("Southwind")[0]["id"] == "d4"
+    assert resolver.resolve("Quillpad Software")[0]["id"] == "d3"
+
+
+def test_generic_words_are_not_mentions(resolver):
+    assert resolver.mentions("What did the app update say?") == []
+    assert resolver.mentions("anything new on medium or in the docs?") == []
+    assert resolver.mentions("Compare Rollstack and Southwind") == ["d1", "d4"]
+
+
+def test_records_carry_the_same_aliases(resolver):
+    store = vic.DealStore.from_deals(DEALS, {})
+    from_records = vic.CompanyResolver.from_records(store.records)
+    assert from_records.aliases == resolver.aliases
+
+
+def test_everyday_word_aliases_resolve_but_are_not_mentions(resolver):
+    assert resolver.resolve("Open")[0]["id"] == "d5"
+    assert resolver.resolve("The Growth Group")[0]["id"] == "d5"
+    assert resolver.mentions("Which open rounds grew the most?") == []
+    assert resolver.mentions("how is the growth group of our fintech companies doing") == []
+    assert resolver.mentions("How is Kestrel AI doing?") == ["d5"]
@@ -0,0 +1,70 @@
+import pytest
+
+import vic
+
+DEALS = [
+    {"id": "d1", "companyName": "Rollstack", "companyUrl": "https://rollstack.com"},
+    {"id": "d2", "companyName": "Quillpad", "companyUrl": "https://quillpad.io"},
+]
+
+
+@pytest.fixture
+def router():
+    return vic.IntentRouter(vic.CompanyResolver(DEALS), ["Fintech", "Healthcare"])
+
+
+def _kpi_args(route):
+    assert route["confidence"] >= vic.ROUTER_MIN_CONFIDENCE
+    [(tool, args)] = route["calls"]
+    assert tool == "query_kpis"
+    return args
+
+
+@pytest.mark.parametrize("question, stat, metric", [
+    ("What is the total revenue of the portfolio?", "sum", "revenue"),
+    ("average burn across the portfolio", "mean", "monthly_burn"),
+    ("median runway of our fintech companies", "median", "runway"),
+    ("How many companies have revenue over $1m?", "count", "revenue"),
+    ("How many customers do our companies have in total?", "sum", "customers"),
+])
+def test_statistics_cover_every_company(router, question, stat, metric):
+    args = _kpi_args(router.route(question))
+    assert args["portfolio_stat"] == stat
+    assert args["metrics"] == [metric]
+    assert "top_k" not in args and "sort_by" not in args
+
+
+def test_statistic_keeps_sector_and_threshold(router):
+    args = _kpi_args(router.route("Average burn of fintech companies burning more than 200k"))
+    assert args["sector"] == "Fintech"
+    assert args["filters"] == [{"metric": "monthly_burn", "op": ">", "value": 2e5}]
+
+
+def test_superlatives_rank_the_head(router):
+    args = _kpi_args(router.route("Which companies have the lowest runway?"))
+    assert args == {"metrics": ["runway"], "sort_by": "runway", "descending": False, "top_k": 10}
+    assert _kpi_args(router.route("top 3 companies by revenue"))["top_k"] == 3
+    assert "top_k" not in _kpi_args(router.route("Which companies have revenue above 500k?"))
+
+
+@pytest.mark.parametrize("question", [
+    "Which companies have above average revenue?",
+    "How did average revenue change since last quarter?",
+    "Average burn of companies with revenue over 2m",
+    "What is the average revenue by sector?",
+])
+def test_mixed_or_timed_statistics_go_to_the_model(router, question):
+    route = router.route(question)
+    assert route is None or route["confidence"] < vic.ROUTER_MIN_CONFIDENCE
+
+
+def test_single_and_named_companies(router):
+    assert router.route("How is Rollstack doing?")["calls"] == [("get_data_from_name", {"company_name": "Rollstack"})]
+    route = router.route("Total revenue of Rollstack and Quillpad")
+    assert route["calls"] == [("query_kpis", {"metrics": ["revenue"], "companies": ["Rollstack", "Quillpad"],
+                                              "portfolio_stat": "sum"})]
+
+
+def test_follow_ups_and_small_talk_are_left_to_the_model(router):
+    assert router.route("And what about their burn?") is None
+    assert router.route("hello there") is None
@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+import vic
+
+
+@pytest.fixture(scope="module")
+def pool(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("sandbox") / "v1"
+    vic.write_sandbox_frames({"deals": pd.DataFrame({"company": ["Acme", "Beta"], "moic": [1.5, 2.0]})}, folder)
+    pool = vic.SandboxPool(folder, workers=1)
+    yield pool
+    pool.close()
+
+
+def test_runs_pandas_code(pool):
+    result = pool.run("print(deals.moic.sum())\ndeals.company.str.upper().tolist()")
+    assert result["error"] is None
+    assert result["stdout"] == "3.5\n['ACME', 'BETA']\n"
+
+
+def test_writes_stay_in_the_job(pool):
+    assert pool.run("deals['moic'] = 0.0\nprint(deals.moic.sum())")["stdout"] == "0.0\n"
+    assert pool.run("print(deals.moic.sum())")["stdout"] == "3.5\n"
+
+
+@pytest.mark.parametrize("code", [
+    "pd.io.common.os.system('echo pwned')",
+    "pd.io.common.os.listdir('.')",
+    "np.lib.format.os.environ",
+    "m = pd.io\nm.common.os",
+    "from pandas.io.common import os",
+    "from pandas import io",
+    "import pandas.io.common",
+    "import operator\noperator.attrgetter('io.common.os')(pd)",
+    "deals.eval('@pd.io.common.os.getcwd()', engine='python')",
+    "pd.eval('pd.io', engine='python')",
+    "(x for x in []).gi_frame",
+    "np.save('x.npy', np.ones(3))",
+])
+def test_module_chains_are_rejected(pool, code):
+    result = pool.run(code)
+    assert result["error"]
+    assert result["stdout"] == ""
+
+
+def test_rejects_before_running():
+    with pytest.raises(vic.SandboxError):
+        vic.check_sandbox_code("deals.__class__")
+    with pytest.raises(vic.SandboxError):
+        vic.check_sandbox_code("import os")
+
+
+@pytest.mark.parametrize("call", [
+    "w = deals.to_csv\nw({path!r})",
+    "w = deals.to_json\nw(path_or_buf={path!r})",
+    "pd.DataFrame.to_csv(deals, {path!r})",
+    "list(map(deals.moic.to_csv, [{path!r}]))",
+    "import functools\nfunctools.partial(deals.to_string, {path!r})()",
+    "getattr(deals, 'to_csv')({path!r})",
+])
+def test_text_writers_cannot_touch_files(pool, tmp_path, call):
+    victim = tmp_path / "victim.txt"
+    victim.write_text("precious data")
+    created = tmp_path / "created.json"
+    for path in (victim, created):
+        result = pool.run(call.format(path=str(path)))
+        assert result["error"]
+    assert victim.read_text() == "precious data"
+    assert not created.exists()
+
+
+def test_text_writers_still_return_text(pool):
+    result = pool.run("w = deals.to_csv\nprint(w(index=False))")
+    assert result["error"] is None
+    assert result["stdout"].startswith("company,moic")
+
+
+def test_workers_start_in_an_empty_directory(pool):
+    assert pool.run("deals.to_csv('x.csv')")["error"]
+    import os
+    assert os.listdir(pool.work_dir) == []
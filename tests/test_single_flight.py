@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import vic
+
+
+def test_concurrent_callers_share_one_run():
+    flights = vic.SingleFlight()
+    entered, release = threading.Event(), threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        entered.set()
+        release.wait(5)
+        return "value"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flights.do, "k", work)
+        assert entered.wait(5)
+        followers = [pool.submit(flights.do, "k", work) for _ in range(3)]
+        while flights.stats()["shared"] < 3:
+            pass
+        release.set()
+        results = [f.result(5) for f in [leader] + followers]
+    assert runs == [1]
+    assert results == [("value", False)] + [("value", True)] * 3
+    assert flights.stats() == {"in_flight": 0, "led": 1, "shared": 3}
+
+
+def test_nothing_is_kept_after_landing():
+    flights = vic.SingleFlight()
+    assert flights.do("k", lambda: 1) == (1, False)
+    assert flights.do("k", lambda: 2) == (2, False)
+
+
+def test_errors_reach_every_waiter():
+    flights = vic.SingleFlight()
+    fut, leader = flights.join("k")
+    follower, shared = flights.join("k")
+    assert leader and not shared and follower is fut
+    flights.settle("k", fut, error=ValueError("boom"))
+    with pytest.raises(ValueError):
+        follower.result(1)
+
+
+def test_async_callers_share_one_run():
+    flights = vic.SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(flights.ado("k", work) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert runs == [1]
+    assert sorted(shared for _, shared in results) == [False] + [True] * 4
+
+
+def test_flight_key_normalises_arguments():
+    a = vic.flight_key("query_kpis", {"sector": " Fin  tech", "metrics": ["revenue"]}, "v1")
+    b = vic.flight_key("query_kpis", {"metrics": ["revenue"], "sector": "Fin tech"}, "v1")
+    assert a == b
+    assert a != vic.flight_key("query_kpis", {"metrics": ["revenue"], "sector": "Fin tech"}, "v2")
+
+
+class RateLimitError(Exception):
+    """Same name as the openai error, so `_is_transient` would treat it as transient."""
+
+
+def test_the_leader_leaves_retries_to_the_client():
+    flights = vic.SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        raise RateLimitError()
+
+    with pytest.raises(RateLimitError):
+        flights.do("k", work)
+    assert calls == [1]
+
+
+def test_answer_waiters_give_up_on_a_stuck_leader(engine, monkeypatch):
+    monkeypatch.setattr(vic, "ANSWER_FLIGHT_TIMEOUT_S", 0.05)
+    monkeypatch.setattr(engine.answer_cache, "put", lambda *a, **k: None)  # both calls reach the flight
+    question = "Give me a summary of Bluelabs 3"
+    slot = engine._answer_cache_slot(question)
+    assert slot
+    stuck, leader = engine.flights.join(("answer", slot[0]))
+    assert leader
+    assert engine.unified_answer(question, "sync")
+    assert asyncio.run(engine.aunified_answer(question, "async"))
+    assert not stuck.done()
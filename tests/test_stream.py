@@ -0,0 +1,26 @@
+def test_status_then_token_deltas(engine, fake):
+    name = engine.data["data"][0]["companyName"]
+    events = list(engine.unified_answer_stream(f"Give me a summary of {name}", "s"))
+    kinds = [e["type"] for e in events]
+    assert kinds[0] == "status"
+    assert kinds.index("token") > kinds.index("status")
+    assert set(kinds[kinds.index("token"):]) == {"token"}
+    tokens = [e["text"] for e in events if e["type"] == "token"]
+    assert len(tokens) == fake.answer_tokens
+    assert engine._load_memory("s")[-1]["content"] == "".join(tokens)
+
+
+def test_memory_is_written_only_once_the_stream_finishes(engine):
+    stream = engine.unified_answer_stream("Which companies have revenue over $1m?", "s")
+    for event in stream:
+        if event["type"] == "token":
+            break
+    assert engine._load_memory("s") == []
+    stream.close()
+    assert engine._load_memory("s") == []
+
+
+def test_unified_answer_joins_the_stream(engine):
+    question = "Which companies have revenue over $1m?"
+    streamed = "".join(e["text"] for e in engine.unified_answer_stream(question, "a") if e["type"] == "token")
+    assert engine.unified_answer(question + " please", "b") == streamed
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import vic
+
+
+def _call(name, arguments="{}"):
+    return SimpleNamespace(id=f"call-{name}", function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def _drain(gen):
+    try:
+        while True:
+            next(gen)
+    except StopIteration as stop:
+        return stop.value
+
+
+def test_stalled_call_does_not_starve_later_calls(engine, monkeypatch):
+    monkeypatch.setattr(vic, "TOOL_MAX_WORKERS", 1)
+    monkeypatch.setitem(vic.TOOL_TIMEOUTS_S, "hang", 0.2)
+    release = threading.Event()
+
+    def run_tool(fn_name, args):
+        if fn_name == "hang":
+            release.wait(10)
+        return f"{fn_name} done"
+
+    monkeypatch.setattr(engine, "_run_tool", run_tool)
+    try:
+        first = _drain(engine._run_tool_calls([_call("hang"), _call("quick")]))
+        assert first[0] == "[hang timed out after 0.2s]"
+        assert first[1] == "quick done"
+        assert len(engine._stalled) == 1
+
+        started = time.monotonic()
+        assert _drain(engine._run_tool_calls([_call("quick")])) == ["quick done"]
+        assert time.monotonic() - started < 1  # not queued behind the stalled call
+    finally:
+        release.set()
+    deadline = time.monotonic() + 5
+    while engine._stalled and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not engine._stalled
+
+
+def test_invalid_arguments_only_affect_their_call(engine, monkeypatch):
+    monkeypatch.setattr(engine, "_run_tool", lambda fn_name, args: f"{fn_name}:{args['x']}")
+    contents = _drain(engine._run_tool_calls([_call("a", '{"x": 1}'), _call("b", "{not json"), _call("c", '{"x": 3}')]))
+    assert contents[0] == "a:1" and contents[2] == "c:3"
+    assert contents[1].startswith("[Invalid arguments for b]")
+
+
+def test_async_timeouts_report_fractions_of_a_second(engine, monkeypatch):
+    monkeypatch.setitem(vic.TOOL_TIMEOUTS_S, "hang", 0.3)
+
+    async def run_tool(fn_name, args):
+        await asyncio.sleep(1 if fn_name == "hang" else 0)
+        return f"{fn_name} done"
+
+    monkeypatch.setattr(engine, "_arun_tool", run_tool)
+    contents = asyncio.run(engine._arun_tool_calls([_call("hang"), _call("quick")]))
+    assert contents == ["[hang timed out after 0.3s]", "quick done"]
@@ -0,0 +1,39 @@
+import bench
+
+
+def _calls(fake):
+    return {k: fake.calls.get(k, 0) for k in ("files.create", "files.delete", "responses")}
+
+
+def test_dataset_is_uploaded_once_per_version(tmp_path, fake, engine):
+    assert engine.run_python_query_on_json("Average revenue by sector") == "[fake code interpreter output]"
+    engine.run_python_query_on_json("Median revenue by stage")
+    assert _calls(fake) == {"files.create": 1, "files.delete": 0, "responses": 2}
+
+    restarted = bench._engine(tmp_path, engine.data_path, fake, bench.FakeEmbeddings())
+    assert restarted.dataset_file_id() == engine.dataset_file_id()
+    assert fake.calls["files.create"] == 1
+
+
+def test_expired_upload_is_sent_again(fake, engine, monkeypatch):
+    first = engine.dataset_file_id()
+    real = fake.responses.create
+
+    class NotFoundError(Exception):
+        pass
+
+    def responses(**kw):
+        if first in kw["tools"][0]["container"]["file_ids"]:
+            raise NotFoundError(first)
+        return real(**kw)
+
+    monkeypatch.setattr(fake.responses, "create", responses)
+    assert engine.run_python_query_on_json("Average revenue") == "[fake code interpreter output]"
+    assert fake.calls["files.create"] == 2
+    assert engine.dataset_file_id() != first
+
+
+def test_unified_answer_routes_analysis_to_the_code_interpreter(fake, engine):
+    engine.unified_answer("What is the average revenue by sector?", "s")
+    assert fake.calls["files.create"] == 1
+    assert fake.calls["responses"] == 1
@@ -1,135 +1,203 @@
 # vic.py
+import asyncio
+import contextvars
+import hashlib
 import json
-import tempfile
-import openai
-from openai import OpenAI
-import requests
+import logging
+import math
 import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections.abc import Mapping
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
-from typing import List, Dict
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, Generator, Iterator, List, Optional
 
-# --- LangChain (keeping your original imports; deprecation warnings are fine) ---
-from langchain.vectorstores import FAISS
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.chains import RetrievalQA
-from langchain.chat_models import ChatOpenAI
-from langchain.docstore.document import Document
+# Heavy clients (openai, LangChain, FAISS) are imported where they are first
+# needed, so importing this module is cheap for the UI, workers and tests.
 
-print("vic.py started")
+logger = logging.getLogger(__name__)  # best-effort warnings (cache misses, fallbacks); never raised
 
 # =========================
-# Data load
+# Configuration
 # =========================
-tmp_path = "investment_updates.json"
-with open(tmp_path, encoding='utf-8') as f:
-    data = json.load(f)
+DATA_PATH = Path("investment_updates.json")
+INDEX_CACHE_DIR = Path(os.getenv("VIC_INDEX_CACHE_DIR", ".vic_cache/company_index"))
+FAISS_MMAP = os.getenv("VIC_FAISS_MMAP", "1") != "0"  # open saved vector indexes memory-mapped, read-only
+INDEX_KEEP = int(os.getenv("VIC_INDEX_KEEP", "3"))  # most recently used indexes kept per cache dir on save
+MEMORY_DIR = Path(os.getenv("VIC_MEMORY_DIR", "chat_memory"))
+UPLOAD_CACHE_PATH = Path(os.getenv("VIC_UPLOAD_CACHE", ".vic_cache/uploads.json"))
+MAX_TURNS = 8  # keep last 8 user/assistant pairs (16 messages)
 
 # =========================
-# Build simple high-level string (unused, preserved)
+# Company index (FAISS)
 # =========================
-company_list = ""
-for r in range(len(data['data'])):
-    company = (f"Company: {data['data'][r]['companyName']}\n")
-    company_list += "--------------------------------------------------\n"
-    company_list += f"{company}\n"
-    for update in range(len(data['data'][r]['investmentUpdates'])):
+def _embedding_model_id(emb) -> str:
+    """Best-effort identifier of the embedding model behind a LangChain embeddings object."""
+    return str(getattr(emb, "model", None) or getattr(emb, "model_name", None) or type(emb).__name__)
+
+def company_index_key(names: List[str], model_id: str) -> str:
+    """Content hash of the sorted company names plus the embedding model id."""
+    h = hashlib.sha256(model_id.encode("utf-8"))
+    for name in sorted(names):
+        h.update(b"\0")
+        h.update(name.encode("utf-8"))
+    return h.hexdigest()
+
+def load_or_build_company_index(names: List[str], embeddings, cache_dir: Path = INDEX_CACHE_DIR,
+                                dataset_version: Optional[str] = None):
+    """
+    Load the company FAISS index from `cache_dir` when its key matches,
+    otherwise embed every name once and save the result for the next start.
+    """
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+
+    key = company_index_key(names, _embedding_model_id(embeddings))
+    path = Path(cache_dir) / key
+    if (path / "index.faiss").exists():
         try:
-            iu = data['data'][r]['investmentUpdates']
-            update_month = iu[update]['textualData']['update_month']
-            revenue_type = iu[update]['kpis']['revenueType']
-            update_revenue = iu[update]['kpis']['revenue']
-            update_year = iu[update]['receivedYear']
-            company_data = (
-                f"As of Date: {update_month}, {update_year} | Lastest {revenue_type}: {update_revenue}|"
-            )
-            company_list += f"{company_data}\n"
-        except Exception:
-            continue
+            return _open_index(path, embeddings)
+        except Exception as e:
+            logger.warning("company index cache unreadable (%s), rebuilding", e)
+            shutil.rmtree(path, ignore_errors=True)  # else the rebuilt index can't replace it
 
-# =========================
-# Environment / Clients
-# =========================
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-print(">> vic.py loaded")
-if not OPENAI_API_KEY:
-    raise RuntimeError("Set OPENAI_API_KEY in your environment (locally: .env or PowerShell; cloud: Secrets).")
+    # docstore ids are the names themselves, so later updates can delete by name
+    unique = list(dict.fromkeys(names))
+    vs = FAISS.from_documents([Document(page_content=name) for name in unique], embeddings, ids=unique)
+    return _publish_index(vs, path, dataset_version)
 
-# Explicitly pass API key (keeps old packages happy)
-embedding = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-client = OpenAI(api_key=OPENAI_API_KEY)
+def _index_io_flags() -> int:
+    import faiss
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)  # faiss >= 1.10
+    return mmap_flag | faiss.IO_FLAG_READ_ONLY if FAISS_MMAP and mmap_flag is not None else 0
 
-# =========================
-# Company index (FAISS)
-# =========================
-# Step 1: Build dictionary: company name → ID
-company_id_map: Dict[str, str] = {}
-company_names: List[str] = []
-for item in data['data']:
-    name = item['companyName']
-    cid = item['id']
-    company_id_map[name] = cid
-    company_names.append(name)
-
-# Step 2: Embed all company names
-embedding_model = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-company_docs = [Document(page_content=name) for name in company_names]
-company_vs = FAISS.from_documents(company_docs, embedding_model)
-print("faiss done, hell yeah")
-
-# Step 3: Search helpers
-def search_company(query, k=1):
-    results = company_vs.similarity_search(query, k=k)
-    for doc in results:
-        name = doc.page_content
-        company_id = company_id_map[name]
-        return name, company_id
+def _open_index(path: Path, embeddings):
+    """
+    Saved index at `path`, memory-mapped read-only when possible: every process
+    opening the same file shares its pages through the OS page cache. Checked
+    against the folder's manifest when there is one.
+    """
+    from langchain_community.vectorstores import FAISS
 
-def get_data_from_id(cid):
-    for r in range(len(data['data'])):
-        if data['data'][r]['id'] == cid:
-            return data['data'][r]
+    vs = FAISS.load_local(str(path), embeddings, allow_dangerous_deserialization=True, io_flags=_index_io_flags())
+    try:
+        manifest = json.loads((path / "manifest.json").read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        manifest = None  # saved before manifests existed
+    found = {"ntotal": vs.index.ntotal, "dim": vs.index.d, "embedding_model": _embedding_model_id(embeddings)}
+    if manifest is not None and any(manifest.get(k) != v for k, v in found.items()):
+        raise ValueError(f"index {found} does not match its manifest {manifest}")
+    with _open_indexes_lock:
+        _open_indexes[vs] = path.resolve()
+    try:
+        os.utime(path)  # mtime = last use, for prune_index_cache
+    except OSError:
+        pass
+    return vs
 
-def get_data_from_name(company_name):
-    name, cid = search_company(company_name)
-    return get_data_from_id(cid)
+# indexes opened by this process (store → folder), so pruning never deletes one in use
+_open_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_open_indexes_lock = threading.Lock()
 
-# =========================
-# Memory (file-backed JSONL)
-# =========================
-MEMORY_PATH = Path("chat_memory.jsonl")
-MAX_TURNS = 8  # keep last 8 user/assistant pairs (16 messages)
+def prune_index_cache(cache_dir: Path, keep: int = INDEX_KEEP) -> List[str]:
+    """
+    Delete saved indexes in `cache_dir` beyond the `keep` most recently used
+    (by folder mtime), except ones this process has open. Other processes
+    sharing the cache are protected only by recency. Returns the deleted names.
+    """
+    with _open_indexes_lock:
+        live = set(_open_indexes.values())
+    folders = sorted((d for d in Path(cache_dir).iterdir() if d.is_dir() and ".tmp" not in d.name),
+                     key=lambda d: d.stat().st_mtime, reverse=True)
+    removed = []
+    for old in folders[max(0, keep):]:
+        if old.resolve() not in live:
+            shutil.rmtree(old, ignore_errors=True)
+            removed.append(old.name)
+    return removed
 
-def _load_memory() -> List[Dict[str, str]]:
+def _save_index(vs, path: Path, dataset_version: Optional[str] = None) -> bool:
     """
-    Returns prior messages as a list of dicts:
-    [{'role':'user','content':...}, {'role':'assistant','content':...}, ...]
+    Publish `vs` at `path` atomically, with a manifest.json tying it to
+    `dataset_version`, then prune the cache dir down to the INDEX_KEEP most
+    recently used indexes (best-effort). True if `path` now holds the index.
     """
-    if not MEMORY_PATH.exists():
-        return []
-    msgs: List[Dict[str, str]] = []
     try:
-        with MEMORY_PATH.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    msgs.append(json.loads(line))
-                except Exception:
-                    continue
-        # keep only the last 2*MAX_TURNS messages
-        return msgs[-(2 * MAX_TURNS):]
-    except Exception:
-        return []
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+        vs.save_local(str(tmp))
+        manifest = {
+            "dataset_version": dataset_version,
+            "embedding_model": _embedding_model_id(vs.embedding_function),
+            "ntotal": vs.index.ntotal,
+            "dim": vs.index.d,
+            "created": round(time.time(), 3),
+        }
+        (tmp / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            # another process published the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+        prune_index_cache(path.parent, INDEX_KEEP)
+        return True
+    except Exception as e:
+        logger.warning("could not persist index %s (%s)", path.name, e)
+        return False
 
-def _append_memory(user_text: str, assistant_text: str) -> None:
-    """Append the latest user/assistant messages to memory (best-effort)."""
+def _publish_index(vs, path: Path, dataset_version: Optional[str] = None):
+    """Save `vs` and hand back the memory-mapped copy of the saved file (`vs` itself if that fails)."""
+    if not _save_index(vs, path, dataset_version) or not _index_io_flags():
+        return vs
     try:
-        with MEMORY_PATH.open("a", encoding="utf-8") as f:
-            f.write(json.dumps({"role": "user", "content": user_text}, ensure_ascii=False) + "\n")
-            f.write(json.dumps({"role": "assistant", "content": assistant_text}, ensure_ascii=False) + "\n")
-    except Exception:
-        pass
+        return _open_index(path, vs.embedding_function)
+    except Exception as e:
+        logger.warning("could not reopen index %s (%s)", path.name, e)
+        return vs
+
+def _clone_index(vs):
+    """Independent, writable copy of a LangChain FAISS store (index, docstore and id map)."""
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    return FAISS(
+        vs.embedding_function,
+        # not faiss.clone_index: on a memory-mapped index that only views the vectors, and adding to it aborts
+        faiss.deserialize_index(faiss.serialize_index(vs.index)),
+        InMemoryDocstore(dict(vs.docstore._dict)),
+        dict(vs.index_to_docstore_id),
+        relevance_score_fn=vs.override_relevance_score_fn,
+        normalize_L2=vs._normalize_L2,
+        distance_strategy=vs.distance_strategy,
+    )
+
+def update_company_index(vs, names: List[str], embeddings, cache_dir: Path = INDEX_CACHE_DIR,
+                         dataset_version: Optional[str] = None) -> tuple:
+    """
+    (index, added, removed): a copy of `vs` holding exactly `names`, embedding
+    only names it lacks and dropping the ones that are gone. `vs` itself is not
+    touched, so requests still searching it are unaffected.
+    """
+    current = {doc.page_content: doc_id for doc_id, doc in vs.docstore._dict.items()}
+    wanted = set(names)
+    added = [name for name in dict.fromkeys(names) if name not in current]
+    removed = [doc_id for name, doc_id in current.items() if name not in wanted]
+    new = _clone_index(vs)
+    if removed:
+        new.delete(removed)
+    if added:
+        new.add_texts(added, ids=added)
+    path = Path(cache_dir) / company_index_key(names, _embedding_model_id(embeddings))
+    return _publish_index(new, path, dataset_version), len(added), len(removed)
 
 # =========================
 # JSON schema string (unchanged)
@@ -453,152 +521,4272 @@ interface AllPeriodWiseKpiEntry {
 """
 
 # =========================
-# Python-code tool (unchanged behavior)
+# KPI table (local columnar query engine)
 # =========================
-def run_python_query_on_json(query: str) -> str:
+# One row per (deal, year, month); values from allPeriodWiseKpis win over the
+# per-update kpis block, which only fills gaps.
+KPI_METRICS = [
+    "revenue", "monthly_burn", "runway", "current_cash_balance",
+    "customers", "gross_margin", "arr_revenue", "annual_revenue",
+]
+KPI_AGGREGATES = ["latest", "mean", "sum", "min", "max", "count", "growth"]
+KPI_FILTER_OPS = {
+    ">": "gt", ">=": "ge", "<": "lt", "<=": "le", "==": "eq", "!=": "ne",
+}
+KPI_MAX_ROWS = 50
+
+def _num(value) -> Optional[float]:
+    """Coerce KPI values (numbers or numeric strings) to float; anything else is missing."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _period_rows(deal: Dict[str, Any]):
+    base = {
+        "deal_id": deal.get("id"),
+        "company": deal.get("companyName"),
+        "sector": deal.get("sector"),
+    }
+    for entry in deal.get("allPeriodWiseKpis") or []:
+        k = entry.get("kpis") or {}
+        yield {
+            **base,
+            "year": entry.get("receivedYear"),
+            "month": entry.get("receivedMonth"),
+            "currency": entry.get("currency"),
+            "revenue_type": entry.get("revenueTooltip"),
+            "revenue": _num(k.get("revenue")),
+            "monthly_burn": _num(k.get("monthly_burn")),
+            "runway": _num(k.get("runway")),
+            "current_cash_balance": _num(k.get("current_cash_balance")),
+            "customers": _num(k.get("customers")),
+            "gross_margin": _num(k.get("grossMargin")),
+        }
+    for update in deal.get("investmentUpdates") or []:
+        k = update.get("kpis") or {}
+        yield {
+            **base,
+            "year": update.get("receivedYear"),
+            "month": update.get("receivedMonth"),
+            "currency": k.get("currency"),
+            "revenue_type": k.get("revenueType"),
+            "revenue": _num(k.get("revenue")),
+            "monthly_burn": _num(k.get("monthly_burn")),
+            "runway": _num(k.get("runway")),
+            "current_cash_balance": _num(k.get("current_cash_balance")),
+            "customers": _num(k.get("customers")),
+            "arr_revenue": _num((k.get("arr_revenue") or {}).get("arr_revenue_amount")),
+            "annual_revenue": _num((k.get("annual_revenue") or {}).get("annual_revenue_amount")),
+        }
+
+def build_kpi_table(deals: List[Dict[str, Any]]):
+    """Flatten every deal's KPI history into a pandas DataFrame sorted by (deal_id, period)."""
+    import pandas as pd
+
+    columns = ["deal_id", "company", "sector", "year", "month", "currency", "revenue_type"] + KPI_METRICS
+    df = pd.DataFrame.from_records([row for deal in deals for row in _period_rows(deal)], columns=columns)
+    df = df.dropna(subset=["deal_id", "year", "month"])
+    df["year"] = df["year"].astype("int64")
+    df["month"] = df["month"].astype("int64")
+    df[KPI_METRICS] = df[KPI_METRICS].astype("float64")
+    # groupby().first() keeps the first non-null value per column, i.e. allPeriodWiseKpis first
+    df = df.groupby(["deal_id", "year", "month"], sort=False, as_index=False).first()
+    df["period"] = df["year"] * 12 + (df["month"] - 1)
+    return df.sort_values(["deal_id", "period"], ignore_index=True)
+
+def _parse_period(value: Optional[str]) -> Optional[int]:
+    """'YYYY-MM' or 'YYYY' → month index comparable with the table's `period` column."""
+    if not value:
+        return None
+    parts = str(value).split("-")
+    return int(parts[0]) * 12 + (int(parts[1]) - 1 if len(parts) > 1 else 0)
+
+def _clean_value(value):
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return None if value != value else round(value, 4)
+    if hasattr(value, "item"):  # numpy scalar
+        return _clean_value(value.item())
+    return value
+
+def query_kpi_table(
+    df,
+    metrics: Optional[List[str]] = None,
+    filters: Optional[List[Dict[str, Any]]] = None,
+    sort_by: Optional[str] = None,
+    descending: bool = True,
+    top_k: Optional[int] = None,
+    aggregate: str = "latest",
+    companies: Optional[List[str]] = None,
+    sector: Optional[str] = None,
+    from_period: Optional[str] = None,
+    to_period: Optional[str] = None,
+    portfolio_stat: Optional[str] = None,
+) -> Dict[str, Any]:
     """
-    Delegate execution to OpenAI's code interpreter using the Responses API.
-    Uploads in-memory JSON to a temp file and attaches it.
+    Reduce each company's KPI history to one value per metric (`aggregate` over the
+    optional period window), then filter, sort and cut to `top_k`. "latest" takes
+    every metric from the company's latest period with any of them reported.
+    `portfolio_stat` additionally summarises the matched companies (sum/mean/median/min/max/count).
     """
-    try:
-        # Save current data to a temp file
-        tpath = os.path.join(tempfile.gettempdir(), "investment_data.json")
-        with open(tpath, "w", encoding="utf-8") as f:
-            json.dump(data, f)
+    filters = filters or []
+    wanted = list(dict.fromkeys((metrics or []) + [f.get("metric") for f in filters] + ([sort_by] if sort_by else [])))
+    if not wanted:
+        wanted = ["revenue"]
+    unknown = [m for m in wanted if m not in KPI_METRICS]
+    if unknown:
+        return {"error": f"unknown metric(s) {unknown}; choose from {KPI_METRICS}"}
+    if aggregate not in KPI_AGGREGATES:
+        return {"error": f"unknown aggregate {aggregate!r}; choose from {KPI_AGGREGATES}"}
+    if top_k is not None and (isinstance(top_k, bool) or not isinstance(top_k, (int, float))
+                              or not float(top_k).is_integer()):
+        return {"error": f"top_k must be a whole number, got {top_k!r}"}
 
-        # Upload the file
-        up = client.files.create(file=open(tpath, "rb"), purpose="assistants")
+    rows = df
+    if companies:
+        wanted_names = {c.casefold() for c in companies}
+        rows = rows[rows["company"].str.casefold().isin(wanted_names)]
+    if sector:
+        rows = rows[rows["sector"].fillna("").str.contains(sector, case=False, regex=False)]
+    lo, hi = _parse_period(from_period), _parse_period(to_period)
+    if lo is not None:
+        rows = rows[rows["period"] >= lo]
+    if hi is not None:
+        rows = rows[rows["period"] <= hi]
+    rows = rows.dropna(subset=wanted, how="all")
 
-        # Compose input
-        prompt = f"""
-Use Python for this task.
-The User query is: {query}
+    keys = ["deal_id", "company", "sector"]
+    grouped = rows.groupby(keys, dropna=False, sort=False)
+    if aggregate == "latest":
+        # every metric from the same (latest) period, so the row is what `as_of` says it is
+        latest = grouped.tail(1).set_index(keys)
+        out, period = latest[wanted + ["currency"]], latest["period"]
+    else:
+        if aggregate == "growth":
+            first, last = grouped[wanted].first(), grouped[wanted].last()
+            out = (last - first) / first.abs().where(first != 0)
+        else:
+            out = grouped[wanted].agg(aggregate)
+        period = grouped["period"].max()
+    out["as_of"] = period.map(lambda p: f"{p // 12:04d}-{p % 12 + 1:02d}")
+    out = out.reset_index()
 
-You have to use the uploaded JSON file to answer the query.
-The structure of the JSON file is as follows:
-{json_structure}
-Also show what code you wrote to get the answer.
+    for f in filters:
+        op = KPI_FILTER_OPS.get(f.get("op"))
+        if op is None:
+            return {"error": f"unknown filter op {f.get('op')!r}; choose from {list(KPI_FILTER_OPS)}"}
+        out = out[getattr(out[f["metric"]], op)(float(f["value"]))]
+
+    result: Dict[str, Any] = {"aggregate": aggregate, "matched": int(len(out))}
+    if portfolio_stat:
+        result["portfolio"] = {m: _clean_value(out[m].agg(portfolio_stat)) for m in wanted}
+    if sort_by:
+        out = out.sort_values(sort_by, ascending=not descending, na_position="last")
+    limit = max(1, min(int(top_k or KPI_MAX_ROWS), KPI_MAX_ROWS))
+    result["rows"] = [
+        {k: _clean_value(v) for k, v in rec.items() if k != "deal_id"}
+        for rec in out.head(limit).to_dict("records")
+    ]
+    if len(out) > limit:
+        result["truncated"] = True
+    return result
+
+QUERY_KPIS_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "query_kpis",
+        "description": (
+            "Filter, rank, compare or aggregate KPI numbers across companies using the local KPI table "
+            "(one value per company, reduced over time by `aggregate`). Fast; prefer it for numeric multi-company questions."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "metrics": {"type": "array", "items": {"type": "string", "enum": KPI_METRICS},
+                            "description": "KPIs to return per company (filter/sort metrics are added automatically)."},
+                "filters": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "metric": {"type": "string", "enum": KPI_METRICS},
+                            "op": {"type": "string", "enum": list(KPI_FILTER_OPS)},
+                            "value": {"type": "number"},
+                        },
+                        "required": ["metric", "op", "value"],
+                    },
+                },
+                "sort_by": {"type": "string", "enum": KPI_METRICS},
+                "descending": {"type": "boolean"},
+                "top_k": {"type": "integer", "description": f"Max rows to return (<= {KPI_MAX_ROWS})."},
+                "aggregate": {"type": "string", "enum": KPI_AGGREGATES,
+                              "description": "How each company's periods are reduced; growth = (last - first) / first."},
+                "companies": {"type": "array", "items": {"type": "string"}},
+                "sector": {"type": "string"},
+                "from_period": {"type": "string", "description": "YYYY-MM (inclusive)"},
+                "to_period": {"type": "string", "description": "YYYY-MM (inclusive)"},
+                "portfolio_stat": {"type": "string", "enum": ["sum", "mean", "median", "min", "max", "count"]},
+            },
+        },
+    },
+}
+
+# =========================
+# Query embedding cache (LRU, optionally persisted)
+# =========================
+QUERY_EMBED_CACHE_SIZE = 512
+QUERY_EMBED_CACHE_PATH = Path(os.getenv("VIC_QUERY_EMBED_CACHE", ".vic_cache/query_embeddings.jsonl"))
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of query vectors keyed by (model id, normalised text).
+    With `path`, new entries are appended to a JSONL file and the most recent
+    `capacity` entries are reloaded on start; the file is compacted when it
+    grows past twice the capacity.
+    """
+
+    def __init__(self, capacity: int = QUERY_EMBED_CACHE_SIZE, path: Optional[Path] = None):
+        from collections import OrderedDict
+
+        self.capacity = capacity
+        self.path = Path(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._file_lines = 0
+        if self.path and self.path.exists():
+            self._load()
+
+    @staticmethod
+    def key(model_id: str, text: str) -> tuple:
+        return model_id, " ".join(text.casefold().split())
+
+    def _load(self) -> None:
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    self._file_lines += 1
+                    try:
+                        rec = json.loads(line)
+                        self._put((rec["model"], rec["text"]), rec["vector"])
+                    except Exception:
+                        continue
+        except OSError:
+            pass
+
+    def _put(self, key: tuple, vector: List[float]) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def _persist(self, key: tuple, vector: List[float]) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self._file_lines >= 2 * self.capacity:
+                tmp = self.path.with_name(f"{self.path.name}.tmp{os.getpid()}")
+                with tmp.open("w", encoding="utf-8") as f:
+                    for (model, text), vec in self._entries.items():
+                        f.write(json.dumps({"model": model, "text": text, "vector": vec}) + "\n")
+                os.replace(tmp, self.path)
+                self._file_lines = len(self._entries)
+            else:
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps({"model": key[0], "text": key[1], "vector": vector}) + "\n")
+                self._file_lines += 1
+        except Exception as e:
+            logger.warning("could not persist query embedding (%s)", e)
+
+    def get(self, model_id: str, text: str) -> Optional[List[float]]:
+        """Cached vector or None; counts a hit or a miss."""
+        key = self.key(model_id, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, model_id: str, text: str, vector: List[float]) -> None:
+        key = self.key(model_id, text)
+        with self._lock:
+            self._put(key, vector)
+            if self.path:
+                self._persist(key, vector)
+
+    def get_or_compute(self, model_id: str, text: str, compute: Callable[[str], List[float]]) -> List[float]:
+        vector = self.get(model_id, text)
+        if vector is None:
+            vector = list(compute(self.key(model_id, text)[1]))
+            self.put(model_id, text, vector)
+        return vector
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "size": len(self._entries),
+            "capacity": self.capacity,
+        }
+
+# =========================
+# KPI time series (per-company arrays for charts and latest/top-k lookups)
+# =========================
+KPI_ALIASES = {"burn": "monthly_burn", "cash": "current_cash_balance"}
+
+def _period_str(period: int) -> str:
+    return f"{period // 12:04d}-{period % 12 + 1:02d}"
+
+class KpiSeriesStore:
+    """
+    Column arrays over the KPI table, grouped by company (rows of a company are
+    contiguous, ordered by period). Built once per dataset version; latest
+    values per (kpi, window) are computed vectorised and memoised.
+    """
+
+    def __init__(self, table):
+        import numpy as np
+        import pandas as pd
+
+        codes, ids = pd.factorize(table["deal_id"], sort=False)
+        self.ids: List[str] = list(ids)
+        self.names: List[str] = table.groupby(codes, sort=True)["company"].first().tolist()
+        self._row = {cid: i for i, cid in enumerate(self.ids)}
+        self.periods = table["period"].to_numpy("int64")
+        self.offsets = np.r_[0, np.flatnonzero(np.diff(codes)) + 1, len(table)]
+        self.values = {m: table[m].to_numpy("float64") for m in KPI_METRICS}
+        self.max_period = int(self.periods.max()) if len(self.periods) else 0
+        self._latest: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def metric(kpi: str) -> str:
+        kpi = KPI_ALIASES.get(kpi, kpi)
+        if kpi not in KPI_METRICS:
+            raise ValueError(f"unknown KPI {kpi!r}; choose from {KPI_METRICS + list(KPI_ALIASES)}")
+        return kpi
+
+    def series(self, company_id: str, kpi: str):
+        """(periods, values) of one company, missing values dropped."""
+        import numpy as np
+
+        i = self._row[company_id]
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        values = self.values[self.metric(kpi)][lo:hi]
+        keep = ~np.isnan(values)
+        return self.periods[lo:hi][keep], values[keep]
+
+    def latest(self, kpi: str, window_months: Optional[int] = None):
+        """(values, periods) arrays aligned with `ids`: each company's last value inside the window (NaN / -1 if none)."""
+        import numpy as np
+
+        kpi = self.metric(kpi)
+        key = (kpi, window_months)
+        with self._lock:
+            if key in self._latest:
+                return self._latest[key]
+        values = self.values[kpi]
+        valid = ~np.isnan(values)
+        if window_months:
+            valid &= self.periods > self.max_period - window_months
+        last = np.maximum.reduceat(np.where(valid, np.arange(len(values)), -1), self.offsets[:-1]) \
+            if len(values) else np.array([], dtype="int64")
+        found = last >= 0
+        result = (np.where(found, values[last], np.nan), np.where(found, self.periods[last], -1))
+        with self._lock:
+            self._latest[key] = result
+        return result
+
+    def latest_value(self, company_id: str, kpi: str) -> Optional[tuple]:
+        """(period 'YYYY-MM', value) of the company's most recent `kpi`, or None."""
+        values, periods = self.latest(kpi)
+        i = self._row.get(company_id)
+        if i is None or periods[i] < 0:
+            return None
+        return _period_str(int(periods[i])), float(values[i])
+
+    def top_k(self, kpi: str, k: int = 10, window_months: Optional[int] = None, descending: bool = True) -> List[tuple]:
+        """[(company name, value, period 'YYYY-MM'), ...] ranked by latest value."""
+        import numpy as np
+
+        values, periods = self.latest(kpi, window_months)
+        idx = np.flatnonzero(~np.isnan(values))
+        order = idx[np.argsort(values[idx], kind="stable")]
+        if descending:
+            order = order[::-1]
+        return [(self.names[i], float(values[i]), _period_str(int(periods[i]))) for i in order[:k]]
+
+# =========================
+# Company name resolution (local tiers before the vector search)
+# =========================
+FUZZY_THRESHOLD = 88        # rapidfuzz WRatio, 0-100
+AMBIGUITY_MARGIN = 3        # top candidates closer than this are reported as ambiguous
+_NAME_SUFFIXES = {"inc", "incorporated", "llc", "ltd", "limited", "corp", "corporation", "co", "gmbh", "plc", "pvt", "private", "sa", "ag", "bv"}
+
+def _normalize_name(text: str) -> str:
+    """casefold, drop punctuation and legal suffixes: 'Rollstack, Inc.' → 'rollstack'"""
+    words = "".join(ch if ch.isalnum() else " " for ch in (text or "").casefold()).split()
+    while len(words) > 1 and words[-1] in _NAME_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+# A domain alias must name the company on its own: shared hosts, generic
+# subdomain-style labels and everyday words would match unrelated questions.
+_SHARED_HOSTS = {
+    "medium", "linkedin", "notion", "docsend", "google", "github", "gitbook", "substack", "wordpress", "wixsite",
+    "webflow", "framer", "carrd", "squarespace", "typeform", "airtable", "dropbox", "youtube", "twitter",
+    "facebook", "instagram", "wellfound", "angel", "crunchbase", "calendly", "linktr", "vercel", "netlify",
+    "herokuapp",
+}
+_GENERIC_LABELS = {"app", "apps", "docs", "go", "www", "api", "web", "my", "get", "try", "use", "join", "site",
+                   "home", "blog", "portal", "dashboard", "hq", "team", "info", "mail"}
+_COMMON_WORDS = {
+    "about", "account", "alpha", "analytics", "bank", "beta", "best", "better", "build", "business", "capital",
+    "care", "cash", "change", "cloud", "company", "connect", "data", "deal", "deck", "digital", "energy", "fast",
+    "finance", "first", "food", "fund", "global", "good", "green", "group", "growth", "health", "hello", "help",
+    "labs", "life", "live", "loan", "market", "media", "mobile", "money", "more", "news", "next", "open", "people",
+    "plus", "power", "report", "revenue", "smart", "solar", "space", "start", "store", "studio", "system", "tech",
+    "today", "trade", "update", "value", "water", "world", "work",
+}
+_STOPWORDS = {
+    "a", "all", "an", "and", "any", "are", "as", "at", "be", "by", "can", "did", "do", "for", "from", "had", "has",
+    "have", "how", "i", "if", "in", "into", "is", "it", "its", "last", "new", "no", "not", "now", "of", "on", "one",
+    "or", "our", "out", "over", "so", "that", "the", "their", "them", "then", "there", "this", "to", "up", "us",
+    "was", "we", "were", "what", "when", "which", "who", "why", "will", "with", "year", "you", "your",
+}
+_SECOND_LEVEL = {"co", "com", "org", "net", "ac", "gov", "edu", "ltd", "plc"}  # acme.co.uk, acme.com.au
+MIN_DOMAIN_ALIAS = 4
+
+def _domain_stem(url: Optional[str]) -> Optional[str]:
+    """Registrable-domain label of `url` ('https://app.rollstack.com' → 'rollstack'), or None if it can't name a company."""
+    if not url:
+        return None
+    host = url.split("//", 1)[-1].split("/", 1)[0].split(":", 1)[0].casefold()
+    parts = [p for p in host.split(".") if p]
+    if len(parts) < 2:
+        return None
+    suffix = 2 if len(parts) >= 3 and parts[-2] in _SECOND_LEVEL and len(parts[-1]) == 2 else 1
+    stem = parts[-suffix - 1]
+    if (stem in _SHARED_HOSTS or stem in _GENERIC_LABELS or stem in _COMMON_WORDS
+            or len(stem) < MIN_DOMAIN_ALIAS):
+        return None
+    return stem
+
+def _company_aliases(deal: Dict[str, Any]) -> List[str]:
+    aliases = [deal.get("entityLegalName"), _domain_stem(deal.get("companyUrl"))]
+    for update in deal.get("investmentUpdates") or []:
+        change = ((update.get("textualData") or {}).get("company_name_change") or {})
+        if change.get("is_company_changing_name"):
+            aliases.append(change.get("new_name"))
+    return [a for a in aliases if a]
+
+def _distinctive(key: str) -> bool:
+    """True if a normalized alias can stand for a company inside free text (not 'the group', 'open')."""
+    words = key.split()
+    return (len(key.replace(" ", "")) >= MIN_DOMAIN_ALIAS
+            and any(w not in _STOPWORDS and w not in _COMMON_WORDS for w in words))
+
+class CompanyResolver:
+    """
+    Tiered, in-process company lookup: exact name → alias → rapidfuzz.
+    Matches are dicts {name, id, score (0-100), method}, best first.
+    """
+
+    def __init__(self, deals: List[Dict[str, Any]]):
+        self._index([(d["id"], d.get("companyName"), d.get("normalizeCompanyName"), _company_aliases(d)) for d in deals])
+
+    @classmethod
+    def from_records(cls, records) -> "CompanyResolver":
+        """Build from `DealRecord`s (hot fields only, no deal decoding)."""
+        self = cls.__new__(cls)
+        self._index([(r.id, r.name, r.normalized_name, r.aliases) for r in records])
+        return self
+
+    def _index(self, entries: List[tuple]) -> None:
+        """entries: (deal id, companyName, normalizeCompanyName, aliases)"""
+        self.names: Dict[str, str] = {}    # deal id → companyName
+        self.exact: Dict[str, str] = {}    # normalized name → deal id
+        self.aliases: Dict[str, str] = {}  # normalized alias → deal id
+        self.mention_aliases: Dict[str, str] = {}  # the aliases distinctive enough for `mentions`
+        for cid, name, normalized, _ in entries:
+            self.names[cid] = name or ""
+            for key in (name, normalized):
+                if key:
+                    self.exact.setdefault(_normalize_name(key), cid)
+                    self.exact.setdefault(key.casefold().replace(" ", ""), cid)
+        for cid, _, _, aliases in entries:
+            for alias in aliases:
+                key = _normalize_name(alias)
+                if key and key not in self.exact:
+                    self.aliases.setdefault(key, cid)
+                    if _distinctive(key):
+                        self.mention_aliases.setdefault(key, cid)
+        self._choices = list(self.exact.items()) + list(self.aliases.items())
+        self._choice_keys = [k for k, _ in self._choices]
+
+    def _match(self, cid: str, score: float, method: str) -> Dict[str, Any]:
+        return {"name": self.names[cid], "id": cid, "score": round(float(score), 1), "method": method}
+
+    def resolve(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
+        key = _normalize_name(query)
+        if not key:
+            return []
+        for table, method, score in ((self.exact, "exact", 100), (self.aliases, "alias", 99)):
+            cid = table.get(key) or table.get(key.replace(" ", ""))
+            if cid:
+                return [self._match(cid, score, method)]
+
+        from rapidfuzz import fuzz, process
+        matches: List[Dict[str, Any]] = []
+        seen = set()
+        for _, score, idx in process.extract(key, self._choice_keys, scorer=fuzz.WRatio,
+                                             limit=limit * 3, score_cutoff=FUZZY_THRESHOLD):
+            cid = self._choices[idx][1]
+            if cid not in seen:
+                seen.add(cid)
+                matches.append(self._match(cid, score, "fuzzy"))
+        return matches[:limit]
+
+    def mentions(self, text: str, max_words: int = 4) -> List[str]:
         """
+        Ids of companies named (exactly or by alias) anywhere in `text`, in
+        order of appearance. Aliases made of everyday words ('Open', 'The
+        Growth Group') are left to `resolve`: in free text they'd mostly match
+        unrelated questions.
+        """
+        words = _normalize_name(text).split()
+        found: List[str] = []
+        i = 0
+        while i < len(words):
+            for n in range(min(max_words, len(words) - i), 0, -1):
+                key = " ".join(words[i:i + n])
+                cid = self.exact.get(key) or self.mention_aliases.get(key) or self.exact.get(key.replace(" ", ""))
+                if cid:
+                    if cid not in found:
+                        found.append(cid)
+                    i += n
+                    break
+            else:
+                i += 1
+        return found
 
-        # Call OpenAI Code Interpreter
-        resp = client.responses.create(
-            model="o3",
-            input=prompt,
-            tools=[{
-                "type": "code_interpreter",
-                "container": {"type": "auto", "file_ids": [up.id]}
-            }]
-        )
+def is_ambiguous(matches: List[Dict[str, Any]]) -> bool:
+    return len(matches) > 1 and matches[0]["score"] - matches[1]["score"] < AMBIGUITY_MARGIN
 
-        return str(resp.output_text) if getattr(resp, "output_text", None) else "[Code interpreter returned no output]"
+# =========================
+# Deal store (compact records + binary snapshot)
+# =========================
+SNAPSHOT_DIR = Path(os.getenv("VIC_SNAPSHOT_DIR", ".vic_cache/snapshot"))
+SNAPSHOT_FORMAT = 2  # bump when records change meaning (2: stricter domain aliases); older snapshots are rebuilt
+DATASET_WATCH_INTERVAL_S = float(os.getenv("VIC_DATASET_WATCH_S", "10"))  # 0 = no file watcher
+DEAL_DECODE_CACHE = 64  # fully decoded deals kept around for repeated lookups
+_ALIAS_SEP = "\x1f"
 
-    except Exception as e:
-        return f"[Error running Python query]: {e}"
+class DealRecord:
+    """Hot fields of one deal; the full deal lives out of line in the store's blob."""
+
+    __slots__ = ("index", "id", "name", "normalized_name", "sector", "geography", "status",
+                 "updated_at", "current_valuation", "invested_amount", "moic", "aliases")
+
+    def __init__(self, index: int, id: str, name: str, normalized_name: str, sector: Optional[str],
+                 geography: Optional[str], status: Optional[str], updated_at: Optional[str],
+                 current_valuation: float, invested_amount: float, moic: float, aliases: tuple):
+        self.index = index
+        self.id = id
+        self.name = name
+        self.normalized_name = normalized_name
+        self.sector = sector
+        self.geography = geography
+        self.status = status
+        self.updated_at = updated_at
+        self.current_valuation = current_valuation
+        self.invested_amount = invested_amount
+        self.moic = moic
+        self.aliases = aliases
+
+_RECORD_TEXT = [("id", "id"), ("name", "companyName"), ("normalized_name", "normalizeCompanyName"),
+                ("sector", "sector"), ("geography", "geography"), ("status", "dealStatus"), ("updated_at", "updatedAt")]
+_RECORD_NUMBERS = [("current_valuation", "currentValuation"), ("invested_amount", "investedAmount"), ("moic", "moic")]
+
+def _float_or_nan(value) -> float:
+    v = _num(value)
+    return float("nan") if v is None else v
+
+def _categorical(values: List[Optional[str]]):
+    """(int32 codes, unicode categories) with code -1 for None."""
+    import numpy as np
+    categories = sorted({v for v in values if v is not None})
+    lookup = {c: i for i, c in enumerate(categories)}
+    codes = np.array([lookup[v] if v is not None else -1 for v in values], dtype=np.int32)
+    return codes, np.array(categories, dtype=str)
+
+def _from_categorical(codes, categories) -> List[Optional[str]]:
+    cats = categories.tolist()
+    return [cats[c] if c >= 0 else None for c in codes.tolist()]
+
+class DealStore(Mapping):
+    """
+    deal id → deal, without holding the parsed JSON tree.
+
+    `records` keep the hot fields in `__slots__` objects; every deal is kept as
+    compact JSON bytes in one blob (memory-mapped when loaded from a snapshot)
+    and decoded on access. `kpi_table` is the flattened KPI history, rebuilt
+    from arrays on first use.
+    """
+
+    def __init__(self, records: List[DealRecord], blob, offsets, kpi_arrays: Dict[str, Any],
+                 meta: Optional[Dict[str, Any]] = None, kpi_table=None):
+        from collections import OrderedDict
+        self.records = records
+        self.by_id = {r.id: r.index for r in records}
+        self.meta = meta or {}
+        self._blob = blob
+        self._offsets = offsets  # int64, len(records) + 1
+        self._kpi_arrays = kpi_arrays
+        self._kpi_table = kpi_table
+        self._decoded: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_deals(cls, deals: List[Dict[str, Any]], meta: Optional[Dict[str, Any]] = None) -> "DealStore":
+        import numpy as np
+        records, parts, offsets = [], [], [0]
+        for i, deal in enumerate(deals):
+            text = {attr: deal.get(key) for attr, key in _RECORD_TEXT}
+            records.append(DealRecord(
+                index=i, **text, **{attr: _float_or_nan(deal.get(key)) for attr, key in _RECORD_NUMBERS},
+                aliases=tuple(_company_aliases(deal)),
+            ))
+            raw = json.dumps(deal, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            parts.append(raw)
+            offsets.append(offsets[-1] + len(raw))
+        from pandas.api.types import is_numeric_dtype
+        table = build_kpi_table(deals)
+        kpi_arrays = {}
+        for col in table.columns:
+            if is_numeric_dtype(table[col]):
+                kpi_arrays[col] = table[col].to_numpy()
+            else:
+                values = [None if v is None or v != v else str(v) for v in table[col].tolist()]
+                kpi_arrays[f"{col}.codes"], kpi_arrays[f"{col}.categories"] = _categorical(values)
+        return cls(records, b"".join(parts), np.array(offsets, dtype=np.int64), kpi_arrays, meta, kpi_table=table)
+
+    # ----- Mapping -----
+    def __getitem__(self, cid: str) -> Dict[str, Any]:
+        return self.deal_at(self.by_id[cid])
+
+    def __iter__(self):
+        return iter(self.by_id)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def deal_at(self, index: int) -> Dict[str, Any]:
+        """Decode the full deal at `index` (small LRU of recent decodes)."""
+        with self._lock:
+            deal = self._decoded.get(index)
+            if deal is not None:
+                self._decoded.move_to_end(index)
+                return deal
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        deal = json.loads(bytes(self._blob[start:end]))
+        with self._lock:
+            self._decoded[index] = deal
+            while len(self._decoded) > DEAL_DECODE_CACHE:
+                self._decoded.popitem(last=False)
+        return deal
+
+    def to_dataset(self) -> Dict[str, Any]:
+        """The full original structure ({"data": [...]} plus any top-level extras)."""
+        return {**self.meta, "data": [self.deal_at(i) for i in range(len(self.records))]}
+
+    @property
+    def kpi_table(self):
+        if self._kpi_table is None:
+            with self._lock:
+                if self._kpi_table is None:
+                    import pandas as pd
+                    columns = {}  # arrays are stored in column order
+                    for name, arr in self._kpi_arrays.items():
+                        if name.endswith(".codes"):
+                            col = name[:-len(".codes")]
+                            columns[col] = _from_categorical(arr, self._kpi_arrays[f"{col}.categories"])
+                        elif not name.endswith(".categories"):
+                            columns[name] = arr
+                    self._kpi_table = pd.DataFrame(columns)
+        return self._kpi_table
+
+    # ----- snapshot -----
+    def save(self, folder: Path) -> None:
+        """Write records.npz, kpis.npz, deals.bin and meta.json into `folder`."""
+        import numpy as np
+        folder.mkdir(parents=True, exist_ok=True)
+        arrays = {}
+        for attr, _ in _RECORD_TEXT:
+            arrays[attr] = np.array([getattr(r, attr) or "" for r in self.records], dtype=str)
+        for attr, _ in _RECORD_NUMBERS:
+            arrays[attr] = np.array([getattr(r, attr) for r in self.records], dtype=np.float64)
+        arrays["aliases"] = np.array([_ALIAS_SEP.join(r.aliases) for r in self.records], dtype=str)
+        arrays["offsets"] = np.asarray(self._offsets, dtype=np.int64)
+        arrays["format"] = np.int64(SNAPSHOT_FORMAT)
+        np.savez(folder / "records.npz", **arrays)
+        np.savez(folder / "kpis.npz", **self._kpi_arrays)
+        with open(folder / "deals.bin", "wb") as fh:
+            fh.write(self._blob)
+        (folder / "meta.json").write_text(json.dumps(self.meta), encoding="utf-8")
+
+    @classmethod
+    def load(cls, folder: Path) -> "DealStore":
+        """Open a snapshot written by `save`; deals.bin is memory-mapped, not read."""
+        import mmap
+        import numpy as np
+        with np.load(folder / "records.npz", allow_pickle=False) as npz:
+            arrays = {k: npz[k] for k in npz.files}
+        found = int(arrays["format"]) if "format" in arrays else 1
+        if found != SNAPSHOT_FORMAT:
+            raise ValueError(f"snapshot format {found}, expected {SNAPSHOT_FORMAT}")
+        with np.load(folder / "kpis.npz", allow_pickle=False) as npz:
+            kpi_arrays = {k: npz[k] for k in npz.files}
+        text = {attr: arrays[attr].tolist() for attr, _ in _RECORD_TEXT}
+        numbers = {attr: arrays[attr].tolist() for attr, _ in _RECORD_NUMBERS}
+        aliases = arrays["aliases"].tolist()
+        records = [
+            DealRecord(index=i, **{a: v[i] or None for a, v in text.items()}, **{a: v[i] for a, v in numbers.items()},
+                       aliases=tuple(a for a in aliases[i].split(_ALIAS_SEP) if a))
+            for i in range(len(aliases))
+        ]
+        with open(folder / "deals.bin", "rb") as fh:
+            blob = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(fh.fileno()).st_size else b""
+        meta = json.loads((folder / "meta.json").read_text(encoding="utf-8"))
+        return cls(records, blob, arrays["offsets"], kpi_arrays, meta)
+
+def _snapshot_manifest(root: Path) -> Dict[str, Any]:
+    try:
+        return json.loads((root / "current.json").read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def load_or_build_deal_store(data_path: Path, root: Path) -> tuple:
+    """
+    (store, dataset_version, (size, mtime_ns)) for `data_path`. A snapshot under
+    `root` is reused when the file's stat matches the manifest (no read at all)
+    or its sha256 matches a stored version; otherwise the JSON is parsed once
+    and a snapshot written for the next start (best-effort).
+    """
+    st = data_path.stat()
+    stat = (st.st_size, st.st_mtime_ns)
+    source = str(data_path.resolve())
+    manifest = _snapshot_manifest(root)
+    unreadable = None
+    if manifest.get("source") == source and tuple(manifest.get("stat") or ()) == stat:
+        try:
+            return DealStore.load(root / manifest["dataset_version"]), manifest["dataset_version"], stat
+        except Exception as e:
+            logger.warning("dataset snapshot unreadable (%s), rebuilding", e)
+            unreadable = manifest["dataset_version"]
+
+    raw = data_path.read_bytes()
+    version = hashlib.sha256(raw).hexdigest()
+    folder = root / version
+    store = None
+    stale = version == unreadable
+    if not stale and (folder / "meta.json").exists():
+        try:
+            store = DealStore.load(folder)
+        except Exception as e:
+            logger.warning("dataset snapshot unreadable (%s), rebuilding", e)
+            stale = True
+    if store is None:
+        parsed = json.loads(raw)
+        del raw
+        store = DealStore.from_deals(parsed.get("data") or [], {k: v for k, v in parsed.items() if k != "data"})
+        del parsed
+        try:
+            root.mkdir(parents=True, exist_ok=True)
+            tmp = root / f"{version}.tmp{os.getpid()}"
+            store.save(tmp)
+            if stale:
+                shutil.rmtree(folder, ignore_errors=True)
+            try:
+                os.replace(tmp, folder)
+            except OSError:
+                # another process published the same version first
+                shutil.rmtree(tmp, ignore_errors=True)
+            for old in root.iterdir():  # superseded versions
+                if old.is_dir() and old.name != version and ".tmp" not in old.name:
+                    shutil.rmtree(old, ignore_errors=True)
+        except Exception as e:
+            logger.warning("could not persist dataset snapshot (%s)", e)
+    try:
+        tmp_manifest = root / f"current.json.tmp{os.getpid()}"
+        tmp_manifest.write_text(json.dumps({"source": source, "stat": list(stat), "dataset_version": version}),
+                                encoding="utf-8")
+        os.replace(tmp_manifest, root / "current.json")
+    except Exception:
+        pass
+    return store, version, stat
+
+def diff_deal_stores(old: DealStore, new: DealStore) -> Dict[str, List[str]]:
+    """Deal ids added, removed, and updated (changed `updatedAt` or name) between two stores."""
+    before = {r.id: (r.updated_at, r.name) for r in old.records}
+    after = {r.id: (r.updated_at, r.name) for r in new.records}
+    return {
+        "added": [cid for cid in after if cid not in before],
+        "removed": [cid for cid in before if cid not in after],
+        "updated": [cid for cid, v in after.items() if cid in before and before[cid] != v],
+    }
+
+class Dataset:
+    """
+    One loaded version of the dataset file plus everything derived from it
+    (KPI tables, resolver, company index, ...). The engine swaps whole
+    `Dataset`s on reload, so a reader never sees a half-updated mix.
+    """
+
+    def __init__(self, store: DealStore, version: str, stat: tuple):
+        self.store = store
+        self.version = version
+        self.stat = stat
+        self._cache: Dict[str, Any] = {}
+        self._lock = threading.Lock()  # guards _locks only
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def lazy(self, name: str, build: Callable[[], Any]) -> Any:
+        """`build()` once per name; a slow build only blocks readers of that name."""
+        value = self._cache.get(name)
+        if value is None:
+            with self._lock:
+                lock = self._locks.setdefault(name, threading.Lock())
+            with lock:
+                value = self._cache.get(name)
+                if value is None:
+                    value = build()
+                    self._cache[name] = value
+        return value
+
+    def built(self, name: str) -> bool:
+        return self._cache.get(name) is not None
 
 # =========================
-# Main entry: unified_answer
+# Deal projection (compact tool payloads)
 # =========================
-def unified_answer(user_input: str):
-    SYSTEM = """
-You are an analyst answering questions about startup investment updates.
-- If the user is asking about a single company, use the `get_data_from_name` function.
-- If the user is asking to filter, compare, or list *multiple companies*, use the `run_python_query_on_json` function.
-Do not guess numbers. Always cite facts from the data.
-"""
+DEAL_TOKEN_BUDGET = int(os.getenv("VIC_DEAL_TOKEN_BUDGET", "1500"))
+NARRATIVE_MAX_CHARS = 1200
 
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "get_data_from_name",
-                "description": "Return structured data for a company",
-                "parameters": {
-                    "type": "object",
-                    "properties": {"company_name": {"type": "string"}},
-                    "required": ["company_name"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "run_python_query_on_json",
-                "description": "Run a Python-based query over all company data. Use when filtering, comparing, or analyzing multiple companies.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {"query": {"type": "string"}},
-                    "required": ["query"]
-                }
-            }
-        }
+PROFILE_FIELDS = [
+    "companyName", "sector", "geography", "countryOfOperation", "dealStatus", "dealStage",
+    "companyOneLiner", "tags", "fundName", "owner", "investmentDate", "ycBatch",
+]
+VALUATION_FIELDS = [
+    "currency", "lastRoundValuation", "lastFundingRound", "lastFundingRoundYear",
+    "investedInstrumentType", "termsOfSafe", "valuationCap", "investedAmount",
+    "currentValue", "currentValuation", "percentageOwned", "moic", "irr",
+]
+
+def _approx_tokens(obj) -> int:
+    """Rough token count (~4 characters per token of compact JSON)."""
+    text = obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    return len(text) // 4 + 1
+
+def _is_empty(value) -> bool:
+    return value is None or value is False or (isinstance(value, (str, list, dict)) and not value)
+
+def _compact(value):
+    """Drop null/empty/false values recursively and clip long narrative strings."""
+    if isinstance(value, dict):
+        out = {k: _compact(v) for k, v in value.items()}
+        return {k: v for k, v in out.items() if not _is_empty(v)}
+    if isinstance(value, list):
+        return [v for v in (_compact(v) for v in value) if not _is_empty(v)]
+    if isinstance(value, str) and len(value) > NARRATIVE_MAX_CHARS:
+        return value[:NARRATIVE_MAX_CHARS] + "…"
+    return value
+
+def _period_label(year, month) -> str:
+    try:
+        return f"{int(year):04d}-{int(month):02d}"
+    except (TypeError, ValueError):
+        return "unknown"
+
+def _recent_kpis(deal: Dict[str, Any]) -> List[Dict[str, Any]]:
+    entries = sorted(
+        deal.get("allPeriodWiseKpis") or [],
+        key=lambda e: (e.get("receivedYear") or 0, e.get("receivedMonth") or 0),
+        reverse=True,
+    )
+    rows = []
+    for e in entries:
+        kpis = _compact(e.get("kpis") or {})
+        if kpis:
+            rows.append({"period": _period_label(e.get("receivedYear"), e.get("receivedMonth")),
+                         "currency": e.get("currency"), "revenueType": e.get("revenueTooltip"), **kpis})
+    return rows
+
+def _update_narratives(deal: Dict[str, Any]) -> List[Dict[str, Any]]:
+    updates = sorted(
+        deal.get("investmentUpdates") or [],
+        key=lambda u: (u.get("receivedYear") or 0, u.get("receivedMonth") or 0),
+        reverse=True,
+    )
+    rows = []
+    for u in updates:
+        td = u.get("textualData") or {}
+        kpis = u.get("kpis") or {}
+        row = _compact({
+            "period": _period_label(u.get("receivedYear"), u.get("receivedMonth")),
+            "overview": td.get("overview"),
+            "lowlights": td.get("lowlights"),
+            "business_updates": td.get("business_updates"),
+            "product_updates": td.get("product_updates"),
+            "hiring_details": td.get("hiring_details"),
+            "assistance_required": td.get("assistance_required"),
+            "founder_leaving_details": td.get("founder_leaving_details") if td.get("is_founder_leaving") else None,
+            "name_change": td.get("company_name_change") if (td.get("company_name_change") or {}).get("is_company_changing_name") else None,
+            "fundraising": (kpis.get("fundraising_plans") or {}).get("fundraising_details"),
+            "pivoting": (kpis.get("pivoting") or {}).get("pivoting_details"),
+        })
+        if len(row) > 1:
+            rows.append(row)
+    return rows
+
+def _valuation_history(deal: Dict[str, Any]) -> List[Dict[str, Any]]:
+    rounds = [
+        {"date": r.get("date") or r.get("createdAt"), "round": r.get("roundName"), "valuation": r.get("valuation")}
+        for r in deal.get("valuationRoundDetail") or []
+    ]
+    marks = [
+        {"date": h.get("updatedAt"), "currentValuation": h.get("currentValuation")}
+        for h in deal.get("dealHistory") or []
     ]
+    return _compact(sorted(rounds + marks, key=lambda r: r.get("date") or "", reverse=True))
 
-    # Include prior turns from memory before current user message
-    prior = _load_memory()
-
-    # First LLM call to decide which tool to use
-    resp1 = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "system", "content": SYSTEM}] + prior + [
-            {"role": "user", "content": user_input}
-        ],
-        tools=tools,
-        tool_choice="auto",
-        temperature=0
+def project_deal(deal: Optional[Dict[str, Any]], token_budget: int = DEAL_TOKEN_BUDGET) -> Dict[str, Any]:
+    """
+    Compact, budgeted view of a deal for tool messages: profile and valuation
+    fields first, then the most recent KPIs and update narratives interleaved
+    by recency, then valuation history, until `token_budget` is spent.
+    """
+    if not deal:
+        return {"error": "company not found"}
+    view: Dict[str, Any] = {
+        "profile": _compact({f: deal.get(f) for f in PROFILE_FIELDS}),
+        "valuation": _compact({f: deal.get(f) for f in VALUATION_FIELDS}),
+    }
+    used = _approx_tokens(view)
+    kpis, narratives, history = _recent_kpis(deal), _update_narratives(deal), _valuation_history(deal)
+    ranked = (
+        [("recent_kpis", r) for r in kpis[:6]]
+        + [("latest_updates", r) for r in narratives[:2]]
+        + [("recent_kpis", r) for r in kpis[6:12]]
+        + [("latest_updates", r) for r in narratives[2:6]]
+        + [("valuation_history", r) for r in history[:8]]
     )
+    skipped = 0
+    for section, item in ranked:
+        cost = _approx_tokens(item)
+        if used + cost > token_budget:
+            skipped += 1
+            continue
+        view.setdefault(section, []).append(item)
+        used += cost
+    if skipped:
+        view["note"] = f"{skipped} older entries omitted to fit the context budget"
+    return view
 
-    msg1 = resp1.choices[0].message
-    tcs = msg1.tool_calls or []
+# =========================
+# Deal digests (precomputed single-company summaries)
+# =========================
+DIGEST_DIR = Path(os.getenv("VIC_DIGEST_DIR", ".vic_cache/digests"))
+DIGEST_TREND_MONTHS = 6
+DIGEST_TEXT_CHARS = 400
+DIGEST_VALUATION_POINTS = 8
+DIGEST_FLAT_PCT = 5.0  # trend moves smaller than this are "flat"
 
-    if not tcs:
-        fallback = msg1.content or (
-            "I'm tuned for investment‑update questions. Try:\n"
-            "• Give me a summary of Rollstack for the past year\n"
-            "• Which companies have revenue more than $1m?"
-        )
-        _append_memory(user_input, fallback)
-        return fallback
+def _pct_change(new: Optional[float], old: Optional[float]) -> Optional[float]:
+    if new is None or old is None or old == 0:
+        return None
+    return round((new - old) / abs(old) * 100, 1)
 
-    # Build message list for second call (include memory)
-    msgs: List[Dict[str, str]] = [{"role": "system", "content": SYSTEM}] + prior + [
-        {"role": "user", "content": user_input},
-        msg1  # tool call decision message
-    ]
+def _clip(text, limit: int = DIGEST_TEXT_CHARS) -> Optional[str]:
+    if not text:
+        return None
+    text = _section_text(text) if isinstance(text, dict) else str(text).strip()
+    return text[:limit] + "…" if len(text) > limit else text
 
-    # Execute tools and add their outputs
-    for tc in tcs:
-        fn_name = tc.function.name
-        args = json.loads(tc.function.arguments)
+def _kpi_history(deal: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    """period → {metric: value, "currency": ...}; allPeriodWiseKpis wins, update kpis fill gaps (as in the KPI table)."""
+    history: Dict[int, Dict[str, Any]] = {}
+    for row in _period_rows(deal):
+        try:
+            period = int(row["year"]) * 12 + int(row["month"]) - 1
+        except (TypeError, ValueError):
+            continue
+        slot = history.setdefault(period, {})
+        for key in KPI_METRICS + ["currency"]:
+            if row.get(key) is not None and key not in slot:
+                slot[key] = row[key]
+    return history
 
-        if fn_name == "get_data_from_name":
-            co_data = get_data_from_name(args["company_name"])
-            msgs.append({
-                "role": "tool",
-                "tool_call_id": tc.id,
-                "name": fn_name,
-                "content": json.dumps(co_data)
-            })
+def _latest_kpis(history: Dict[int, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Most recent value of each KPI with month-over-month and year-over-year change in percent."""
+    out = {}
+    for metric in KPI_METRICS:
+        points = {p: v[metric] for p, v in history.items() if metric in v}
+        if not points:
+            continue
+        period = max(points)
+        value = points[period]
+        out[metric] = _compact({
+            "value": _clean_value(value),
+            "period": _period_str(period),
+            "mom_pct": _pct_change(value, points.get(period - 1)),
+            "yoy_pct": _pct_change(value, points.get(period - 12)),
+        })
+    return out
 
-        elif fn_name == "run_python_query_on_json":
-            result = run_python_query_on_json(args["query"])
-            print("=== Code Interpreter Output ===")
-            print(result)
-            print("================================")
-            msgs.append({
-                "role": "tool",
-                "tool_call_id": tc.id,
-                "name": fn_name,
-                "content": str(result) if result else "[No output]"
-            })
+def _trend(history: Dict[int, Dict[str, Any]], metric: str) -> Optional[Dict[str, Any]]:
+    """Last DIGEST_TREND_MONTHS values of `metric` and whether it is rising, falling or flat over them."""
+    points = sorted((p, v[metric]) for p, v in history.items() if metric in v)[-DIGEST_TREND_MONTHS:]
+    if len(points) < 2:
+        return None
+    change = _pct_change(points[-1][1], points[0][1])
+    if change is None or abs(change) < DIGEST_FLAT_PCT:
+        direction = "flat"
+    else:
+        direction = "rising" if change > 0 else "falling"
+    return {
+        "direction": direction,
+        "change_pct": change,
+        "values": {_period_str(p): _clean_value(v) for p, v in points},
+    }
 
-    # Final response with tool outputs injected
-    resp2 = client.chat.completions.create(
-        model="gpt-4o",
-        messages=msgs,
-        tools=tools
+def _update_flags(deal: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Fundraising, pivot, founder-leaving and name-change signals from the updates (latest mention of each)."""
+    flags: Dict[str, Dict[str, Any]] = {}
+    updates = sorted(
+        deal.get("investmentUpdates") or [],
+        key=lambda u: (u.get("receivedYear") or 0, u.get("receivedMonth") or 0),
+        reverse=True,
     )
-    final_text = resp2.choices[0].message.content or ""
-    _append_memory(user_input, final_text)
-    return final_text
+    for u in updates:
+        td = u.get("textualData") or {}
+        kpis = u.get("kpis") or {}
+        fundraising = kpis.get("fundraising_plans") or {}
+        pivoting = kpis.get("pivoting") or {}
+        rename = td.get("company_name_change") or {}
+        signals = {
+            "fundraising": (fundraising.get("is_raising_funds") or fundraising.get("fundraising_details"),
+                            fundraising.get("fundraising_details")),
+            "pivoting": (pivoting.get("is_pivoting") or pivoting.get("pivoting_details"), pivoting.get("pivoting_details")),
+            "founder_leaving": (td.get("is_founder_leaving"), td.get("founder_leaving_details")),
+            "name_change": (rename.get("is_company_changing_name"),
+                            rename.get("new_name") or rename.get("company_name_change_details")),
+        }
+        for flag, (raised, details) in signals.items():
+            if not raised:
+                continue
+            if flag not in flags:
+                flags[flag] = _compact({"period": _period_label(u.get("receivedYear"), u.get("receivedMonth")),
+                                        "details": _clip(details)})
+            flags[flag]["mentions"] = flags[flag].get("mentions", 0) + 1
+    return flags
+
+def build_deal_digest(deal: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pre-digested single-company summary: latest KPIs with MoM/YoY deltas,
+    burn/runway/revenue trends, update flags, valuation history and the
+    latest overview. A few hundred tokens in place of the whole deal.
+    """
+    history = _kpi_history(deal)
+    updates = deal.get("investmentUpdates") or []
+    latest = max(updates, key=lambda u: (u.get("receivedYear") or 0, u.get("receivedMonth") or 0), default=None)
+    latest_td = (latest or {}).get("textualData") or {}
+    digest = {
+        "id": deal.get("id"),
+        "profile": {f: deal.get(f) for f in PROFILE_FIELDS},
+        "coverage": {
+            "kpi_months": len(history),
+            "first_period": _period_str(min(history)) if history else None,
+            "last_period": _period_str(max(history)) if history else None,
+            "updates": len(updates),
+        },
+        "currency": history[max(history)].get("currency") if history else None,
+        "latest_kpis": _latest_kpis(history),
+        "trends": {m: _trend(history, m) for m in ("monthly_burn", "runway", "revenue")},
+        "flags": _update_flags(deal),
+        "valuation": {f: deal.get(f) for f in VALUATION_FIELDS},
+        "valuation_history": _valuation_history(deal)[:DIGEST_VALUATION_POINTS],
+        "latest_update": {
+            "period": _period_label(latest.get("receivedYear"), latest.get("receivedMonth")),
+            "overview": _clip(latest_td.get("overview")),
+            "lowlights": _clip(latest_td.get("lowlights")),
+        } if latest else None,
+    }
+    return _compact(digest)
+
+def load_or_build_digests(store: DealStore, version: str, root: Path = DIGEST_DIR,
+                          previous: Optional[Dict[str, Dict[str, Any]]] = None,
+                          stale: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    deal id → digest for dataset `version`, persisted as `root/<version>.json`
+    and loaded from there when present. On a reload, `previous` digests are
+    reused for every deal not in `stale` (added or updated ids). Persisting
+    is best-effort.
+    """
+    path = root / f"{version}.json"
+    if path.exists():
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.warning("digest file unreadable (%s), rebuilding", e)
+    previous, stale = previous or {}, set(stale or ())
+    digests = {
+        r.id: previous[r.id] if r.id in previous and r.id not in stale else build_deal_digest(store.deal_at(r.index))
+        for r in store.records
+    }
+    try:
+        root.mkdir(parents=True, exist_ok=True)
+        tmp = root / f"{version}.json.tmp{os.getpid()}"
+        tmp.write_text(json.dumps(digests, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, path)
+        for old in root.glob("*.json"):  # superseded versions
+            if old != path:
+                old.unlink(missing_ok=True)
+    except Exception as e:
+        logger.warning("could not persist deal digests (%s)", e)
+    return digests
+
+# =========================
+# Update narratives (chunked FAISS index over textualData)
+# =========================
+NARRATIVE_INDEX_DIR = Path(os.getenv("VIC_NARRATIVE_INDEX_DIR", ".vic_cache/narrative_index"))
+NARRATIVE_SECTIONS = ["overview", "lowlights", "business_updates", "product_updates", "hiring_details"]
+NARRATIVE_CHUNK_CHARS = 1000
+NARRATIVE_TOP_K = 8
+NARRATIVE_MAX_K = 20
+
+def _section_text(value) -> str:
+    """Plain text of a textualData section; dict sections become 'label: text; label: text'."""
+    if isinstance(value, dict):
+        return "; ".join(f"{k.replace('_', ' ')}: {v}" for k, v in value.items() if not _is_empty(v))
+    return "" if _is_empty(value) else str(value).strip()
+
+def _split_text(text: str, limit: int = NARRATIVE_CHUNK_CHARS) -> List[str]:
+    """Greedy split on line/sentence boundaries into pieces of at most `limit` chars."""
+    pieces: List[str] = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?])\s+|\n+", text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > limit:
+            pieces.append(current)
+            current = ""
+        while len(sentence) > limit:  # no boundary to split on
+            pieces.append(sentence[:limit])
+            sentence = sentence[limit:]
+        current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+def narrative_chunks(deal: Dict[str, Any]) -> List[tuple]:
+    """(chunk id, text, metadata) for every narrative section of every update of `deal`."""
+    chunks = []
+    company = deal.get("companyName") or ""
+    for u in deal.get("investmentUpdates") or []:
+        year, month = u.get("receivedYear"), u.get("receivedMonth")
+        if not year or not month:
+            continue
+        td = u.get("textualData") or {}
+        label = _period_label(year, month)
+        for section in NARRATIVE_SECTIONS:
+            for n, piece in enumerate(_split_text(_section_text(td.get(section)))):
+                chunks.append((
+                    f"{deal['id']}/{u.get('id') or label}/{section}/{n}",
+                    f"{company} ({label}) {section.replace('_', ' ')}: {piece}",
+                    {"deal_id": deal["id"], "company": company, "sector": deal.get("sector"),
+                     "year": year, "month": month, "period": year * 12 + month - 1, "section": section},
+                ))
+    return chunks
+
+class NarrativeIndex:
+    """
+    FAISS index of narrative chunks plus numpy metadata columns, so filters
+    (deal, sector, section, period) select exact candidates via an IDSelector
+    instead of over-fetching and post-filtering.
+    """
+
+    def __init__(self, vs):
+        import numpy as np
+        self.vs = vs
+        docs = [vs.docstore.search(vs.index_to_docstore_id[i]) for i in range(vs.index.ntotal)]
+        self.deal_ids = np.array([d.metadata["deal_id"] for d in docs], dtype=str)
+        self.sectors = np.array([d.metadata.get("sector") or "" for d in docs], dtype=str)
+        self.sections = np.array([d.metadata["section"] for d in docs], dtype=str)
+        self.periods = np.array([d.metadata["period"] for d in docs], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.deal_ids)
+
+    def search(self, vector: List[float], k: int, deal_ids: Optional[List[str]] = None, sector: Optional[str] = None,
+               sections: Optional[List[str]] = None, from_period: Optional[int] = None,
+               to_period: Optional[int] = None) -> List[tuple]:
+        """[(Document, L2 distance)] best first among chunks passing every filter."""
+        import faiss
+        import numpy as np
+        mask = np.ones(len(self), dtype=bool)
+        if deal_ids is not None:
+            mask &= np.isin(self.deal_ids, deal_ids)
+        if sector:
+            mask &= np.char.lower(self.sectors) == sector.casefold()
+        if sections:
+            mask &= np.isin(self.sections, sections)
+        if from_period is not None:
+            mask &= self.periods >= from_period
+        if to_period is not None:
+            mask &= self.periods <= to_period
+        if not mask.any():
+            return []
+        x = np.array([vector], dtype=np.float32)
+        if mask.all():
+            dist, pos = self.vs.index.search(x, k)
+        else:
+            selector = faiss.IDSelectorBatch(np.flatnonzero(mask).astype(np.int64))
+            dist, pos = self.vs.index.search(x, k, params=faiss.SearchParameters(sel=selector))
+        return [
+            (self.vs.docstore.search(self.vs.index_to_docstore_id[int(p)]), float(d))
+            for d, p in zip(dist[0], pos[0]) if p >= 0
+        ]
+
+def narrative_index_key(version: str, model_id: str) -> str:
+    return hashlib.sha256(f"{version}\0{model_id}\0{NARRATIVE_CHUNK_CHARS}\0{NARRATIVE_SECTIONS}".encode("utf-8")).hexdigest()
+
+def load_or_build_narrative_index(store: DealStore, version: str, embeddings,
+                                  cache_dir: Path = NARRATIVE_INDEX_DIR) -> NarrativeIndex:
+    """Narrative index for one dataset version: loaded from `cache_dir`, else chunked, embedded and saved."""
+    from langchain_community.vectorstores import FAISS
+
+    path = Path(cache_dir) / narrative_index_key(version, _embedding_model_id(embeddings))
+    if (path / "index.faiss").exists():
+        try:
+            return NarrativeIndex(_open_index(path, embeddings))
+        except Exception as e:
+            logger.warning("narrative index cache unreadable (%s), rebuilding", e)
+            shutil.rmtree(path, ignore_errors=True)
+
+    chunks = [c for i in range(len(store)) for c in narrative_chunks(store.deal_at(i))]
+    if not chunks:
+        raise ValueError("the dataset has no update narratives to index")
+    ids, texts, metadatas = (list(col) for col in zip(*chunks))
+    vs = FAISS.from_texts(texts, embeddings, metadatas=metadatas, ids=ids)
+    return NarrativeIndex(_publish_index(vs, path, version))
+
+def update_narrative_index(index: NarrativeIndex, store: DealStore, changes: Dict[str, List[str]], version: str,
+                           embeddings, cache_dir: Path = NARRATIVE_INDEX_DIR) -> tuple:
+    """
+    (index, added, removed): a copy of `index` for the new `store`. Only deals in
+    `changes` (see `diff_deal_stores`) are re-chunked, and only chunks whose text
+    or metadata changed are embedded again.
+    """
+    import numpy as np
+
+    touched = set(changes["removed"]) | set(changes["updated"])
+    fresh = {cid: (text, meta) for deal_id in changes["added"] + changes["updated"]
+             for cid, text, meta in narrative_chunks(store[deal_id])}
+    vs = _clone_index(index.vs)
+    current = vs.docstore._dict
+    removed = []
+    for pos in np.flatnonzero(np.isin(index.deal_ids, list(touched))) if touched else []:
+        cid = vs.index_to_docstore_id[int(pos)]
+        doc = current[cid]
+        if cid not in fresh or (doc.page_content, doc.metadata) != fresh[cid]:
+            removed.append(cid)
+    if removed:
+        vs.delete(removed)
+    added = [(cid, text, meta) for cid, (text, meta) in fresh.items() if cid not in vs.docstore._dict]
+    if added:
+        ids, texts, metadatas = (list(col) for col in zip(*added))
+        vs.add_texts(texts, metadatas=metadatas, ids=ids)
+    vs = _publish_index(vs, Path(cache_dir) / narrative_index_key(version, _embedding_model_id(embeddings)), version)
+    return NarrativeIndex(vs), len(added), len(removed)
+
+SEARCH_NARRATIVES_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "search_update_narratives",
+        "description": (
+            "Semantic search over the written parts of investment updates (overview, lowlights, business "
+            "updates, product updates, hiring). Use for qualitative questions across companies, e.g. "
+            "'what lowlights did fintech companies report last quarter?' or 'who is hiring?'. "
+            "Returns the most relevant passages with company, month and section."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "What to look for, in plain words."},
+                "companies": {"type": "array", "items": {"type": "string"}, "description": "Restrict to these companies."},
+                "sector": {"type": "string", "description": "Restrict to one sector, e.g. 'Fintech'."},
+                "sections": {"type": "array", "items": {"type": "string", "enum": NARRATIVE_SECTIONS}},
+                "from_period": {"type": "string", "description": "First month to include, 'YYYY-MM'."},
+                "to_period": {"type": "string", "description": "Last month to include, 'YYYY-MM'."},
+                "top_k": {"type": "integer", "description": f"Passages to return (default {NARRATIVE_TOP_K}, max {NARRATIVE_MAX_K})."},
+            },
+            "required": ["query"],
+        },
+    },
+}
+
+# =========================
+# Conversation memory (per session, bounded)
+# =========================
+DEFAULT_SESSION = "default"
+MEMORY_MAX_BYTES = 256 * 1024   # a session file is compacted to its tail past this size
+MEMORY_MAX_SESSIONS = 1024      # ring buffers (and their locks) kept in-process; least recently used are dropped
+MEMORY_TTL_DAYS = float(os.getenv("VIC_MEMORY_TTL_DAYS", "30"))       # session files idle longer are deleted; 0 = keep
+MEMORY_MAX_FILES = int(os.getenv("VIC_MEMORY_MAX_FILES", "10000"))    # oldest session files past this are deleted
+MEMORY_CLEANUP_INTERVAL_S = 3600
+
+class MemoryStore:
+    """
+    One JSONL file per session under `root`, fronted by an in-process ring
+    buffer of the last 2*MAX_TURNS messages. A cold session is loaded by
+    reading the file backwards from the end, so a turn costs the same no
+    matter how long the file (or the deployment) has been running. Rings and
+    per-session locks are evicted together, least recently used first, and
+    `cleanup` (run hourly from `append`) deletes idle or excess session files.
+    """
+
+    def __init__(self, root: Path, max_messages: int = 2 * MAX_TURNS, max_bytes: int = MEMORY_MAX_BYTES):
+        from collections import OrderedDict
+
+        self.root = Path(root)
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._rings: "OrderedDict[str, Any]" = OrderedDict()
+        self._locks: "OrderedDict[str, threading.Lock]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_cleanup = 0.0
+
+    def path(self, session_id: str) -> Path:
+        safe = "".join(ch for ch in session_id if ch.isalnum() or ch in "-_")[:64]
+        if safe != session_id or not safe:
+            safe = f"{safe}-{hashlib.sha256(session_id.encode('utf-8')).hexdigest()[:12]}"
+        return self.root / f"{safe}.jsonl"
+
+    def _session_lock(self, session_id: str) -> threading.Lock:
+        with self._lock:
+            lock = self._locks.get(session_id)
+            if lock is None:
+                lock = self._locks[session_id] = threading.Lock()
+            self._locks.move_to_end(session_id)
+            self._evict()
+            return lock
+
+    def _evict(self) -> None:
+        """Drop least recently used rings and their locks past MEMORY_MAX_SESSIONS (caller holds `_lock`)."""
+        while len(self._rings) > MEMORY_MAX_SESSIONS:
+            session_id, _ = self._rings.popitem(last=False)
+            lock = self._locks.get(session_id)
+            if lock is not None and not lock.locked():
+                del self._locks[session_id]
+        for session_id in list(self._locks)[: max(0, len(self._locks) - MEMORY_MAX_SESSIONS)]:
+            if not self._locks[session_id].locked():
+                del self._locks[session_id]
+
+    def _tail(self, path: Path) -> List[Dict[str, str]]:
+        """Last `max_messages` records of `path`, reading fixed-size blocks from the end."""
+        try:
+            with path.open("rb") as f:
+                f.seek(0, os.SEEK_END)
+                pos, buf = f.tell(), b""
+                while pos > 0 and buf.count(b"\n") <= self.max_messages:
+                    step = min(8192, pos)
+                    pos -= step
+                    f.seek(pos)
+                    buf = f.read(step) + buf
+        except OSError:
+            return []
+        msgs: List[Dict[str, str]] = []
+        for line in buf.splitlines()[-self.max_messages:]:
+            try:
+                msgs.append(json.loads(line))
+            except Exception:
+                continue
+        return msgs
+
+    def _ring(self, session_id: str):
+        from collections import deque
+
+        with self._lock:
+            ring = self._rings.get(session_id)
+            if ring is not None:
+                self._rings.move_to_end(session_id)
+                return ring
+        ring = deque(self._tail(self.path(session_id)), maxlen=self.max_messages)
+        with self._lock:
+            ring = self._rings.setdefault(session_id, ring)
+            self._evict()
+        return ring
+
+    def load(self, session_id: str = DEFAULT_SESSION) -> List[Dict[str, str]]:
+        return list(self._ring(session_id))
+
+    def append(self, session_id: str, user_text: str, assistant_text: str) -> None:
+        turn = os.urandom(6).hex()  # lets the rolling summary tell repeated turns apart
+        msgs = [{"role": "user", "content": user_text, "turn": turn},
+                {"role": "assistant", "content": assistant_text, "turn": turn}]
+        payload = "".join(json.dumps(m, ensure_ascii=False) + "\n" for m in msgs).encode("utf-8")
+        path = self.path(session_id)
+        with self._session_lock(session_id):
+            ring = self._ring(session_id)
+            ring.extend(msgs)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # one O_APPEND write per turn keeps concurrent writers from interleaving lines
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, payload)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if size > self.max_bytes:
+                self._compact(path, list(ring))
+        now = time.monotonic()
+        with self._lock:
+            due = now >= self._next_cleanup
+            if due:
+                self._next_cleanup = now + MEMORY_CLEANUP_INTERVAL_S
+        if due:
+            threading.Thread(target=self.cleanup, name="vic-memory-cleanup", daemon=True).start()
+
+    def _compact(self, path: Path, msgs: List[Dict[str, str]]) -> None:
+        tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+        with tmp.open("w", encoding="utf-8") as f:
+            for m in msgs:
+                f.write(json.dumps(m, ensure_ascii=False) + "\n")
+        os.replace(tmp, path)
+
+    def clear(self, session_id: str) -> None:
+        with self._session_lock(session_id):
+            with self._lock:
+                self._rings.pop(session_id, None)
+            try:
+                self.path(session_id).unlink()
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            lock = self._locks.get(session_id)
+            if lock is not None and not lock.locked():
+                del self._locks[session_id]
+
+    def cleanup(self, ttl_days: float = MEMORY_TTL_DAYS, max_files: int = MEMORY_MAX_FILES) -> int:
+        """
+        Delete session files idle for more than `ttl_days` (0 = no age limit),
+        then the least recently written ones past `max_files`. Returns how many
+        were deleted (best-effort; a session that comes back starts fresh).
+        """
+        try:
+            files = []
+            for entry in os.scandir(self.root):
+                if entry.is_file() and ".jsonl" in entry.name:
+                    files.append((entry.stat().st_mtime, entry.path))
+        except OSError:
+            return 0
+        files.sort(reverse=True)
+        cutoff = time.time() - ttl_days * 86400 if ttl_days else None
+        doomed = [p for i, (mtime, p) in enumerate(files) if i >= max_files or (cutoff and mtime < cutoff)]
+        removed = 0
+        for p in doomed:
+            try:
+                os.unlink(p)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+# =========================
+# Context assembly (token budget + rolling summary)
+# =========================
+CONTEXT_TOKEN_BUDGET = int(os.getenv("VIC_CONTEXT_TOKEN_BUDGET", "16000"))  # prompt tokens per call
+MEMORY_TOKEN_BUDGET = int(os.getenv("VIC_MEMORY_TOKEN_BUDGET", "2000"))    # verbatim prior turns
+SUMMARY_MAX_TOKENS = 300
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_WORKERS = 2
+_MESSAGE_OVERHEAD = 4  # role/separator tokens per chat message
+
+_ENCODER = None
+
+def _token_encoder():
+    """tiktoken's o200k encoder when tiktoken is installed (optional), else None."""
+    global _ENCODER
+    if _ENCODER is None:
+        try:
+            import tiktoken
+            _ENCODER = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _ENCODER = False
+    return _ENCODER or None
+
+def count_tokens(text: str) -> int:
+    enc = _token_encoder()
+    return len(enc.encode(text, disallowed_special=())) if enc else _approx_tokens(text or "")
+
+def _truncate_tokens(text: str, limit: int) -> str:
+    if count_tokens(text) <= limit:
+        return text
+    note = "\n[truncated to fit the context budget]"
+    keep = max(0, limit - count_tokens(note))
+    enc = _token_encoder()
+    head = enc.decode(enc.encode(text, disallowed_special=())[:keep]) if enc else text[: keep * 4]
+    return head + note
+
+def message_tokens(msg) -> int:
+    """Tokens of one chat message (dict or SDK message object), tool-call arguments included."""
+    get = msg.get if isinstance(msg, dict) else (lambda k, d=None: getattr(msg, k, d))
+    total = _MESSAGE_OVERHEAD + count_tokens(get("content") or "")
+    for tc in get("tool_calls") or []:
+        fn = tc["function"] if isinstance(tc, dict) else tc.function
+        args = fn["arguments"] if isinstance(fn, dict) else fn.arguments
+        total += count_tokens(args or "") + _MESSAGE_OVERHEAD
+    return total
+
+def _turn_key(msg: Dict[str, str]) -> str:
+    """Turn id written by `MemoryStore.append`; records from before turn ids fall back to a content hash."""
+    return msg.get("turn") or hashlib.sha256(f"{msg.get('role')}\0{msg.get('content')}".encode("utf-8")).hexdigest()[:16]
+
+def _chat_message(msg: Dict[str, str]) -> Dict[str, str]:
+    return {"role": msg.get("role"), "content": msg.get("content")}
+
+def _turns_within(msgs: List[Dict[str, str]], budget: int) -> int:
+    """Start index of the newest whole turns (user + assistant) of `msgs` that fit in `budget` tokens."""
+    used, i = 0, len(msgs)
+    while i > 0:
+        start = i - 2 if i >= 2 and msgs[i - 2].get("role") == "user" else i - 1
+        cost = sum(message_tokens(m) for m in msgs[start:i])
+        if used + cost > budget:
+            break
+        used += cost
+        i = start
+    return i
+
+class ContextBuilder:
+    """
+    Fits system prompt, conversation memory, tool outputs and the user message
+    into `budget` tokens. The newest prior turns are kept verbatim up to
+    `memory_budget`; older ones are folded into a per-session rolling summary.
+    Summaries are written off the request path: turns that just left the
+    verbatim window stay verbatim (up to `pending_budget`) while a background
+    job folds them in, and the next turn uses the updated summary. `history`
+    runs the job on a thread with `summarize`; `ahistory` runs it as a task
+    on the running loop with `asummarize`.
+    """
+
+    def __init__(self, summarize: Callable[[str, List[Dict[str, str]]], str],
+                 budget: int = CONTEXT_TOKEN_BUDGET, memory_budget: int = MEMORY_TOKEN_BUDGET,
+                 pending_budget: Optional[int] = None, asummarize: Optional[Callable[..., Any]] = None):
+        from collections import OrderedDict
+
+        self.summarize = summarize
+        self.asummarize = asummarize
+        self.budget = budget
+        self.memory_budget = memory_budget
+        self.pending_budget = memory_budget // 2 if pending_budget is None else pending_budget
+        self._summaries: "OrderedDict[str, tuple]" = OrderedDict()  # session → (summary, covered turn keys)
+        self._running: set = set()  # sessions with a summary job in flight
+        self._tasks: set = set()  # asyncio summary tasks, referenced until done
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def history(self, prior: List[Dict[str, str]], session_id: str = DEFAULT_SESSION) -> List[Dict[str, str]]:
+        """Messages to put between the system prompt and the user message (no model call)."""
+        messages, pending = self._assemble(prior, session_id)
+        if pending and self._claim(session_id):
+            from concurrent.futures import ThreadPoolExecutor
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="vic-summary")
+            self._pool.submit(self._update_summary, session_id, pending)
+        return messages
+
+    async def ahistory(self, prior: List[Dict[str, str]], session_id: str = DEFAULT_SESSION) -> List[Dict[str, str]]:
+        """`history` for the async path; without `asummarize` the job falls back to a thread."""
+        if self.asummarize is None:
+            return self.history(prior, session_id)
+        messages, pending = self._assemble(prior, session_id)
+        if pending and self._claim(session_id):
+            task = asyncio.get_running_loop().create_task(self._aupdate_summary(session_id, pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return messages
+
+    def summary(self, session_id: str) -> tuple:
+        """(rolling summary, keys of the turns it covers) for `session_id`."""
+        with self._lock:
+            return self._summaries.get(session_id, ("", ()))
+
+    def _assemble(self, prior: List[Dict[str, str]], session_id: str) -> tuple:
+        """(messages, older turns the summary doesn't cover yet)"""
+        i = _turns_within(prior, self.memory_budget)
+        summary, covered = self.summary(session_id)
+        pending = [m for m in prior[:i] if _turn_key(m) not in covered]
+        kept = pending[_turns_within(pending, self.pending_budget):]
+        head = [{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}] if summary else []
+        return head + [_chat_message(m) for m in kept + prior[i:]], pending
+
+    def _claim(self, session_id: str) -> bool:
+        """True if no summary job is in flight for `session_id` (which then has one)."""
+        with self._lock:
+            if session_id in self._running:
+                return False  # the job in flight leaves these turns for the next one
+            self._running.add(session_id)
+            return True
+
+    def _store(self, session_id: str, summary: str, pending: List[Dict[str, str]]) -> None:
+        with self._lock:
+            covered = self._summaries.get(session_id, ("", ()))[1]
+            covered = tuple(dict.fromkeys(covered + tuple(_turn_key(m) for m in pending)))[-4 * MAX_TURNS:]
+            self._summaries[session_id] = (_truncate_tokens(summary, SUMMARY_MAX_TOKENS), covered)
+            self._summaries.move_to_end(session_id)
+            while len(self._summaries) > MEMORY_MAX_SESSIONS:
+                self._summaries.popitem(last=False)
+
+    def _update_summary(self, session_id: str, pending: List[Dict[str, str]]) -> None:
+        try:
+            previous = self.summary(session_id)[0]
+            self._store(session_id, self.summarize(previous, [_chat_message(m) for m in pending]), pending)
+        except Exception as e:
+            logger.warning("summary failed (%s); retried on the next turn", e)
+        finally:
+            with self._lock:
+                self._running.discard(session_id)
+
+    async def _aupdate_summary(self, session_id: str, pending: List[Dict[str, str]]) -> None:
+        try:
+            previous = self.summary(session_id)[0]
+            self._store(session_id, await self.asummarize(previous, [_chat_message(m) for m in pending]), pending)
+        except Exception as e:
+            logger.warning("summary failed (%s); retried on the next turn", e)
+        finally:
+            with self._lock:
+                self._running.discard(session_id)
+
+    def fit_tool_outputs(self, messages: List[Any], contents: List[str]) -> List[str]:
+        """Truncate tool outputs so `messages` plus the tool messages stay within the budget."""
+        available = self.budget - sum(message_tokens(m) for m in messages) - _MESSAGE_OVERHEAD * len(contents)
+        sizes = [count_tokens(c) for c in contents]
+        if sum(sizes) <= available:
+            return contents
+        # equal shares; whatever small outputs leave unused goes to the larger ones
+        fitted: List[Optional[str]] = [None] * len(contents)
+        remaining, pending = max(0, available), sorted(range(len(contents)), key=lambda i: sizes[i])
+        while pending:
+            share = remaining // len(pending)
+            i = pending.pop(0)
+            fitted[i] = _truncate_tokens(contents[i], max(share, 1))
+            remaining -= min(sizes[i], share)
+        return fitted
+
+def _summary_prompt(previous: str, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in messages)
+    return [
+        {"role": "system", "content": (
+            "Maintain a running summary of a conversation about startup investment updates. "
+            "Keep company names, numbers, periods and open questions. At most 150 words."
+        )},
+        {"role": "user", "content": f"Current summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"},
+    ]
+
+# =========================
+# Answer cache (normalised question + companies + dataset version)
+# =========================
+ANSWER_CACHE_SIZE = 512
+ANSWER_CACHE_TTL_S = int(os.getenv("VIC_ANSWER_CACHE_TTL_S", str(6 * 3600)))
+ANSWER_CACHE_DB = os.getenv("VIC_ANSWER_CACHE_DB")  # sqlite file; unset = in-process only
+ANSWER_CACHE_SEMANTIC = float(os.getenv("VIC_ANSWER_CACHE_SEMANTIC", "0") or 0)  # cosine threshold; 0 = off
+# Questions leaning on earlier turns ("what about their burn?") are never served from cache
+_CONTEXT_WORDS = {
+    "it", "its", "they", "them", "their", "theirs", "he", "she", "his", "her",
+    "those", "these", "same", "above", "previous", "earlier", "again",
+}
+
+def normalize_question(text: str) -> str:
+    keep = "".join(ch if ch.isalnum() or ch in "$%.<>=" else " " for ch in (text or "").casefold())
+    return " ".join(keep.split()).strip(" .")
+
+def is_self_contained(question: str) -> bool:
+    return not (set(normalize_question(question).replace(".", " ").split()) & _CONTEXT_WORDS)
+
+class AnswerCache:
+    """
+    LRU + TTL cache of final answers. Entries carry a `scope` (dataset version
+    and resolved company ids); the optional semantic lookup only compares
+    question vectors within the same scope. With `db_path`, entries are also
+    kept in sqlite so they survive restarts and are shared between processes.
+    """
+
+    def __init__(self, capacity: int = ANSWER_CACHE_SIZE, ttl_s: float = ANSWER_CACHE_TTL_S,
+                 db_path: Optional[str] = ANSWER_CACHE_DB, semantic_threshold: float = ANSWER_CACHE_SEMANTIC):
+        from collections import OrderedDict
+
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        self.db_path = db_path
+        self.semantic_threshold = semantic_threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key → (expires, answer, scope, vector)
+        self._lock = threading.Lock()
+        if db_path:
+            with self._db() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT, scope TEXT, expires REAL)")
+
+    @staticmethod
+    def key(question: str, company_ids: List[str], dataset_version: str) -> tuple:
+        scope = f"{dataset_version}|{','.join(sorted(company_ids))}"
+        return hashlib.sha256(f"{scope}\0{normalize_question(question)}".encode("utf-8")).hexdigest(), scope
+
+    def _db(self):
+        import sqlite3
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def get(self, key: str, scope: str, vector: Optional[List[float]] = None) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if vector is not None and self.semantic_threshold:
+                match = self._nearest(scope, vector, now)
+                if match is not None:
+                    self.hits += 1
+                    return match
+        if self.db_path:
+            try:
+                with self._db() as db:
+                    row = db.execute("SELECT answer, expires FROM answers WHERE key = ?", (key,)).fetchone()
+                if row and row[1] > now:
+                    with self._lock:
+                        self._store(key, row[0], scope, vector, row[1])
+                        self.hits += 1
+                    return row[0]
+            except Exception as e:
+                logger.warning("answer cache read failed (%s)", e)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _nearest(self, scope: str, vector: List[float], now: float) -> Optional[str]:
+        import numpy as np
+
+        q = np.asarray(vector, dtype="float32")
+        q /= np.linalg.norm(q) or 1.0
+        best, best_score = None, self.semantic_threshold
+        for expires, answer, entry_scope, vec in self._entries.values():
+            if entry_scope != scope or vec is None or expires <= now:
+                continue
+            score = float(np.dot(q, vec))
+            if score >= best_score:
+                best, best_score = answer, score
+        return best
+
+    def _store(self, key: str, answer: str, scope: str, vector, expires: float) -> None:
+        if vector is not None:
+            import numpy as np
+
+            vector = np.asarray(vector, dtype="float32")
+            vector /= np.linalg.norm(vector) or 1.0
+        self._entries[key] = (expires, answer, scope, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def put(self, key: str, answer: str, scope: str, vector: Optional[List[float]] = None) -> None:
+        expires = time.time() + self.ttl_s
+        with self._lock:
+            self._store(key, answer, scope, vector, expires)
+        if self.db_path:
+            try:
+                with self._db() as db:
+                    db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)", (key, answer, scope, expires))
+            except Exception as e:
+                logger.warning("answer cache write failed (%s)", e)
+
+    def purge(self, keep_version: str) -> None:
+        """Drop entries of other dataset versions and expired ones."""
+        now = time.time()
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if not e[2].startswith(keep_version) or e[0] <= now]:
+                del self._entries[key]
+        if self.db_path:
+            try:
+                with self._db() as db:
+                    db.execute("DELETE FROM answers WHERE scope NOT LIKE ? OR expires <= ?", (f"{keep_version}|%", now))
+            except Exception as e:
+                logger.warning("answer cache purge failed (%s)", e)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries),
+                "hit_rate": round(self.hits / total, 3) if total else 0.0}
+
+# =========================
+# Local intent router (resolver + keyword rules before the LLM router)
+# =========================
+ROUTER_MIN_CONFIDENCE = float(os.getenv("VIC_ROUTER_MIN_CONFIDENCE", "0.8"))  # below this the model routes; >1 disables
+ROUTER_MODEL_PATH = os.getenv("VIC_ROUTER_MODEL")  # optional pickled text classifier with predict_proba/classes_
+ROUTER_MAX_COMPANIES = 3  # "compare A and B" becomes one lookup per company up to this many
+
+# phrase → KPI column; longer phrases are matched (and masked) first
+_METRIC_PHRASES = sorted({
+    "gross margin": "gross_margin", "margin": "gross_margin", "monthly burn": "monthly_burn",
+    "burn rate": "monthly_burn", "burn": "monthly_burn", "cash balance": "current_cash_balance",
+    "cash": "current_cash_balance", "runway": "runway", "annual revenue": "annual_revenue",
+    "arr": "arr_revenue", "revenue": "revenue", "revenues": "revenue", "sales": "revenue",
+    "customers": "customers", "customer count": "customers",
+}.items(), key=lambda kv: -len(kv[0]))
+_NARRATIVE_WORDS = {
+    "lowlight": "lowlights", "lowlights": "lowlights", "challenges": "lowlights", "concerns": "lowlights",
+    "risks": "lowlights", "problems": "lowlights", "hiring": "hiring_details", "hire": "hiring_details",
+    "hires": "hiring_details", "recruiting": "hiring_details", "product": "product_updates",
+    "features": "product_updates", "launch": "product_updates", "launched": "product_updates",
+    "roadmap": "product_updates", "partnership": "business_updates", "partnerships": "business_updates",
+    "partners": "business_updates", "expansion": "business_updates", "strategy": "business_updates",
+    "news": None, "highlights": None, "reported": None, "mentioned": None, "said": None,
+}
+_RANK_WORDS = {"which", "who", "top", "highest", "lowest", "most", "least", "best", "worst", "rank", "ranking",
+               "largest", "smallest", "biggest", "shortest", "longest", "companies", "portfolio", "any", "list"}
+# → portfolio_stat; checked in order, so "how many companies" counts while "how many customers" adds up
+_STAT_WORDS = {"how many companies": "count", "how many startups": "count", "total": "sum", "sum": "sum",
+               "combined": "sum", "how many": "sum", "average": "mean", "avg": "mean", "mean": "mean",
+               "median": "median"}
+_GROUPED = re.compile(r"\b(by|per|each) (sector|industry|stage|status|geography|region|country|year|quarter|month)\b")
+_ASCENDING_WORDS = {"lowest", "least", "smallest", "worst", "shortest", "bottom"}
+_TIME_WORDS = {"quarter", "month", "months", "year", "years", "week", "since", "between", "ago", "trend", "growth",
+               "grew", "change", "ytd", "q1", "q2", "q3", "q4", "january", "february", "march", "april", "may",
+               "june", "july", "august", "september", "october", "november", "december"}
+_THRESHOLD = re.compile(
+    r"(more than|greater than|over|above|exceeding|at least|less than|fewer than|under|below|at most|>=|<=|>|<)"
+    r"\s*\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(k|thousand|mm|mn|m|million|bn|b|billion)?\b"
+)
+_THRESHOLD_OPS = {"more than": ">", "greater than": ">", "over": ">", "above": ">", "exceeding": ">",
+                  "at least": ">=", "less than": "<", "fewer than": "<", "under": "<", "below": "<",
+                  "at most": "<=", ">=": ">=", "<=": "<=", ">": ">", "<": "<"}
+_SCALE = {"k": 1e3, "thousand": 1e3, "m": 1e6, "mm": 1e6, "mn": 1e6, "million": 1e6, "b": 1e9, "bn": 1e9, "billion": 1e9}
+
+def load_router_classifier(path: str) -> Callable[[str], Dict[str, float]]:
+    """question → {tool name: probability} from a pickled scikit-learn style text pipeline."""
+    import pickle
+    with open(path, "rb") as fh:
+        model = pickle.load(fh)
+    return lambda question: dict(zip(model.classes_, map(float, model.predict_proba([question])[0])))
+
+class IntentRouter:
+    """
+    Decides the tool calls for clear-cut questions without a model round-trip.
+    `route` returns {"calls": [(tool, args)], "confidence": 0-1, "reason": str}
+    or None; callers only act on it above ROUTER_MIN_CONFIDENCE. An optional
+    `classifier` (question → {tool: probability}) is averaged into the confidence.
+    """
+
+    def __init__(self, resolver: CompanyResolver, sectors: List[str], classifier=None):
+        self.resolver = resolver
+        self.sectors = {s.casefold(): s for s in sectors if s}
+        self.classifier = classifier
+
+    def route(self, question: str) -> Optional[Dict[str, Any]]:
+        q = normalize_question(question)
+        words = set(q.replace(".", " ").split())
+        if not q or words & (_CONTEXT_WORDS - {"above"}):
+            return None  # leans on earlier turns; let the model read the history
+        route = self._rules(question, q, words)
+        if route and self.classifier is not None:
+            try:
+                p = self.classifier(question).get(route["calls"][0][0], 0.0)
+                route["confidence"] = round((route["confidence"] + p) / 2, 3)
+            except Exception as e:
+                logger.warning("router classifier failed (%s)", e)
+        return route
+
+    def _rules(self, question: str, q: str, words: set) -> Optional[Dict[str, Any]]:
+        ids = self.resolver.mentions(question)
+        names = [self.resolver.names[cid] for cid in ids]
+        metrics = self._metrics(q)
+        threshold = _THRESHOLD.search(question.casefold())
+        ranking = bool(words & _RANK_WORDS) or threshold is not None
+        timed = bool(words & _TIME_WORDS) or re.search(r"\b20\d\d\b", q) is not None
+        sector = next((self.sectors[w] for w in words if w in self.sectors), None)
+        sections = list(dict.fromkeys(s for w, s in _NARRATIVE_WORDS.items() if w in words and s))
+        narrative = any(w in words for w in _NARRATIVE_WORDS)
+        stat = next((v for k, v in _STAT_WORDS.items() if (k in q if " " in k else k in words)), None)
+
+        def result(calls, confidence, reason):
+            return {"calls": calls, "confidence": confidence, "reason": reason}
+
+        if len(ids) == 1 and not words & {"which", "companies", "portfolio"}:
+            return result([("get_data_from_name", {"company_name": names[0]})], 0.95, "one company named")
+        if len(ids) >= 2:
+            if metrics:
+                args = {"metrics": metrics, "companies": names, **({"portfolio_stat": stat} if stat else {})}
+                return result([("query_kpis", args)], 0.6 if timed else 0.85, "KPI comparison of named companies")
+            if len(ids) <= ROUTER_MAX_COMPANIES:
+                return result([("get_data_from_name", {"company_name": n}) for n in names], 0.85, "few companies named")
+            return None
+        if metrics and (ranking or stat):
+            args: Dict[str, Any] = {"metrics": metrics}
+            if threshold:
+                phrase, amount, scale = threshold.groups()
+                value = float(amount.replace(",", "")) * _SCALE.get(scale or "", 1.0)
+                args["filters"] = [{"metric": metrics[0], "op": _THRESHOLD_OPS[phrase], "value": value}]
+            if sector:
+                args["sector"] = sector
+            clear = len(metrics) == 1 and not timed
+            if stat:
+                # totals and averages cover every matched company, never just the head of a ranking;
+                # "which are above average" and "average by sector" need more, so the model routes them
+                args["portfolio_stat"] = stat
+                mixed = bool(words & (_RANK_WORDS - {"companies", "portfolio", "any", "list"})) or _GROUPED.search(q)
+                return result([("query_kpis", args)], 0.9 if clear and not mixed else 0.6,
+                              "KPI statistic across companies")
+            args.update(sort_by=metrics[0], descending=not (words & _ASCENDING_WORDS))
+            top = re.search(r"\btop (\d+)\b", q)
+            if top:
+                args["top_k"] = int(top.group(1))
+            elif not threshold:
+                args["top_k"] = 10  # a superlative ("lowest runway") needs only the head of the ranking
+            return result([("query_kpis", args)], 0.9 if clear else 0.6, "KPI filter/rank across companies")
+        if narrative and not metrics and (ranking or sector):
+            args = {"query": question}
+            if sections:
+                args["sections"] = sections
+            if sector:
+                args["sector"] = sector
+            return result([("search_update_narratives", args)], 0.6 if timed else 0.85, "qualitative, across companies")
+        return None
+
+    @staticmethod
+    def _metrics(q: str) -> List[str]:
+        text = f" {q} "
+        found = []
+        for phrase, metric in _METRIC_PHRASES:
+            if f" {phrase} " in text:
+                found.append((text.index(f" {phrase} "), metric))
+                text = text.replace(f" {phrase} ", " " + "_" * len(phrase) + " ")
+        return list(dict.fromkeys(metric for _, metric in sorted(found)))
+
+# =========================
+# Local pandas sandbox (warm worker processes)
+# =========================
+CODE_BACKEND = os.getenv("VIC_CODE_BACKEND", "remote")  # "remote": o3 code interpreter; "local": run_pandas_code
+SANDBOX_WORKERS = int(os.getenv("VIC_SANDBOX_WORKERS", "2"))
+SANDBOX_CPU_S = float(os.getenv("VIC_SANDBOX_CPU_S", "5"))
+SANDBOX_TIMEOUT_S = float(os.getenv("VIC_SANDBOX_TIMEOUT_S", "10"))  # wall clock; the worker is killed after this
+SANDBOX_MEMORY_MB = int(os.getenv("VIC_SANDBOX_MEMORY_MB", "1024"))  # on top of what the worker starts with
+SANDBOX_OUTPUT_CHARS = 20000
+SANDBOX_DIR = Path(os.getenv("VIC_SANDBOX_DIR", ".vic_cache/sandbox"))  # per-version column files the workers map
+SANDBOX_KEEP_VERSIONS = 2  # the live version plus the one a reload just replaced
+SANDBOX_IMPORTS = {  # exact module names; submodules are reached through attributes, which are checked
+    "math", "statistics", "datetime", "re", "json", "collections", "itertools", "functools",
+    "decimal", "fractions", "numpy", "pandas",
+}
+SANDBOX_BLOCKED_ATTRS = re.compile(
+    r"^(_.*|read_.*|to_(pickle|parquet|excel|hdf|sql|feather|stata|clipboard|orc)"
+    r"|eval|query|load|loadtxt|save|savez.*|savetxt|genfromtxt|fromfile|fromregex|tofile|memmap|DataSource"
+    r"|ExcelFile|ExcelWriter|HDFStore)$"
+)  # eval/query resolve names and attributes themselves, outside these checks
+SANDBOX_TEXT_WRITERS = {"to_csv", "to_json", "to_html", "to_markdown", "to_string", "to_latex", "to_xml"}  # path as 1st arg
+SANDBOX_DEAL_COLUMNS = ["deal_id", "company", "sector", "geography", "status", "updated_at",
+                        "current_valuation", "invested_amount", "moic"]
+_SANDBOX_BUILTINS = [
+    "abs", "all", "any", "bool", "dict", "divmod", "enumerate", "filter", "float", "format", "frozenset",
+    "int", "isinstance", "len", "list", "map", "max", "min", "next", "print", "range", "repr", "reversed",
+    "round", "set", "slice", "sorted", "str", "sum", "tuple", "zip", "Exception", "ValueError", "KeyError",
+    "TypeError", "IndexError", "ZeroDivisionError", "StopIteration", "True", "False", "None",
+]
+
+RUN_PANDAS_CODE_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "run_pandas_code",
+        "description": (
+            "Run Python/pandas code over the whole portfolio and return what it prints. "
+            "`pd` and `np` are imported. DataFrames: `deals` (one row per company: "
+            + ", ".join(SANDBOX_DEAL_COLUMNS) + ") and `kpis` (one row per company and month: deal_id, company, "
+            "sector, year, month, period, currency, revenue_type, " + ", ".join(KPI_METRICS) + "). "
+            "The value of a final bare expression is printed too. Only " + ", ".join(sorted(SANDBOX_IMPORTS))
+            + " can be imported; no files or network, and no .query()/.eval() (use boolean masks). "
+            "Use it for questions `query_kpis` cannot express."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {"code": {"type": "string", "description": "Python code; print the answer."}},
+            "required": ["code"],
+        },
+    },
+}
+
+class SandboxError(Exception):
+    """Code rejected before it ran, or a worker that timed out or died."""
+
+class _CpuTimeExceeded(Exception):
+    pass
+
+def sandbox_frames(store: DealStore) -> Dict[str, Any]:
+    """The DataFrames sandboxed code sees: `deals` (hot fields per deal) and `kpis` (the KPI table)."""
+    import pandas as pd
+    deals = pd.DataFrame(
+        [(r.id, r.name, r.sector, r.geography, r.status, r.updated_at, r.current_valuation, r.invested_amount, r.moic)
+         for r in store.records],
+        columns=SANDBOX_DEAL_COLUMNS,
+    )
+    return {"deals": deals, "kpis": store.kpi_table}
+
+def write_sandbox_frames(frames: Dict[str, Any], folder: Path) -> None:
+    """
+    Save `frames` as one .npy file per column (text columns as codes plus
+    categories) and publish `folder` atomically, for `load_sandbox_frames`.
+    """
+    import numpy as np
+    import pandas as pd
+    tmp = folder.with_name(f"{folder.name}.tmp{os.getpid()}")
+    tmp.mkdir(parents=True, exist_ok=True)
+    layout = {}
+    for name, df in frames.items():
+        layout[name] = []
+        for i, column in enumerate(df.columns):
+            values = df[column]
+            if values.dtype.kind in "biuf":
+                np.save(tmp / f"{name}.{i}.npy", values.to_numpy())
+                layout[name].append([column, "number"])
+            else:
+                codes, categories = _categorical([None if pd.isna(v) else str(v) for v in values])
+                np.save(tmp / f"{name}.{i}.codes.npy", codes)
+                np.save(tmp / f"{name}.{i}.categories.npy", categories)
+                layout[name].append([column, "text"])
+    (tmp / "frames.json").write_text(json.dumps(layout), encoding="utf-8")
+    try:
+        os.replace(tmp, folder)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)  # published concurrently
+        if not (folder / "frames.json").exists():
+            raise
+    versions = sorted((d for d in folder.parent.iterdir() if d.is_dir() and ".tmp" not in d.name),
+                      key=lambda d: d.stat().st_mtime, reverse=True)
+    for old in versions[SANDBOX_KEEP_VERSIONS:]:
+        if old != folder:
+            shutil.rmtree(old, ignore_errors=True)
+
+def load_sandbox_frames(folder: Path) -> Dict[str, Any]:
+    """Frames saved by `write_sandbox_frames`; numeric columns stay memory-mapped and read-only."""
+    import numpy as np
+    import pandas as pd
+    layout = json.loads((folder / "frames.json").read_text(encoding="utf-8"))
+    frames = {}
+    for name, columns in layout.items():
+        data = {}
+        for i, (column, kind) in enumerate(columns):
+            if kind == "number":
+                data[column] = np.load(folder / f"{name}.{i}.npy", mmap_mode="r")
+            else:
+                text = _from_categorical(np.load(folder / f"{name}.{i}.codes.npy"),
+                                         np.load(folder / f"{name}.{i}.categories.npy"))
+                data[column] = pd.array(text, dtype="str")
+        frames[name] = pd.DataFrame(data, copy=False)  # copy-on-write: a job's writes copy, the file is untouched
+    return frames
+
+def check_sandbox_code(code: str):
+    """
+    Compile `code`, rejecting private/dunder attributes, file readers/writers
+    and non-whitelisted imports. Every attribute read is rewritten to go
+    through `__attr__` (`_sandbox_attr`), which refuses to hand out modules,
+    so `pd.io.common.os` can't be reached.
+    """
+    import ast
+
+    class GuardAttributes(ast.NodeTransformer):
+        def visit_Attribute(self, node):
+            self.generic_visit(node)
+            if not isinstance(node.ctx, ast.Load):
+                return node
+            call = ast.Call(func=ast.Name("__attr__", ast.Load()), args=[node.value, ast.Constant(node.attr)],
+                            keywords=[])
+            return ast.copy_location(call, node)
+
+    try:
+        tree = ast.parse(code, "<sandbox>", "exec")
+    except SyntaxError as e:
+        raise SandboxError(f"SyntaxError: {e.msg} (line {e.lineno})")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and SANDBOX_BLOCKED_ATTRS.match(node.attr):
+            raise SandboxError(f"attribute {node.attr!r} is not allowed (line {node.lineno})")
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in SANDBOX_TEXT_WRITERS
+                and (node.args or any(k.arg in ("path_or_buf", "buf") for k in node.keywords))):
+            raise SandboxError(f"{node.func.attr}() may only return text, not write a file (line {node.lineno})")
+        if isinstance(node, ast.Name) and node.id.startswith("__"):
+            raise SandboxError(f"name {node.id!r} is not allowed (line {node.lineno})")
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            modules = [a.name for a in node.names] if isinstance(node, ast.Import) else [node.module or ""]
+            for module in modules:
+                if module not in SANDBOX_IMPORTS:
+                    raise SandboxError(f"import of {module!r} is not allowed (line {node.lineno})")
+    # a trailing bare expression is printed (unless None), as in a notebook
+    if tree.body and isinstance(tree.body[-1], ast.Expr):
+        last = tree.body[-1]
+        call = ast.Call(func=ast.Name("__show__", ast.Load()), args=[last.value], keywords=[])
+        tree.body[-1] = ast.copy_location(ast.Expr(call), last)
+    tree = ast.fix_missing_locations(GuardAttributes().visit(tree))
+    return compile(tree, "<sandbox>", "exec")
+
+def _sandbox_attr(obj, name: str):
+    """
+    `obj.name` for sandboxed code; modules, frames, code objects and tracebacks
+    are refused, and text writers come back wrapped by `_sandbox_text_writer`.
+    """
+    import types
+    if SANDBOX_BLOCKED_ATTRS.match(name):
+        raise AttributeError(f"attribute {name!r} is not allowed")
+    value = getattr(obj, name)
+    if isinstance(value, (types.ModuleType, types.FrameType, types.CodeType, types.TracebackType)):
+        raise AttributeError(f"attribute {name!r} is a {type(value).__name__}, which sandboxed code can't use")
+    if name in SANDBOX_TEXT_WRITERS and callable(value):
+        return _sandbox_text_writer(value, name)
+    return value
+
+def _sandbox_text_writer(method, name: str):
+    """
+    `method` restricted to returning text. Checked at call time, so aliases
+    (`w = deals.to_csv; w(path)`) and unbound calls (`pd.DataFrame.to_csv(deals, path)`)
+    are caught too; keyword options other than a path still pass through.
+    """
+    def call(*args, **kwargs):
+        if args or "path_or_buf" in kwargs or "buf" in kwargs:
+            raise SandboxError(f"{name}() may only return text, not write a file")
+        return method(**kwargs)
+    return call
+
+def _sandbox_import(name, globals=None, locals=None, fromlist=(), level=0):
+    import types
+    if level or name not in SANDBOX_IMPORTS:
+        raise ImportError(f"import of {name!r} is not allowed")
+    module = __import__(name, globals, locals, fromlist, level)
+    for attr in fromlist or ():
+        if attr == "*" or SANDBOX_BLOCKED_ATTRS.match(attr) or isinstance(getattr(module, attr, None), types.ModuleType):
+            raise ImportError(f"cannot import {attr!r} from {name!r} here")
+    return module
+
+def _sandbox_show(value) -> None:
+    if value is not None:
+        print(value)
+
+def _sandbox_exec(code: str, frames: Dict[str, Any], cpu_s: float) -> Dict[str, Any]:
+    """Run one job inside a worker: fresh namespace, captured stdout, CPU-time alarm."""
+    import builtins
+    import io
+    import signal
+    import numpy as np
+    import pandas as pd
+    from contextlib import redirect_stdout
+
+    out = io.StringIO()
+    started = time.process_time()
+    try:
+        compiled = check_sandbox_code(code)
+    except SandboxError as e:
+        return {"stdout": "", "error": str(e), "cpu_ms": round(1000 * (time.process_time() - started), 1)}
+    try:
+        safe = {name: getattr(builtins, name) for name in _SANDBOX_BUILTINS if hasattr(builtins, name)}
+        safe["__import__"] = _sandbox_import
+        namespace = {"__builtins__": safe, "__show__": _sandbox_show, "__attr__": _sandbox_attr, "pd": pd, "np": np,
+                     **{k: v.copy(deep=False) for k, v in frames.items()}}
+        signal.setitimer(signal.ITIMER_PROF, cpu_s)
+        try:
+            with redirect_stdout(out):
+                exec(compiled, namespace)
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+        error = None
+    except _CpuTimeExceeded:
+        error = f"CPU time limit of {cpu_s:g}s exceeded"
+    except BaseException as e:
+        tb, line = e.__traceback__, None
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == "<sandbox>":
+                line = tb.tb_lineno
+            tb = tb.tb_next
+        error = f"{type(e).__name__}: {e}" + (f" (line {line})" if line else "")
+    text = out.getvalue()
+    if len(text) > SANDBOX_OUTPUT_CHARS:
+        text = text[:SANDBOX_OUTPUT_CHARS] + f"\n… [{len(text) - SANDBOX_OUTPUT_CHARS} more characters]"
+    return {"stdout": text, "error": error, "cpu_ms": round(1000 * (time.process_time() - started), 1)}
+
+def _sandbox_worker(conn, frames_dir: str, work_dir: str, cpu_s: float, memory_mb: int) -> None:
+    """
+    Worker process main loop: drop the environment, move into the empty
+    `work_dir`, map the frames, apply limits, then run jobs from `conn`.
+    """
+    import resource
+    import signal
+
+    def on_cpu_alarm(signum, frame):
+        raise _CpuTimeExceeded()
+
+    os.environ.clear()  # API keys and other secrets stay with the parent
+    os.chdir(work_dir)  # relative paths no longer point into the app's directory
+    frames = load_sandbox_frames(Path(frames_dir))
+    signal.signal(signal.SIGPROF, on_cpu_alarm)
+    signal.signal(signal.SIGXFSZ, signal.SIG_IGN)  # a file write then fails with EFBIG instead of killing us
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    try:
+        page = os.sysconf("SC_PAGE_SIZE")
+        with open("/proc/self/statm") as fh:
+            current = int(fh.read().split()[0]) * page
+        limit = current + memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (OSError, ValueError):
+        pass  # no /proc (macOS): no address-space cap
+    while True:
+        try:
+            code = conn.recv()
+        except (EOFError, OSError):
+            return
+        # hard backstop if the alarm can't fire (long-running C code): SIGXCPU kills the worker
+        used = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_used = int(used.ru_utime + used.ru_stime)
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_used + int(cpu_s) + 2, resource.RLIM_INFINITY))
+        conn.send(_sandbox_exec(code, frames, cpu_s))
+
+class SandboxPool:
+    """
+    Warm worker processes over the frames in `frames_dir` (written by
+    `write_sandbox_frames`). Workers are forked from a forkserver, a clean
+    single-threaded process with pandas preloaded, never from the app's own
+    threaded process; each one memory-maps the numeric columns, so their pages
+    are shared through the page cache rather than copied per worker. Workers
+    run with an empty environment in an empty working directory. Each job runs with a CPU-time alarm (plus
+    an RLIMIT_CPU backstop), an address-space cap, no file writes, a
+    whitelist of imports and checked attribute access. A job past the
+    wall-clock timeout, or one that kills its worker, gets an error and the
+    worker is replaced. The checks guard against mistakes in generated code;
+    they are not a boundary against a determined attacker. Needs
+    `forkserver` (Linux/macOS).
+    """
+
+    def __init__(self, frames_dir: Path, workers: int = SANDBOX_WORKERS, cpu_s: float = SANDBOX_CPU_S,
+                 memory_mb: int = SANDBOX_MEMORY_MB):
+        import multiprocessing
+        import queue
+        if "forkserver" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("the local code backend needs forkserver (Linux/macOS)")
+        self._ctx = multiprocessing.get_context("forkserver")
+        self._ctx.set_forkserver_preload(["numpy", "pandas"])  # no effect once the forkserver runs
+        self.frames_dir = str(frames_dir)
+        self.work_dir = tempfile.mkdtemp(prefix="vic-sandbox-")
+        self.cpu_s = cpu_s
+        self.memory_mb = memory_mb
+        self._idle: "queue.Queue" = queue.Queue()
+        self._closed = False
+        for _ in range(max(1, workers)):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> tuple:
+        parent, child = self._ctx.Pipe()
+        proc = self._ctx.Process(target=_sandbox_worker, args=(child, self.frames_dir, self.work_dir, self.cpu_s, self.memory_mb),
+                                 name="vic-sandbox", daemon=True)
+        proc.start()
+        child.close()
+        return proc, parent
+
+    @staticmethod
+    def _kill(worker: tuple) -> None:
+        proc, conn = worker
+        conn.close()
+        proc.kill()
+        proc.join(1)
+
+    def run(self, code: str, timeout: float = SANDBOX_TIMEOUT_S) -> Dict[str, Any]:
+        """{"stdout", "error", "cpu_ms"} for `code`; waits for a free worker if all are busy."""
+        if self._closed:
+            raise SandboxError("sandbox pool is closed")
+        worker = self._idle.get()
+        proc, conn = worker
+        try:
+            conn.send(code)
+            if not conn.poll(timeout):
+                self._kill(worker)
+                worker = self._spawn()
+                return {"stdout": "", "error": f"timed out after {timeout:g}s"}
+            return conn.recv()
+        except (EOFError, OSError):
+            # the worker died mid-job: CPU or memory limit
+            self._kill(worker)
+            exitcode = proc.exitcode
+            worker = self._spawn()
+            return {"stdout": "", "error": f"worker died (exit code {exitcode}); the code hit a CPU or memory limit"}
+        finally:
+            if self._closed:
+                self._kill(worker)
+            else:
+                self._idle.put(worker)
+
+    def close(self) -> None:
+        """Stop idle workers now; busy ones stop when their job returns."""
+        import queue
+        self._closed = True
+        while True:
+            try:
+                self._kill(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+def format_sandbox_result(result: Dict[str, Any]) -> str:
+    """Tool message content for a sandbox result (errors are recognised by `_is_tool_error`)."""
+    stdout = result.get("stdout") or ""
+    if result.get("error"):
+        return f"[Error running pandas code]: {result['error']}" + (f"\nOutput before the error:\n{stdout}" if stdout else "")
+    return stdout or "[No output; print the result]"
+
+# =========================
+# Prompts / tool schemas
+# =========================
+SYSTEM_PROMPT = """
+You are an analyst answering questions about startup investment updates.
+- If the user is asking about a single company, use the `get_data_from_name` function.
+- If the user is asking to filter, rank, compare, or aggregate KPI numbers (revenue, burn, runway, cash, customers, gross margin) across companies, use the `query_kpis` function.
+- For qualitative questions across companies about what updates said (lowlights, hiring, product or business news), use the `search_update_narratives` function.
+- For any other question about *multiple companies* that `query_kpis` cannot express, use the `run_python_query_on_json` function.
+Do not guess numbers. Always cite facts from the data.
+"""
+
+TOOLS: List[Dict[str, Any]] = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_data_from_name",
+            "description": (
+                "Return a precomputed digest for one company: latest KPIs with month-over-month and "
+                "year-over-year change, burn/runway/revenue trends, fundraising/pivot/founder-leaving flags, "
+                "valuation history and the latest update overview."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "company_name": {"type": "string"},
+                    "detail": {
+                        "type": "string",
+                        "enum": ["digest", "full"],
+                        "description": "'full' returns raw monthly KPI rows and update text instead; only when the digest is not enough.",
+                    },
+                },
+                "required": ["company_name"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "run_python_query_on_json",
+            "description": "Run a Python-based query over all company data. Use when filtering, comparing, or analyzing multiple companies.",
+            "parameters": {
+                "type": "object",
+                "properties": {"query": {"type": "string"}},
+                "required": ["query"]
+            }
+        }
+    },
+    QUERY_KPIS_TOOL,
+    SEARCH_NARRATIVES_TOOL,
+]
+
+def tools_for(backend: str) -> List[Dict[str, Any]]:
+    """Tool schemas for a code backend: "local" offers `run_pandas_code` in place of the code interpreter."""
+    if backend != "local":
+        return TOOLS
+    return [RUN_PANDAS_CODE_TOOL if t["function"]["name"] == "run_python_query_on_json" else t for t in TOOLS]
+
+def system_prompt_for(backend: str) -> str:
+    if backend != "local":
+        return SYSTEM_PROMPT
+    return SYSTEM_PROMPT.replace(
+        "use the `run_python_query_on_json` function.",
+        "use the `run_pandas_code` function with pandas code over `deals`/`kpis` that prints the answer.",
+    )
+
+FALLBACK_REPLY = (
+    "I'm tuned for investment‑update questions. Try:\n"
+    "• Give me a summary of Rollstack for the past year\n"
+    "• Which companies have revenue more than $1m?"
+)
+
+# =========================
+# Async request path (pooled AsyncOpenAI, concurrency limit, backoff)
+# =========================
+ASYNC_MAX_CONCURRENCY = int(os.getenv("VIC_ASYNC_MAX_CONCURRENCY", "16"))  # in-flight API calls per event loop
+ASYNC_MAX_CONNECTIONS = int(os.getenv("VIC_ASYNC_MAX_CONNECTIONS", "64"))
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY_S = 0.5
+RETRY_MAX_DELAY_S = 20.0
+_TRANSIENT_ERRORS = {"RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError"}
+
+def _is_transient(e: BaseException) -> bool:
+    return type(e).__name__ in _TRANSIENT_ERRORS
+
+def _retry_delay(e: BaseException, attempt: int) -> float:
+    """Honour the server's retry-after headers, else exponential backoff with jitter."""
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return min(RETRY_MAX_DELAY_S, float(headers["retry-after-ms"]) / 1000)
+        if headers.get("retry-after"):
+            return min(RETRY_MAX_DELAY_S, float(headers["retry-after"]))
+    except (TypeError, ValueError):
+        pass
+    return min(RETRY_MAX_DELAY_S, RETRY_BASE_DELAY_S * 2 ** attempt) * (0.5 + random.random() / 2)
+
+class _AsyncResources:
+    """Per-event-loop client and primitives (asyncio objects can't be shared across loops)."""
+
+    def __init__(self, client):
+        self.client = client
+        self.limit = asyncio.Semaphore(ASYNC_MAX_CONCURRENCY)
+        self.upload_lock = asyncio.Lock()
+
+# Status lines shown while a tool runs (formatted with the tool's arguments)
+TOOL_STATUS = {
+    "get_data_from_name": "Looking up {company_name}…",
+    "query_kpis": "Querying the KPI table…",
+    "run_python_query_on_json": "Running an analysis in the code interpreter…",
+    "run_pandas_code": "Running an analysis locally…",
+    "search_update_narratives": "Searching update narratives…",
+}
+
+# Tool calls from one model turn run concurrently on a shared, bounded pool
+TOOL_MAX_WORKERS = int(os.getenv("VIC_TOOL_WORKERS", "8"))
+TOOL_TIMEOUT_S = 60
+TOOL_TIMEOUTS_S = {"run_python_query_on_json": 300, "run_pandas_code": SANDBOX_TIMEOUT_S + 5}
+TOOL_MAX_STALLED = int(os.getenv("VIC_TOOL_MAX_STALLED", "16"))  # timed-out calls left running on retired pools
+
+def _is_tool_error(content: str) -> bool:
+    """Tool outputs that signal a failure (answers built on them are not cached)."""
+    head = (content or "")[:200]
+    if head.startswith('{"error"'):
+        return True
+    return head.startswith("[") and any(s in head for s in ("Error", "timed out", "Invalid arguments", "Unknown tool"))
+
+def _tool_status(fn_name: str, args: Dict[str, Any]) -> str:
+    try:
+        return TOOL_STATUS[fn_name].format(**args)
+    except (KeyError, IndexError):
+        return f"Running {fn_name}…"
+
+# =========================
+# Single-flight (coalesce identical in-flight work)
+# =========================
+ANSWER_FLIGHT_TIMEOUT_S = float(os.getenv("VIC_ANSWER_FLIGHT_TIMEOUT_S", "120"))  # a waiter then answers on its own
+
+class _Abandoned(Exception):
+    """The leader of a flight went away (cancelled, closed) without a result."""
+
+class SingleFlight:
+    """
+    Concurrent callers with the same key share one computation: the first
+    caller runs it, the rest wait for its result (or exception). Nothing is
+    kept once the flight lands, so this is coalescing, not caching. Flights
+    are `concurrent.futures.Future`s, so sync threads and any event loop can
+    wait on the same one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Any, Any] = {}
+        self.led = 0
+        self.shared = 0
+
+    def join(self, key) -> tuple:
+        """(future, leader): the first caller for `key` leads and must `settle`; the others wait on the future."""
+        from concurrent.futures import Future
+        with self._lock:
+            fut = self._flights.get(key)
+            if fut is not None:
+                self.shared += 1
+                return fut, False
+            fut = Future()
+            fut.set_running_or_notify_cancel()  # a waiter giving up can't cancel it for everyone
+            self._flights[key] = fut
+            self.led += 1
+            return fut, True
+
+    def settle(self, key, fut, value=None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            if self._flights.get(key) is fut:
+                del self._flights[key]
+        if error is None:
+            fut.set_result(value)
+        else:
+            fut.set_exception(error if isinstance(error, Exception) else _Abandoned(type(error).__name__))
+
+    def do(self, key, fn: Callable[[], Any]) -> tuple:
+        """
+        (result, shared) of `fn()`, run once per key at a time. Transient API
+        errors are retried by the client calls inside `fn` (the OpenAI SDK's own
+        retries, `_acall`), not here, so backoffs don't multiply.
+        """
+        while True:
+            fut, leader = self.join(key)
+            if not leader:
+                try:
+                    return fut.result(), True
+                except _Abandoned:
+                    continue
+            try:
+                value = fn()
+            except BaseException as e:
+                self.settle(key, fut, error=e)
+                raise
+            self.settle(key, fut, value)
+            return value, False
+
+    async def ado(self, key, fn: Callable[[], Any]) -> tuple:
+        """Async `do`: `fn()` returns an awaitable; waiting doesn't block the event loop."""
+        while True:
+            fut, leader = self.join(key)
+            if not leader:
+                try:
+                    return await asyncio.wrap_future(fut), True
+                except _Abandoned:
+                    continue
+            try:
+                value = await fn()
+            except BaseException as e:
+                self.settle(key, fut, error=e)
+                raise
+            self.settle(key, fut, value)
+            return value, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._flights), "led": self.led, "shared": self.shared}
+
+def flight_key(fn_name: str, args: Dict[str, Any], dataset_version: str) -> tuple:
+    """Tool call identity: name, arguments (sorted, whitespace-normalised strings) and dataset version."""
+    def norm(value):
+        if isinstance(value, str):
+            return " ".join(value.split())
+        if isinstance(value, dict):
+            return {k: norm(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [norm(v) for v in value]
+        return value
+    return "tool", fn_name, json.dumps(norm(args), sort_keys=True, ensure_ascii=False), dataset_version
+
+# =========================
+# Instrumentation (per-stage spans → rotating JSONL + Prometheus text)
+# =========================
+METRICS_LOG_PATH = Path(os.getenv("VIC_METRICS_LOG", ".vic_cache/spans.jsonl"))
+METRICS_LOG_MAX_BYTES = int(os.getenv("VIC_METRICS_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+METRICS_LOG_BACKUPS = 3
+METRICS_WINDOW = 2048  # recent durations kept per stage for the quantiles
+METRICS_PORT = int(os.getenv("VIC_METRICS_PORT", "0"))  # 0 = no /metrics endpoint
+
+# Id of the request a span belongs to; copied into tool threads and asyncio tasks
+_request_id: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("vic_request_id", default=None)
+
+def _payload_bytes(messages) -> int:
+    """UTF-8 size of the message contents sent to the model."""
+    total = 0
+    for m in messages:
+        content = m.get("content") if isinstance(m, dict) else getattr(m, "content", None)
+        total += len(content.encode("utf-8")) if isinstance(content, str) else 0
+    return total
+
+def _file_size(fh) -> int:
+    try:
+        return os.fstat(fh.fileno()).st_size
+    except Exception:
+        return 0
+
+class Span:
+    """One timed stage; the caller attaches token usage and payload size before it closes."""
+
+    __slots__ = ("stage", "attrs", "start", "prompt_tokens", "completion_tokens", "cached_tokens", "bytes")
+
+    def __init__(self, stage: str, attrs: Dict[str, Any]):
+        self.stage = stage
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.prompt_tokens = self.completion_tokens = self.cached_tokens = self.bytes = 0
+
+    def usage(self, usage) -> None:
+        """Add a Chat Completions or Responses `usage` object (missing fields count as 0)."""
+        if usage is None:
+            return
+        self.prompt_tokens += getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", None) or 0
+        self.completion_tokens += getattr(usage, "completion_tokens", None) or getattr(usage, "output_tokens", None) or 0
+        details = getattr(usage, "prompt_tokens_details", None) or getattr(usage, "input_tokens_details", None)
+        self.cached_tokens += getattr(details, "cached_tokens", None) or 0
+
+class Metrics:
+    """
+    Collects spans: a bounded window of durations per stage (for p50/p95),
+    running totals of time, tokens and bytes, and one JSON line per span in a
+    size-rotated log. Thread-safe; logging is best-effort.
+    """
+
+    _COUNTERS = ("count", "errors", "seconds", "prompt_tokens", "completion_tokens", "cached_tokens", "bytes")
+
+    def __init__(self, log_path: Optional[Path] = METRICS_LOG_PATH, window: int = METRICS_WINDOW):
+        from collections import deque
+        self._deque = deque
+        self.log_path = Path(log_path) if log_path else None
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations: Dict[str, Any] = {}
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._logger = None
+
+    @contextmanager
+    def span(self, stage: str, **attrs) -> Iterator[Span]:
+        s = Span(stage, attrs)
+        error = None
+        try:
+            yield s
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.record(s, time.perf_counter() - s.start, error)
+
+    def record(self, s: Span, seconds: float, error: Optional[str] = None) -> None:
+        with self._lock:
+            durations = self._durations.get(s.stage)
+            if durations is None:
+                durations = self._durations[s.stage] = self._deque(maxlen=self.window)
+                self._totals[s.stage] = dict.fromkeys(self._COUNTERS, 0)
+            durations.append(seconds)
+            t = self._totals[s.stage]
+            t["count"] += 1
+            t["errors"] += error is not None
+            t["seconds"] += seconds
+            t["prompt_tokens"] += s.prompt_tokens
+            t["completion_tokens"] += s.completion_tokens
+            t["cached_tokens"] += s.cached_tokens
+            t["bytes"] += s.bytes
+        self._log({
+            "ts": round(time.time(), 3), "request": _request_id.get(), "stage": s.stage,
+            "ms": round(seconds * 1000, 3), "prompt_tokens": s.prompt_tokens,
+            "completion_tokens": s.completion_tokens, "cached_tokens": s.cached_tokens,
+            "bytes": s.bytes, "error": error, **s.attrs,
+        })
+
+    def _log(self, entry: Dict[str, Any]) -> None:
+        if self.log_path is None:
+            return
+        try:
+            if self._logger is None:
+                from logging.handlers import RotatingFileHandler
+                self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                spans = logging.getLogger(f"vic.spans.{self.log_path.resolve()}")
+                if not spans.handlers:
+                    handler = RotatingFileHandler(self.log_path, maxBytes=METRICS_LOG_MAX_BYTES,
+                                                  backupCount=METRICS_LOG_BACKUPS, encoding="utf-8", delay=True)
+                    handler.setFormatter(logging.Formatter("%(message)s"))
+                    spans.addHandler(handler)
+                    spans.setLevel(logging.INFO)
+                    spans.propagate = False
+                self._logger = spans
+            self._logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+        except Exception as e:
+            logger.warning("span log disabled (%s)", e)
+            self.log_path = None
+
+    @staticmethod
+    def _quantile(sorted_values: List[float], q: float) -> float:
+        return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """stage → count, errors, p50/p95/mean ms (recent window) and token/byte totals."""
+        with self._lock:
+            snapshot = {stage: (sorted(d), dict(self._totals[stage])) for stage, d in self._durations.items()}
+        out = {}
+        for stage, (values, totals) in sorted(snapshot.items()):
+            out[stage] = {
+                "count": int(totals["count"]),
+                "errors": int(totals["errors"]),
+                "p50_ms": round(1000 * self._quantile(values, 0.5), 1),
+                "p95_ms": round(1000 * self._quantile(values, 0.95), 1),
+                "mean_ms": round(1000 * totals["seconds"] / totals["count"], 1),
+                "prompt_tokens": int(totals["prompt_tokens"]),
+                "completion_tokens": int(totals["completion_tokens"]),
+                "cached_tokens": int(totals["cached_tokens"]),
+                "bytes": int(totals["bytes"]),
+            }
+        return out
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition of the current stats."""
+        with self._lock:
+            snapshot = {stage: (sorted(d), dict(self._totals[stage])) for stage, d in self._durations.items()}
+        lines = [
+            "# HELP vic_stage_seconds Wall time per request stage.",
+            "# TYPE vic_stage_seconds summary",
+        ]
+        for stage, (values, totals) in sorted(snapshot.items()):
+            for q in (0.5, 0.95):
+                lines.append(f'vic_stage_seconds{{stage="{stage}",quantile="{q}"}} {self._quantile(values, q):.6f}')
+            lines.append(f'vic_stage_seconds_sum{{stage="{stage}"}} {totals["seconds"]:.6f}')
+            lines.append(f'vic_stage_seconds_count{{stage="{stage}"}} {int(totals["count"])}')
+        lines += ["# HELP vic_stage_errors_total Spans that ended with an exception.",
+                  "# TYPE vic_stage_errors_total counter"]
+        lines += [f'vic_stage_errors_total{{stage="{stage}"}} {int(t["errors"])}' for stage, (_, t) in sorted(snapshot.items())]
+        lines += ["# HELP vic_tokens_total Model tokens per stage.", "# TYPE vic_tokens_total counter"]
+        for stage, (_, t) in sorted(snapshot.items()):
+            for kind in ("prompt", "completion", "cached"):
+                lines.append(f'vic_tokens_total{{stage="{stage}",kind="{kind}"}} {int(t[kind + "_tokens"])}')
+        lines += ["# HELP vic_payload_bytes_total Payload bytes per stage.", "# TYPE vic_payload_bytes_total counter"]
+        lines += [f'vic_payload_bytes_total{{stage="{stage}"}} {int(t["bytes"])}' for stage, (_, t) in sorted(snapshot.items())]
+        return "\n".join(lines) + "\n"
+
+def serve_metrics(metrics: Metrics, port: int, host: str = "127.0.0.1"):
+    """Serve `metrics.prometheus()` at http://host:port/metrics from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="vic-metrics", daemon=True).start()
+    return server
+
+# =========================
+# Engine
+# =========================
+class VicEngine:
+    """
+    Owns the dataset, OpenAI clients, company index and chat memory.
+
+    Nothing is loaded in the constructor: each piece is built on first use
+    (thread-safe), so creating an engine is free and the first question pays
+    for whatever it actually touches. `client` and `embeddings` can be
+    injected, e.g. local fakes in tests.
+    """
+
+    def __init__(
+        self,
+        data_path: Path = DATA_PATH,
+        api_key: Optional[str] = None,
+        client=None,
+        embeddings=None,
+        async_client=None,
+        base_url: Optional[str] = None,
+        index_cache_dir: Path = INDEX_CACHE_DIR,
+        memory_dir: Path = MEMORY_DIR,
+        upload_cache_path: Path = UPLOAD_CACHE_PATH,
+        query_embed_cache_path: Optional[Path] = QUERY_EMBED_CACHE_PATH,
+        metrics_log_path: Optional[Path] = METRICS_LOG_PATH,
+        snapshot_dir: Path = SNAPSHOT_DIR,
+        narrative_index_dir: Path = NARRATIVE_INDEX_DIR,
+        digest_dir: Path = DIGEST_DIR,
+        sandbox_dir: Path = SANDBOX_DIR,
+        router_classifier: Optional[Callable[[str], Dict[str, float]]] = None,
+        code_backend: str = CODE_BACKEND,
+    ):
+        self.data_path = Path(data_path)
+        self.index_cache_dir = Path(index_cache_dir)
+        self.snapshot_dir = Path(snapshot_dir)
+        self.narrative_index_dir = Path(narrative_index_dir)
+        self.digest_dir = Path(digest_dir)
+        self.sandbox_dir = Path(sandbox_dir)
+        self.memory_dir = Path(memory_dir)
+        self.upload_cache_path = Path(upload_cache_path)
+        self.query_embed_cache_path = Path(query_embed_cache_path) if query_embed_cache_path else None
+        self._api_key = api_key
+        self._lock = threading.Lock()  # short critical sections only; lazy builds use _locks
+        self._locks: Dict[str, threading.Lock] = {}
+        self._upload_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._router_classifier = router_classifier
+        self.code_backend = code_backend
+        self._watch_stop: Optional[threading.Event] = None
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        self._async_client = async_client
+        self._async_by_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _AsyncResources]" = weakref.WeakKeyDictionary()
+        self._cache: Dict[str, Any] = {}
+        self.metrics = Metrics(metrics_log_path)
+        self.flights = SingleFlight()
+        self._metrics_server = None
+        self._stalled: set = set()  # futures of timed-out tool calls that are still running
+        if client is not None:
+            self._cache["client"] = client
+        if embeddings is not None:
+            self._cache["embeddings"] = embeddings
+
+    def _lazy(self, name: str, build: Callable[[], Any]) -> Any:
+        value = self._cache.get(name)
+        if value is None:
+            with self._lock:
+                lock = self._locks.setdefault(name, threading.Lock())
+            with lock:
+                value = self._cache.get(name)
+                if value is None:
+                    value = build()
+                    self._cache[name] = value
+        return value
+
+    # ----- environment / clients -----
+    @property
+    def api_key(self) -> str:
+        key = self._api_key or os.getenv("OPENAI_API_KEY")
+        if not key:
+            raise RuntimeError("Set OPENAI_API_KEY in your environment (locally: .env or PowerShell; cloud: Secrets).")
+        return key
+
+    @property
+    def client(self):
+        def build():
+            from openai import OpenAI
+            return OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._lazy("client", build)
+
+    @property
+    def embeddings(self):
+        def build():
+            from langchain_openai import OpenAIEmbeddings
+            # Explicitly pass API key (keeps old packages happy)
+            return OpenAIEmbeddings(openai_api_key=self.api_key)
+        return self._lazy("embeddings", build)
+
+    # ----- data (everything below is scoped to the current `Dataset`) -----
+    def _load_dataset(self) -> Dataset:
+        with self.metrics.span("dataset_load") as s:
+            store, version, stat = load_or_build_deal_store(self.data_path, self.snapshot_dir)
+            s.attrs["deals"] = len(store)
+        return Dataset(store, version, stat)
+
+    @property
+    def dataset(self) -> Dataset:
+        """The current dataset version; replaced as a whole by `reload`."""
+        return self._lazy("dataset", self._load_dataset)
+
+    def _derived(self, ds: Dataset, name: str) -> Any:
+        """Dataset-scoped structure `name`, built once per `Dataset`."""
+        value = ds._cache.get(name)
+        if value is not None:
+            return value
+        builders = {
+            "data": lambda: ds.store.to_dataset(),
+            "kpi_table": lambda: ds.store.kpi_table,
+            "kpi_series": lambda: KpiSeriesStore(self._derived(ds, "kpi_table")),
+            "company_id_map": lambda: {r.name: r.id for r in ds.store.records},
+            "resolver": lambda: CompanyResolver.from_records(ds.store.records),
+            "company_vs": lambda: self._build_company_vs(ds),
+            "narrative_index": lambda: self._build_narrative_index(ds),
+            "digests": lambda: self._build_digests(ds),
+            "sandbox": lambda: self._start_sandbox(ds),
+            "router": lambda: IntentRouter(self._derived(ds, "resolver"), [r.sector for r in ds.store.records],
+                                           self.router_classifier),
+        }
+        return ds.lazy(name, builders[name])
+
+    @property
+    def deal_store(self) -> DealStore:
+        """Compact deals (hot-field records, out-of-line JSON), from the binary snapshot when current."""
+        return self.dataset.store
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        """The full parsed dataset; materialised from the store only when something asks for it."""
+        return self._derived(self.dataset, "data")
+
+    @property
+    def dataset_version(self) -> str:
+        """sha256 of the dataset file the current store was loaded from."""
+        return self.dataset.version
+
+    @property
+    def kpi_table(self):
+        """Flattened KPI history (pandas DataFrame), built once per loaded dataset."""
+        return self._derived(self.dataset, "kpi_table")
+
+    @property
+    def kpi_series(self) -> KpiSeriesStore:
+        """Per-company KPI arrays (charts, latest values, top-k), built once per loaded dataset."""
+        return self._derived(self.dataset, "kpi_series")
+
+    def query_kpis(self, **kwargs) -> Dict[str, Any]:
+        try:
+            return query_kpi_table(self.kpi_table, **kwargs)
+        except Exception as e:
+            return {"error": f"KPI query failed: {e}"}
+
+    @property
+    def company_id_map(self) -> Dict[str, str]:
+        """company name → deal id"""
+        return self._derived(self.dataset, "company_id_map")
+
+    @property
+    def deal_index(self) -> DealStore:
+        """deal id → deal (decoded on access)"""
+        return self.deal_store
+
+    @property
+    def query_embedding_cache(self) -> QueryEmbeddingCache:
+        return self._lazy("query_embedding_cache", lambda: QueryEmbeddingCache(path=self.query_embed_cache_path))
+
+    def embed_query(self, text: str) -> List[float]:
+        """Query embedding through the LRU cache; only misses reach the embeddings API."""
+        def compute(key_text: str) -> List[float]:
+            with self.metrics.span("embed") as s:
+                s.bytes = len(key_text.encode("utf-8"))
+                return self.embeddings.embed_query(key_text)
+        return self.query_embedding_cache.get_or_compute(_embedding_model_id(self.embeddings), text, compute)
+
+    @property
+    def resolver(self) -> CompanyResolver:
+        return self._derived(self.dataset, "resolver")
+
+    @property
+    def company_vs(self):
+        return self._derived(self.dataset, "company_vs")
+
+    @property
+    def router(self) -> IntentRouter:
+        return self._derived(self.dataset, "router")
+
+    @property
+    def router_classifier(self):
+        """Injected classifier, else the one at VIC_ROUTER_MODEL (None when unset or unloadable)."""
+        if self._router_classifier is None and ROUTER_MODEL_PATH:
+            try:
+                self._router_classifier = load_router_classifier(ROUTER_MODEL_PATH)
+            except Exception as e:
+                logger.warning("router classifier unavailable (%s)", e)
+                self._router_classifier = False
+        return self._router_classifier or None
+
+    def _local_route(self, user_input: str) -> Optional[tuple]:
+        """
+        (assistant message, tool calls) synthesised by the local router, or None
+        when it is not confident enough and the model should route.
+        """
+        with self.metrics.span("route.local") as s:
+            try:
+                route = self.router.route(user_input)
+            except Exception as e:
+                logger.warning("local router failed (%s)", e)
+                route = None
+            s.attrs["confidence"] = route["confidence"] if route else 0.0
+            if not route or route["confidence"] < ROUTER_MIN_CONFIDENCE:
+                s.attrs["fallback"] = True
+                return None
+            s.attrs["reason"] = route["reason"]
+        calls = [
+            {"id": f"local_{i}", "type": "function",
+             "function": {"name": name, "arguments": json.dumps(args, ensure_ascii=False)}}
+            for i, (name, args) in enumerate(route["calls"])
+        ]
+        tcs = [SimpleNamespace(id=c["id"], type="function", function=SimpleNamespace(**c["function"])) for c in calls]
+        return {"role": "assistant", "content": None, "tool_calls": calls}, tcs
+
+    def _build_company_vs(self, ds: Dataset):
+        with self.metrics.span("company_index") as s:
+            names = list(self._derived(ds, "company_id_map"))
+            s.attrs["companies"] = len(names)
+            return load_or_build_company_index(names, self.embeddings, self.index_cache_dir, ds.version)
+
+    @property
+    def narrative_index(self) -> NarrativeIndex:
+        return self._derived(self.dataset, "narrative_index")
+
+    def _build_narrative_index(self, ds: Dataset) -> NarrativeIndex:
+        with self.metrics.span("narrative_index") as s:
+            index = load_or_build_narrative_index(ds.store, ds.version, self.embeddings, self.narrative_index_dir)
+            s.attrs["chunks"] = len(index)
+            return index
+
+    @property
+    def digests(self) -> Dict[str, Dict[str, Any]]:
+        """deal id → precomputed digest for the current dataset version."""
+        return self._derived(self.dataset, "digests")
+
+    def _build_digests(self, ds: Dataset, previous=None, stale=None) -> Dict[str, Dict[str, Any]]:
+        with self.metrics.span("digests") as s:
+            digests = load_or_build_digests(ds.store, ds.version, self.digest_dir, previous, stale)
+            s.attrs["deals"] = len(digests)
+            return digests
+
+    def warm_up(self) -> None:
+        """
+        Build the digests, company index, sandbox workers and, last as the
+        slowest, the narrative index ahead of the first question (best-effort).
+        Each build only blocks callers that need that same structure.
+        """
+        try:
+            self.digests
+            self.company_vs
+            if self.code_backend == "local":
+                self.sandbox
+            self.narrative_index
+        except Exception as e:
+            logger.warning("warm-up failed: %s", e)
+
+    # ----- hot reload -----
+    def reload(self) -> bool:
+        """
+        Swap in a changed dataset file without interrupting readers. The new
+        version is prepared off to the side (snapshot, plus whatever the old one
+        had built; the company index is copied and only new or renamed companies
+        are embedded) and then replaces the old `Dataset` in one assignment.
+        Returns True if a new version was swapped in.
+        """
+        with self._reload_lock:
+            old = self._cache.get("dataset")
+            if old is None:
+                return False  # nothing loaded yet; first use reads the current file
+            try:
+                st = self.data_path.stat()
+            except OSError:
+                return False
+            if (st.st_size, st.st_mtime_ns) == old.stat:
+                return False
+            with self.metrics.span("dataset_reload") as s:
+                new = self._load_dataset()
+                if new.version == old.version:
+                    old.stat = new.stat  # touched, not changed
+                    return False
+                changes = diff_deal_stores(old.store, new.store)
+                s.attrs.update({k: len(v) for k, v in changes.items()})
+                if old.built("company_vs"):
+                    vs, added, removed = update_company_index(
+                        self._derived(old, "company_vs"), list(self._derived(new, "company_id_map")),
+                        self.embeddings, self.index_cache_dir, new.version,
+                    )
+                    new._cache["company_vs"] = vs
+                    s.attrs.update(embedded=added, unindexed=removed)
+                if old.built("narrative_index"):
+                    index, added, removed = update_narrative_index(
+                        self._derived(old, "narrative_index"), new.store, changes, new.version,
+                        self.embeddings, self.narrative_index_dir,
+                    )
+                    new._cache["narrative_index"] = index
+                    s.attrs.update(chunks_embedded=added, chunks_removed=removed)
+                if old.built("digests"):
+                    new._cache["digests"] = self._build_digests(
+                        new, self._derived(old, "digests"), changes["added"] + changes["updated"],
+                    )
+                for name in ("kpi_series", "kpi_table", "company_id_map", "resolver", "sandbox"):
+                    if old.built(name):
+                        self._derived(new, name)
+                with self._lock:
+                    self._cache["dataset"] = new
+                if old.built("sandbox"):
+                    old._cache["sandbox"].close()
+            return True
+
+    def watch_dataset(self, interval: float = DATASET_WATCH_INTERVAL_S) -> None:
+        """Poll the dataset file from a daemon thread and `reload` on change (once per engine; 0 disables)."""
+        with self._lock:
+            if self._watch_stop is not None or not interval:
+                return
+            self._watch_stop = stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.warning("dataset reload failed (%s)", e)
+
+        threading.Thread(target=loop, name="vic-dataset-watch", daemon=True).start()
+
+    def stop_watching(self) -> None:
+        with self._lock:
+            if self._watch_stop is not None:
+                self._watch_stop.set()
+                self._watch_stop = None
+
+    # ----- search helpers -----
+    def resolve_company(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """
+        Candidate companies for `query`, best first, each {name, id, score, method}.
+        Exact/alias/fuzzy tiers run locally; the FAISS search (a network embedding
+        call) is only used when they find nothing.
+        """
+        matches = self.resolver.resolve(query, limit=limit)
+        if matches:
+            return matches
+        return self._vector_matches(self.embed_query(query), limit)
+
+    def _vector_matches(self, vector: List[float], limit: int) -> List[Dict[str, Any]]:
+        ds = self.dataset  # index and id map from the same version
+        results = self._derived(ds, "company_vs").similarity_search_with_score_by_vector(vector, k=limit)
+        id_map = self._derived(ds, "company_id_map")
+        # same distance → relevance mapping LangChain uses for unit-length embeddings
+        return [
+            {"name": doc.page_content, "id": id_map[doc.page_content],
+             "score": round(100 * max(0.0, 1.0 - float(dist) / math.sqrt(2)), 1), "method": "vector"}
+            for doc, dist in results
+        ]
+
+    def search_company(self, query, k=1):
+        for match in self.resolve_company(query, limit=k):
+            return match["name"], match["id"]
+
+    def get_data_from_id(self, cid):
+        return self.deal_index.get(cid)
+
+    def get_data_from_name(self, company_name):
+        found = self.search_company(company_name)
+        return self.get_data_from_id(found[1]) if found else None
+
+    def get_deal_view(self, company_name, token_budget: int = DEAL_TOKEN_BUDGET, matches=None) -> Dict[str, Any]:
+        """Projected (compact) deal for the `get_data_from_name` tool message, plus how it was matched."""
+        if matches is None:
+            matches = self.resolve_company(company_name)
+        if not matches:
+            return project_deal(None)
+        view = project_deal(self.get_data_from_id(matches[0]["id"]), token_budget)
+        view["match"] = matches[0]
+        if is_ambiguous(matches):
+            view["other_candidates"] = matches[1:]
+            view["note_on_match"] = "Name was ambiguous; mention the alternatives to the user."
+        return view
+
+    def get_deal_digest(self, company_name, matches=None) -> Dict[str, Any]:
+        """Precomputed digest for the `get_data_from_name` tool message, plus how it was matched."""
+        if matches is None:
+            matches = self.resolve_company(company_name)
+        if not matches:
+            return project_deal(None)
+        digest = self.digests.get(matches[0]["id"])
+        if digest is None:  # not in this version's digests; project the raw deal instead
+            return self.get_deal_view(company_name, matches=matches)
+        view = {**digest, "match": matches[0]}
+        if is_ambiguous(matches):
+            view["other_candidates"] = matches[1:]
+            view["note_on_match"] = "Name was ambiguous; mention the alternatives to the user."
+        return view
+
+    def company_view(self, company_name, detail: str = "digest", matches=None) -> Dict[str, Any]:
+        """`get_data_from_name` result: the digest by default, the projected deal for detail="full"."""
+        if detail == "full":
+            return self.get_deal_view(company_name, matches=matches)
+        return self.get_deal_digest(company_name, matches=matches)
+
+    def search_update_narratives(self, query: str, **filters) -> Dict[str, Any]:
+        """Top-k narrative passages for `query` (see SEARCH_NARRATIVES_TOOL for the filters)."""
+        try:
+            return self._narrative_search(self.embed_query(query), query, **filters)
+        except Exception as e:
+            return {"error": f"Narrative search failed: {e}"}
+
+    def _narrative_search(self, vector: List[float], query: str, companies: Optional[List[str]] = None,
+                          sector: Optional[str] = None, sections: Optional[List[str]] = None,
+                          from_period: Optional[str] = None, to_period: Optional[str] = None,
+                          top_k: int = NARRATIVE_TOP_K) -> Dict[str, Any]:
+        unknown = [sec for sec in sections or [] if sec not in NARRATIVE_SECTIONS]
+        if unknown:
+            return {"error": f"unknown section(s) {unknown}; choose from {NARRATIVE_SECTIONS}"}
+        out: Dict[str, Any] = {"query": query}
+        deal_ids = None
+        if companies:
+            matched = {name: self.resolver.resolve(name, limit=1) for name in companies}
+            deal_ids = [m[0]["id"] for m in matched.values() if m]
+            missing = [name for name, m in matched.items() if not m]
+            if missing:
+                out["unmatched_companies"] = missing
+        k = max(1, min(int(top_k or NARRATIVE_TOP_K), NARRATIVE_MAX_K))
+        hits = self.narrative_index.search(
+            vector, k, deal_ids=deal_ids, sector=sector, sections=sections,
+            from_period=_parse_period(from_period), to_period=_parse_period(to_period),
+        )
+        out["passages"] = [
+            {"company": doc.metadata["company"], "period": _period_label(doc.metadata["year"], doc.metadata["month"]),
+             "section": doc.metadata["section"], "text": doc.page_content,
+             "score": round(100 * max(0.0, 1.0 - dist / math.sqrt(2)), 1)}
+            for doc, dist in hits
+        ]
+        if not out["passages"]:
+            out["note"] = "No update passages match these filters."
+        return out
+
+    # ----- answer cache -----
+    @property
+    def answer_cache(self) -> AnswerCache:
+        return self._lazy("answer_cache", AnswerCache)
+
+    def _answer_cache_slot(self, user_input: str) -> Optional[tuple]:
+        """(key, scope, question vector) for a cacheable question, else None."""
+        if not is_self_contained(user_input):
+            return None
+        try:
+            version = self.dataset_version
+            if self._cache.get("answer_cache_version") != version:
+                self.answer_cache.purge(version)
+                self._cache["answer_cache_version"] = version
+            key, scope = AnswerCache.key(user_input, self.resolver.mentions(user_input), version)
+            vector = self.embed_query(normalize_question(user_input)) if self.answer_cache.semantic_threshold else None
+            return key, scope, vector
+        except Exception as e:
+            logger.warning("answer cache unavailable (%s)", e)
+            return None
+
+    # ----- memory (per-session JSONL + ring buffer) -----
+    @property
+    def memory(self) -> MemoryStore:
+        return self._lazy("memory", lambda: MemoryStore(self.memory_dir))
+
+    @property
+    def context(self) -> ContextBuilder:
+        return self._lazy("context", lambda: ContextBuilder(self._summarize, asummarize=self._asummarize))
+
+    def _summarize(self, previous: str, messages: List[Dict[str, str]]) -> str:
+        prompt = _summary_prompt(previous, messages)
+        with self.metrics.span("summarize") as s:
+            resp = self.client.chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=prompt,
+                temperature=0,
+                max_tokens=SUMMARY_MAX_TOKENS,
+            )
+            s.usage(getattr(resp, "usage", None))
+            s.bytes = _payload_bytes(prompt)
+        return resp.choices[0].message.content or previous
+
+    async def _asummarize(self, previous: str, messages: List[Dict[str, str]]) -> str:
+        """`_summarize` on the loop's pooled AsyncOpenAI client."""
+        prompt = _summary_prompt(previous, messages)
+        client = self._async_resources().client
+        with self.metrics.span("summarize") as s:
+            resp = await self._acall(
+                client.chat.completions.create,
+                model=SUMMARY_MODEL,
+                messages=prompt,
+                temperature=0,
+                max_tokens=SUMMARY_MAX_TOKENS,
+            )
+            s.usage(getattr(resp, "usage", None))
+            s.bytes = _payload_bytes(prompt)
+        return resp.choices[0].message.content or previous
+
+    def _load_memory(self, session_id: str = DEFAULT_SESSION) -> List[Dict[str, str]]:
+        """
+        Returns prior messages of `session_id` as a list of dicts:
+        [{'role':'user','content':...}, {'role':'assistant','content':...}, ...]
+        """
+        try:
+            return self.memory.load(session_id)
+        except Exception:
+            return []
+
+    def _append_memory(self, user_text: str, assistant_text: str, session_id: str = DEFAULT_SESSION) -> None:
+        """Append the latest user/assistant messages to the session's memory (best-effort)."""
+        try:
+            self.memory.append(session_id, user_text, assistant_text)
+        except Exception:
+            pass
+
+    # ----- dataset upload (one file id per dataset version) -----
+    def _read_upload_record(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self.upload_cache_path.read_text(encoding="utf-8"))
+        except Exception:
+            return {}
+
+    def _write_upload_record(self, record: Dict[str, Any]) -> None:
+        try:
+            self.upload_cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.upload_cache_path.with_name(f"{self.upload_cache_path.name}.tmp{os.getpid()}")
+            tmp.write_text(json.dumps(record), encoding="utf-8")
+            os.replace(tmp, self.upload_cache_path)
+        except Exception as e:
+            logger.warning("could not persist upload record (%s)", e)
+
+    def _account_key(self, client=None) -> str:
+        key = getattr(client if client is not None else self.client, "api_key", None) or ""
+        return hashlib.sha256(str(key).encode("utf-8")).hexdigest()[:16]
+
+    def _open_dataset_for_upload(self):
+        """
+        The dataset file itself when it is still what `data` was loaded from;
+        otherwise `data` is streamed through JSONEncoder.iterencode into a temp file.
+        """
+        try:
+            st = self.data_path.stat()
+            if (st.st_size, st.st_mtime_ns) == self.dataset.stat:
+                return self.data_path.open("rb")
+        except OSError:
+            pass
+        fh = tempfile.TemporaryFile()
+        for chunk in json.JSONEncoder().iterencode(self.deal_store.to_dataset()):
+            fh.write(chunk.encode("utf-8"))
+        fh.seek(0)
+        return fh
+
+    def _cached_file_id(self, version: str, account: str) -> Optional[str]:
+        record = self._read_upload_record()
+        if record.get("file_id") and record.get("dataset_version") == version and record.get("account") == account:
+            return record["file_id"]
+        return None
+
+    def _record_upload(self, version: str, account: str, file_id: str) -> Dict[str, Any]:
+        """Make `file_id` current; the id it replaces is queued for deletion."""
+        record = self._read_upload_record()
+        stale = list(record.get("stale") or [])
+        if record.get("file_id") and record.get("account") == account:
+            stale.append(record["file_id"])
+        record = {"dataset_version": version, "account": account, "file_id": file_id, "stale": stale}
+        self._write_upload_record(record)
+        return record
+
+    def dataset_file_id(self) -> str:
+        """
+        Id of the uploaded copy of the current dataset, uploading only when the
+        dataset version (or account) changed. Superseded ids are deleted.
+        """
+        version, account = self.dataset_version, self._account_key()
+        with self._upload_lock:
+            cached = self._cached_file_id(version, account)
+            if cached:
+                return cached
+
+            with self._open_dataset_for_upload() as fh, self.metrics.span("upload") as s:
+                s.bytes = _file_size(fh)
+                up = self.client.files.create(file=("investment_data.json", fh), purpose="assistants")
+
+            record = self._record_upload(version, account, up.id)
+            self._delete_stale_uploads(record)
+            return up.id
+
+    def _delete_stale_uploads(self, record: Dict[str, Any]) -> None:
+        remaining = []
+        for fid in record.get("stale") or []:
+            try:
+                self.client.files.delete(fid)
+            except Exception as e:
+                # already gone counts as cleaned up; keep anything else for the next upload
+                if type(e).__name__ != "NotFoundError":
+                    remaining.append(fid)
+        if remaining != record.get("stale"):
+            record["stale"] = remaining
+            self._write_upload_record(record)
+
+    def forget_dataset_upload(self, file_id: str) -> None:
+        """Drop a cached file id that the API no longer knows about."""
+        with self._upload_lock:
+            record = self._read_upload_record()
+            if record.get("file_id") == file_id:
+                record.pop("file_id")
+                self._write_upload_record(record)
+
+    # ----- Python-code tool -----
+    def run_python_query_on_json(self, query: str) -> str:
+        """
+        Delegate execution to OpenAI's code interpreter using the Responses API.
+        Attaches the uploaded copy of the dataset (see `dataset_file_id`).
+        """
+        try:
+            return self._python_query(query)
+        except Exception as e:
+            return f"[Error running Python query]: {e}"
+
+    def _python_query(self, query: str) -> str:
+        file_id = self.dataset_file_id()
+        try:
+            return self._run_code_interpreter(query, file_id)
+        except Exception as e:
+            if type(e).__name__ != "NotFoundError":
+                raise
+            # cached file expired or was deleted upstream: upload again once
+            self.forget_dataset_upload(file_id)
+            return self._run_code_interpreter(query, self.dataset_file_id())
+
+    @staticmethod
+    def _code_interpreter_request(query: str, file_id: str) -> Dict[str, Any]:
+        # Compose input
+        prompt = f"""
+Use Python for this task.
+The User query is: {query}
+
+You have to use the uploaded JSON file to answer the query.
+The structure of the JSON file is as follows:
+{json_structure}
+Also show what code you wrote to get the answer.
+    """
+        return {
+            "model": "o3",
+            "input": prompt,
+            "tools": [{
+                "type": "code_interpreter",
+                "container": {"type": "auto", "file_ids": [file_id]}
+            }]
+        }
+
+    def _run_code_interpreter(self, query: str, file_id: str) -> str:
+        # Call OpenAI Code Interpreter
+        with self.metrics.span("code_interpreter") as s:
+            resp = self.client.responses.create(**self._code_interpreter_request(query, file_id))
+            s.usage(getattr(resp, "usage", None))
+        return str(resp.output_text) if getattr(resp, "output_text", None) else "[Code interpreter returned no output]"
+
+    # ----- local code backend -----
+    @property
+    def tools(self) -> List[Dict[str, Any]]:
+        return tools_for(self.code_backend)
+
+    @property
+    def system_prompt(self) -> str:
+        return system_prompt_for(self.code_backend)
+
+    @property
+    def sandbox(self) -> SandboxPool:
+        """Warm sandbox workers holding the current dataset's frames (replaced on reload)."""
+        return self._derived(self.dataset, "sandbox")
+
+    def _start_sandbox(self, ds: Dataset) -> SandboxPool:
+        with self.metrics.span("sandbox_start") as s:
+            folder = self.sandbox_dir / ds.version
+            if not (folder / "frames.json").exists():
+                write_sandbox_frames(sandbox_frames(ds.store), folder)
+            pool = SandboxPool(folder)
+            s.attrs["workers"] = SANDBOX_WORKERS
+            return pool
+
+    def run_pandas_code(self, code: str) -> str:
+        """Run model-written pandas code on a warm local worker; returns its output or an error line."""
+        try:
+            with self.metrics.span("sandbox") as s:
+                result = self.sandbox.run(code)
+                s.attrs.update(cpu_ms=result.get("cpu_ms"), failed=bool(result.get("error")))
+            return format_sandbox_result(result)
+        except Exception as e:
+            return f"[Error running pandas code]: {e}"
+
+    # ----- tools -----
+    def _run_tool(self, fn_name: str, args: Dict[str, Any]) -> str:
+        """
+        Execute one tool call (as a `tool.<name>` span) and return the content for
+        its tool message. Identical calls already running elsewhere are joined
+        rather than repeated.
+        """
+        with self.metrics.span(f"tool.{fn_name}") as s:
+            key = flight_key(fn_name, args, self.dataset_version)
+            content, s.attrs["coalesced"] = self.flights.do(key, lambda: self._tool_content(fn_name, args))
+            s.bytes = len(content.encode("utf-8"))
+            return content
+
+    def _tool_content(self, fn_name: str, args: Dict[str, Any]) -> str:
+        if fn_name == "get_data_from_name":
+            return json.dumps(self.company_view(args["company_name"], args.get("detail") or "digest"), ensure_ascii=False)
+
+        if fn_name == "run_python_query_on_json":
+            result = self._python_query(args["query"])  # errors propagate so waiters see them too
+            return str(result) if result else "[No output]"
+
+        if fn_name == "query_kpis":
+            return json.dumps(self.query_kpis(**args))
+
+        if fn_name == "search_update_narratives":
+            return json.dumps(self.search_update_narratives(**args), ensure_ascii=False)
+
+        if fn_name == "run_pandas_code":
+            return self.run_pandas_code(args["code"])
+
+        return f"[Unknown tool: {fn_name}]"
+
+    @property
+    def tool_pool(self):
+        def build():
+            from concurrent.futures import ThreadPoolExecutor
+            return ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="vic-tool")
+        return self._lazy("tool_pool", build)
+
+    def _retire_tool_pool(self, pool, fut) -> None:
+        """
+        `fut` on `pool` timed out. Its thread can't be stopped, so `pool` is left
+        to the stalled work (it shuts down once unreferenced and idle) and new
+        calls get a fresh pool, up to TOOL_MAX_STALLED stalled calls in total.
+        """
+        def settled(f):
+            with self._lock:
+                self._stalled.discard(f)
+
+        with self._lock:
+            self._stalled.add(fut)
+            retire = self._cache.get("tool_pool") is pool and len(self._stalled) <= TOOL_MAX_STALLED
+            if retire:
+                self._cache.pop("tool_pool")
+        fut.add_done_callback(settled)
+        if retire:
+            logger.warning("tool call stalled past its timeout; moved new tool calls to a fresh pool (%s stalled)",
+                           len(self._stalled))
+
+    def _run_tool_calls(self, tcs) -> Generator[Dict[str, str], None, List[str]]:
+        """
+        Run every tool call of one model turn concurrently. Yields status events
+        and returns the tool message contents in the original `tool_calls` order.
+        A failing or timed-out tool only affects its own result.
+
+        A timeout does not stop the call: Python threads can't be interrupted,
+        so the call keeps its worker thread until it returns and its result is
+        discarded. So that such calls can't use up the pool, the pool they run
+        on is retired (see `_retire_tool_pool`) and later calls start on a new one.
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        contents: List[Optional[str]] = [None] * len(tcs)
+        pending: Dict[Any, tuple] = {}  # future → (position, tool name, arguments, deadline)
+        pool = self.tool_pool
+
+        def submit(fn_name: str, args: Dict[str, Any]):
+            # copy the context so the tool's spans carry this request's id
+            return pool.submit(contextvars.copy_context().run, self._run_tool, fn_name, args)
+
+        start = time.monotonic()
+        for i, tc in enumerate(tcs):
+            fn_name = tc.function.name
+            try:
+                args = json.loads(tc.function.arguments or "{}")
+            except ValueError as e:
+                contents[i] = f"[Invalid arguments for {fn_name}]: {e}"
+                continue
+            yield {"type": "status", "text": _tool_status(fn_name, args)}
+            pending[submit(fn_name, args)] = (i, fn_name, args, start + TOOL_TIMEOUTS_S.get(fn_name, TOOL_TIMEOUT_S))
+
+        while pending:
+            now = time.monotonic()
+            done, _ = wait(list(pending), timeout=max(0.0, min(p[3] for p in pending.values()) - now),
+                           return_when=FIRST_COMPLETED)
+            for fut in done:
+                i, fn_name, _, _ = pending.pop(fut)
+                try:
+                    contents[i] = fut.result()
+                except Exception as e:
+                    contents[i] = f"[Error running {fn_name}]: {e}"
+            now = time.monotonic()
+            for fut, (i, fn_name, _, deadline) in list(pending.items()):
+                if now >= deadline:
+                    del pending[fut]
+                    contents[i] = f"[{fn_name} timed out after {deadline - start:.1f}s]"
+                    if not fut.cancel():  # already running: it keeps its thread
+                        self._retire_tool_pool(pool, fut)
+            if pending and self.tool_pool is not pool:
+                # calls still queued on the retired pool move to the new one
+                pool = self.tool_pool
+                for fut, entry in list(pending.items()):
+                    if fut.cancel():
+                        del pending[fut]
+                        pending[submit(entry[1], entry[2])] = entry
+        return [c if c is not None else "[No output]" for c in contents]
+
+    # ----- instrumentation -----
+    def serve_metrics(self, port: int = METRICS_PORT):
+        """Start (once) the Prometheus `/metrics` endpoint for this engine; no-op when port is 0."""
+        with self._lock:
+            if self._metrics_server is None and port:
+                self._metrics_server = serve_metrics(self.metrics, port)
+        return self._metrics_server
+
+    @contextmanager
+    def _request_scope(self):
+        """One `request` span; spans opened inside it share its request id."""
+        token = _request_id.set(os.urandom(6).hex())
+        try:
+            with self.metrics.span("request"):
+                yield
+        finally:
+            try:
+                _request_id.reset(token)
+            except ValueError:
+                pass  # generator finalised from another context
+
+    # ----- main entry -----
+    def unified_answer_stream(self, user_input: str, session_id: str = DEFAULT_SESSION) -> Iterator[Dict[str, str]]:
+        """
+        Streaming version of `unified_answer`. Yields events
+        {"type": "status", "text": ...} while routing and running tools, then
+        {"type": "token", "text": ...} deltas of the final answer. The complete
+        answer is written to memory once the stream is exhausted.
+        """
+        with self._request_scope():
+            yield from self._answer_events(user_input, session_id)
+
+    def _answer_events(self, user_input: str, session_id: str) -> Iterator[Dict[str, str]]:
+        # Repeated self-contained questions are answered from the cache
+        with self.metrics.span("answer_cache") as s:
+            slot = self._answer_cache_slot(user_input)
+            cached = self.answer_cache.get(*slot) if slot else None
+            s.attrs["hit"] = cached is not None
+        if cached is not None:
+            yield {"type": "status", "text": "Answered from cache"}
+            self._append_memory(user_input, cached, session_id)
+            yield {"type": "token", "text": cached}
+            return
+
+        # The same question is being answered for someone else right now: share that answer
+        if slot is None:
+            yield from self._fresh_answer_events(user_input, session_id, slot)
+            return
+        key = ("answer", slot[0])
+        flight, leader = self.flights.join(key)
+        if not leader:
+            yield {"type": "status", "text": "Waiting for the same question asked moments ago…"}
+            with self.metrics.span("answer_flight") as s:
+                try:
+                    shared = flight.result(timeout=ANSWER_FLIGHT_TIMEOUT_S)
+                except Exception:
+                    shared = None  # the other request failed or is stuck; answer this one on its own
+                s.attrs["shared"] = bool(shared)
+            if shared:
+                self._append_memory(user_input, shared, session_id)
+                yield {"type": "token", "text": shared}
+            else:
+                yield from self._fresh_answer_events(user_input, session_id, slot)
+            return
+        parts: List[str] = []
+        try:
+            for event in self._fresh_answer_events(user_input, session_id, slot):
+                if event["type"] == "token":
+                    parts.append(event["text"])
+                yield event
+        except BaseException as e:
+            self.flights.settle(key, flight, error=e)
+            raise
+        self.flights.settle(key, flight, "".join(parts))
+
+    def _fresh_answer_events(self, user_input: str, session_id: str, slot: Optional[tuple]) -> Iterator[Dict[str, str]]:
+        # Include prior turns from this session's memory (budgeted, older ones summarised)
+        with self.metrics.span("memory"):
+            prior = self.context.history(self._load_memory(session_id), session_id)
+
+        # Clear-cut questions are routed locally; otherwise an LLM call decides which tool to use
+        yield {"type": "status", "text": "Reading the question…"}
+        local = self._local_route(user_input)
+        if local is not None:
+            msg1, tcs = local
+        else:
+            route_msgs = [{"role": "system", "content": self.system_prompt}] + prior + [
+                {"role": "user", "content": user_input}
+            ]
+            with self.metrics.span("route") as s:
+                resp1 = self.client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=route_msgs,
+                    tools=self.tools,
+                    tool_choice="auto",
+                    temperature=0
+                )
+                s.usage(getattr(resp1, "usage", None))
+                s.bytes = _payload_bytes(route_msgs)
+            msg1 = resp1.choices[0].message
+            tcs = msg1.tool_calls or []
+
+        if not tcs:
+            fallback = msg1.content or FALLBACK_REPLY
+            self._append_memory(user_input, fallback, session_id)
+            yield {"type": "token", "text": fallback}
+            return
+
+        # Build message list for second call (include memory)
+        msgs: List[Dict[str, str]] = [{"role": "system", "content": self.system_prompt}] + prior + [
+            {"role": "user", "content": user_input},
+            msg1  # tool call decision message
+        ]
+
+        # Execute tools (concurrently) and add their outputs in call order
+        contents = self.context.fit_tool_outputs(msgs, (yield from self._run_tool_calls(tcs)))
+        for tc, content in zip(tcs, contents):
+            msgs.append({
+                "role": "tool",
+                "tool_call_id": tc.id,
+                "name": tc.function.name,
+                "content": content
+            })
+
+        # Final response with tool outputs injected, streamed token by token
+        yield {"type": "status", "text": "Writing the answer…"}
+        parts: List[str] = []
+        with self.metrics.span("final") as s:
+            s.bytes = _payload_bytes(msgs)
+            stream = self.client.chat.completions.create(
+                model="gpt-4o",
+                messages=msgs,
+                tools=self.tools,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in stream:
+                s.usage(getattr(chunk, "usage", None))
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        s.attrs["first_token_ms"] = round(1000 * (time.perf_counter() - s.start), 1)
+                    parts.append(delta)
+                    yield {"type": "token", "text": delta}
+
+        final_text = "".join(parts)
+        self._append_memory(user_input, final_text, session_id)
+        if slot and final_text and not any(_is_tool_error(c) for c in contents):
+            self.answer_cache.put(slot[0], final_text, slot[1], slot[2])
+
+    def unified_answer(self, user_input: str, session_id: str = DEFAULT_SESSION):
+        return "".join(ev["text"] for ev in self.unified_answer_stream(user_input, session_id) if ev["type"] == "token")
+
+    # ----- async request path -----
+    def _async_resources(self) -> _AsyncResources:
+        loop = asyncio.get_running_loop()
+        res = self._async_by_loop.get(loop)
+        if res is None:
+            client = self._async_client
+            if client is None:
+                import httpx
+                from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+                client = AsyncOpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    max_retries=0,  # retries/backoff are handled by _acall
+                    http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                        max_connections=ASYNC_MAX_CONNECTIONS,
+                        max_keepalive_connections=ASYNC_MAX_CONNECTIONS,
+                    )),
+                )
+            res = self._async_by_loop[loop] = _AsyncResources(client)
+        return res
+
+    async def _acall(self, fn: Callable, *args, **kwargs):
+        """Await an API call under the loop's concurrency limit, retrying transient errors."""
+        res = self._async_resources()
+        for attempt in range(RETRY_ATTEMPTS):
+            try:
+                async with res.limit:
+                    return await fn(*args, **kwargs)
+            except Exception as e:
+                if not _is_transient(e) or attempt == RETRY_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep(_retry_delay(e, attempt))
+
+    @asynccontextmanager
+    async def _astream(self, fn: Callable, *args, **kwargs) -> AsyncIterator[Any]:
+        """
+        `_acall` for a streamed response: the concurrency slot is held until the
+        `async with` body has consumed (or abandoned) the stream, which is then closed.
+        """
+        res = self._async_resources()
+        for attempt in range(RETRY_ATTEMPTS):
+            await res.limit.acquire()
+            try:
+                stream = await fn(*args, **kwargs)
+                break
+            except BaseException as e:
+                res.limit.release()
+                if not isinstance(e, Exception) or not _is_transient(e) or attempt == RETRY_ATTEMPTS - 1:
+                    raise
+                delay = _retry_delay(e, attempt)
+            await asyncio.sleep(delay)
+        try:
+            yield stream
+        finally:
+            try:
+                close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+                if close is not None:
+                    closing = close()
+                    if asyncio.iscoroutine(closing):
+                        await closing
+            finally:
+                res.limit.release()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        emb = self.embeddings
+        model_id = _embedding_model_id(emb)
+        cache = self.query_embedding_cache
+        cached = cache.get(model_id, text)
+        if cached is not None:
+            return cached
+        key_text = cache.key(model_id, text)[1]
+        if type(emb).__name__ == "OpenAIEmbeddings":
+            # use the pooled async client instead of LangChain's own
+            client = self._async_resources().client
+            kwargs = {"dimensions": emb.dimensions} if getattr(emb, "dimensions", None) else {}
+            with self.metrics.span("embed") as s:
+                s.bytes = len(key_text.encode("utf-8"))
+                resp = await self._acall(client.embeddings.create, model=emb.model, input=key_text, **kwargs)
+                s.usage(getattr(resp, "usage", None))
+            vector = list(resp.data[0].embedding)
+        else:
+            with self.metrics.span("embed") as s:
+                s.bytes = len(key_text.encode("utf-8"))
+                vector = list(await emb.aembed_query(key_text))
+        cache.put(model_id, text, vector)
+        return vector
+
+    async def aresolve_company(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
+        # the first call builds the resolver: keep that (and rapidfuzz) off the loop
+        matches = await asyncio.to_thread(lambda: self.resolver.resolve(query, limit=limit))
+        if matches:
+            return matches
+        vector = await self.aembed_query(query)
+        return await asyncio.to_thread(self._vector_matches, vector, limit)
+
+    async def asearch_update_narratives(self, query: str, **filters) -> Dict[str, Any]:
+        try:
+            vector = await self.aembed_query(query)
+            return await asyncio.to_thread(self._narrative_search, vector, query, **filters)
+        except Exception as e:
+            return {"error": f"Narrative search failed: {e}"}
+
+    async def adataset_file_id(self) -> str:
+        res = self._async_resources()
+        version, account = self.dataset_version, self._account_key(res.client)
+        async with res.upload_lock:
+            cached = self._cached_file_id(version, account)
+            if cached:
+                return cached
+            with self._open_dataset_for_upload() as fh, self.metrics.span("upload") as s:
+                s.bytes = _file_size(fh)
+                up = await self._acall(res.client.files.create, file=("investment_data.json", fh), purpose="assistants")
+            record = self._record_upload(version, account, up.id)
+            remaining = []
+            for fid in record["stale"]:
+                try:
+                    await self._acall(res.client.files.delete, fid)
+                except Exception as e:
+                    if type(e).__name__ != "NotFoundError":
+                        remaining.append(fid)
+            if remaining != record["stale"]:
+                record["stale"] = remaining
+                self._write_upload_record(record)
+            return up.id
+
+    async def arun_python_query_on_json(self, query: str) -> str:
+        try:
+            return await self._apython_query(query)
+        except Exception as e:
+            return f"[Error running Python query]: {e}"
+
+    async def _apython_query(self, query: str) -> str:
+        res = self._async_resources()
+        file_id = await self.adataset_file_id()
+        try:
+            resp = await self._arun_code_interpreter(res, query, file_id)
+        except Exception as e:
+            if type(e).__name__ != "NotFoundError":
+                raise
+            self.forget_dataset_upload(file_id)
+            file_id = await self.adataset_file_id()
+            resp = await self._arun_code_interpreter(res, query, file_id)
+        return str(resp.output_text) if getattr(resp, "output_text", None) else "[Code interpreter returned no output]"
+
+    async def _arun_code_interpreter(self, res: _AsyncResources, query: str, file_id: str):
+        with self.metrics.span("code_interpreter") as s:
+            resp = await self._acall(res.client.responses.create, **self._code_interpreter_request(query, file_id))
+            s.usage(getattr(resp, "usage", None))
+        return resp
+
+    async def _arun_tool(self, fn_name: str, args: Dict[str, Any]) -> str:
+        with self.metrics.span(f"tool.{fn_name}") as s:
+            key = flight_key(fn_name, args, self.dataset_version)
+            content, s.attrs["coalesced"] = await self.flights.ado(key, lambda: self._atool_content(fn_name, args))
+            s.bytes = len(content.encode("utf-8"))
+            return content
+
+    async def _atool_content(self, fn_name: str, args: Dict[str, Any]) -> str:
+        if fn_name == "get_data_from_name":
+            matches = await self.aresolve_company(args["company_name"])
+            # digests / deal decoding are built on first use: run them off the loop
+            view = await asyncio.to_thread(self.company_view, args["company_name"], args.get("detail") or "digest", matches)
+            return json.dumps(view, ensure_ascii=False)
+        if fn_name == "run_python_query_on_json":
+            result = await self._apython_query(args["query"])
+            return str(result) if result else "[No output]"
+        if fn_name == "search_update_narratives":
+            return json.dumps(await self.asearch_update_narratives(**args), ensure_ascii=False)
+        # everything else is local CPU work
+        return await asyncio.to_thread(self._tool_content, fn_name, args)
+
+    async def _arun_tool_calls(self, tcs) -> List[str]:
+        """Async counterpart of `_run_tool_calls`: concurrent, ordered, isolated, per-tool timeouts."""
+        async def one(tc) -> str:
+            fn_name = tc.function.name
+            try:
+                args = json.loads(tc.function.arguments or "{}")
+            except ValueError as e:
+                return f"[Invalid arguments for {fn_name}]: {e}"
+            timeout = TOOL_TIMEOUTS_S.get(fn_name, TOOL_TIMEOUT_S)
+            try:
+                return await asyncio.wait_for(self._arun_tool(fn_name, args), timeout)
+            except asyncio.TimeoutError:
+                return f"[{fn_name} timed out after {timeout:.1f}s]"
+            except Exception as e:
+                return f"[Error running {fn_name}]: {e}"
+
+        return list(await asyncio.gather(*(one(tc) for tc in tcs)))
+
+    async def aunified_answer_stream(self, user_input: str, session_id: str = DEFAULT_SESSION) -> AsyncIterator[Dict[str, str]]:
+        """Async version of `unified_answer_stream` on the pooled AsyncOpenAI client."""
+        with self._request_scope():
+            async for event in self._aanswer_events(user_input, session_id):
+                yield event
+
+    async def _aanswer_events(self, user_input: str, session_id: str) -> AsyncIterator[Dict[str, str]]:
+        with self.metrics.span("answer_cache") as s:
+            slot = await asyncio.to_thread(self._answer_cache_slot, user_input)
+            cached = await asyncio.to_thread(self.answer_cache.get, *slot) if slot else None
+            s.attrs["hit"] = cached is not None
+        if cached is not None:
+            yield {"type": "status", "text": "Answered from cache"}
+            await asyncio.to_thread(self._append_memory, user_input, cached, session_id)
+            yield {"type": "token", "text": cached}
+            return
+
+        if slot is None:
+            async for event in self._afresh_answer_events(user_input, session_id, slot):
+                yield event
+            return
+        key = ("answer", slot[0])
+        flight, leader = self.flights.join(key)
+        if not leader:
+            yield {"type": "status", "text": "Waiting for the same question asked moments ago…"}
+            with self.metrics.span("answer_flight") as s:
+                try:
+                    shared = await asyncio.wait_for(asyncio.wrap_future(flight), ANSWER_FLIGHT_TIMEOUT_S)
+                except Exception:
+                    shared = None
+                s.attrs["shared"] = bool(shared)
+            if shared:
+                await asyncio.to_thread(self._append_memory, user_input, shared, session_id)
+                yield {"type": "token", "text": shared}
+            else:
+                async for event in self._afresh_answer_events(user_input, session_id, slot):
+                    yield event
+            return
+        parts: List[str] = []
+        try:
+            async for event in self._afresh_answer_events(user_input, session_id, slot):
+                if event["type"] == "token":
+                    parts.append(event["text"])
+                yield event
+        except BaseException as e:
+            self.flights.settle(key, flight, error=e)
+            raise
+        self.flights.settle(key, flight, "".join(parts))
+
+    async def _afresh_answer_events(self, user_input: str, session_id: str,
+                                    slot: Optional[tuple]) -> AsyncIterator[Dict[str, str]]:
+        client = self._async_resources().client
+        with self.metrics.span("memory"):
+            # a cold session reads its file: off the loop; the summary, if due, is a task on it
+            prior = await self.context.ahistory(await asyncio.to_thread(self._load_memory, session_id), session_id)
+
+        yield {"type": "status", "text": "Reading the question…"}
+        local = await asyncio.to_thread(self._local_route, user_input)
+        if local is not None:
+            msg1, tcs = local
+        else:
+            route_msgs = [{"role": "system", "content": self.system_prompt}] + prior + [
+                {"role": "user", "content": user_input}
+            ]
+            with self.metrics.span("route") as s:
+                resp1 = await self._acall(
+                    client.chat.completions.create,
+                    model="gpt-4o",
+                    messages=route_msgs,
+                    tools=self.tools,
+                    tool_choice="auto",
+                    temperature=0
+                )
+                s.usage(getattr(resp1, "usage", None))
+                s.bytes = _payload_bytes(route_msgs)
+            msg1 = resp1.choices[0].message
+            tcs = msg1.tool_calls or []
+
+        if not tcs:
+            fallback = msg1.content or FALLBACK_REPLY
+            await asyncio.to_thread(self._append_memory, user_input, fallback, session_id)
+            yield {"type": "token", "text": fallback}
+            return
+
+        msgs: List[Dict[str, str]] = [{"role": "system", "content": self.system_prompt}] + prior + [
+            {"role": "user", "content": user_input},
+            msg1
+        ]
+
+        for tc in tcs:
+            try:
+                yield {"type": "status", "text": _tool_status(tc.function.name, json.loads(tc.function.arguments or "{}"))}
+            except ValueError:
+                pass
+        contents = self.context.fit_tool_outputs(msgs, await self._arun_tool_calls(tcs))
+        for tc, content in zip(tcs, contents):
+            msgs.append({
+                "role": "tool",
+                "tool_call_id": tc.id,
+                "name": tc.function.name,
+                "content": content
+            })
+
+        yield {"type": "status", "text": "Writing the answer…"}
+        parts: List[str] = []
+        with self.metrics.span("final") as s:
+            s.bytes = _payload_bytes(msgs)
+            async with self._astream(
+                client.chat.completions.create,
+                model="gpt-4o",
+                messages=msgs,
+                tools=self.tools,
+                stream=True,
+                stream_options={"include_usage": True}
+            ) as stream:
+                async for chunk in stream:
+                    s.usage(getattr(chunk, "usage", None))
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if not parts:
+                            s.attrs["first_token_ms"] = round(1000 * (time.perf_counter() - s.start), 1)
+                        parts.append(delta)
+                        yield {"type": "token", "text": delta}
+
+        final_text = "".join(parts)
+        await asyncio.to_thread(self._append_memory, user_input, final_text, session_id)
+        if slot and final_text and not any(_is_tool_error(c) for c in contents):
+            await asyncio.to_thread(self.answer_cache.put, slot[0], final_text, slot[1], slot[2])
+
+    async def aunified_answer(self, user_input: str, session_id: str = DEFAULT_SESSION) -> str:
+        parts = [ev["text"] async for ev in self.aunified_answer_stream(user_input, session_id) if ev["type"] == "token"]
+        return "".join(parts)
+
+
+# =========================
+# Process-wide engine + module-level API
+# =========================
+_engine: Optional[VicEngine] = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> VicEngine:
+    """Return the shared engine for this process (created on first call, nothing loaded yet)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = VicEngine()
+    return _engine
+
+def search_company(query, k=1):
+    return get_engine().search_company(query, k=k)
+
+def get_data_from_id(cid):
+    return get_engine().get_data_from_id(cid)
+
+def get_data_from_name(company_name):
+    return get_engine().get_data_from_name(company_name)
+
+def _load_memory(session_id: str = DEFAULT_SESSION) -> List[Dict[str, str]]:
+    return get_engine()._load_memory(session_id)
+
+def _append_memory(user_text: str, assistant_text: str, session_id: str = DEFAULT_SESSION) -> None:
+    get_engine()._append_memory(user_text, assistant_text, session_id)
+
+def run_python_query_on_json(query: str) -> str:
+    return get_engine().run_python_query_on_json(query)
+
+def unified_answer(user_input: str, session_id: str = DEFAULT_SESSION):
+    return get_engine().unified_answer(user_input, session_id)
+
+def unified_answer_stream(user_input: str, session_id: str = DEFAULT_SESSION) -> Iterator[Dict[str, str]]:
+    return get_engine().unified_answer_stream(user_input, session_id)
+
+async def aunified_answer(user_input: str, session_id: str = DEFAULT_SESSION) -> str:
+    return await get_engine().aunified_answer(user_input, session_id)
+
+# Old module attributes (`vic.data`, `vic.client`, ...) resolve through the shared engine on access.
+_LEGACY_ATTRS = {
+    "data": "data",
+    "client": "client",
+    "embedding": "embeddings",
+    "embedding_model": "embeddings",
+    "company_id_map": "company_id_map",
+    "company_vs": "company_vs",
+}
+
+def __getattr__(name):
+    if name in _LEGACY_ATTRS:
+        return getattr(get_engine(), _LEGACY_ATTRS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# =========================
+# Batch runner (python -m vic batch questions.txt)
+# =========================
+BATCH_CONCURRENCY = int(os.getenv("VIC_BATCH_CONCURRENCY", "8"))
+BATCH_RATE_PER_MIN = float(os.getenv("VIC_BATCH_RATE_PER_MIN", "60"))  # question starts per minute; 0 = unlimited
+BATCH_TIMEOUT_S = float(os.getenv("VIC_BATCH_TIMEOUT_S", "300"))
+
+def read_questions(path: Path) -> List[str]:
+    """One question per line; blank lines and `#` comments are skipped."""
+    lines = Path(path).read_text(encoding="utf-8").splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+
+def _batch_done(out_path: Path) -> Dict[str, Dict[str, Any]]:
+    """Successful results already in the checkpoint file, by question key (a torn last line is ignored)."""
+    done: Dict[str, Dict[str, Any]] = {}
+    try:
+        with open(out_path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("status") == "ok":
+                    done[rec["key"]] = rec
+    except FileNotFoundError:
+        pass
+    return done
+
+class _RateLimiter:
+    """Spaces `acquire` calls at least 60 / per_minute seconds apart (no limit when per_minute <= 0)."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+async def run_batch(
+    questions: List[str],
+    out_path: Path,
+    engine: Optional[VicEngine] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+    rate_per_min: float = BATCH_RATE_PER_MIN,
+    timeout_s: float = BATCH_TIMEOUT_S,
+    progress: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Answer `questions` through `aunified_answer` with at most `concurrency` in
+    flight and starts spaced by `rate_per_min`. Identical questions (after
+    normalisation) are answered once. Each result is appended to the JSONL
+    checkpoint `out_path` as it completes, and a rerun skips the questions that
+    already succeeded there. Every question gets a throwaway memory session, so
+    answers do not depend on what else is in the batch. Returns a summary with
+    latency percentiles.
+    """
+    engine = engine or get_engine()
+    out_path = Path(out_path)
+    keys = [normalize_question(q) for q in questions]
+    unique: Dict[str, str] = {}
+    for key, q in zip(keys, questions):
+        unique.setdefault(key, q)
+    done = _batch_done(out_path)
+    todo = [(key, q) for key, q in unique.items() if key not in done]
+    limiter = _RateLimiter(rate_per_min)
+    gate = asyncio.Semaphore(max(1, concurrency))
+    latencies: List[float] = []
+    errors = 0
+    finished = 0
+    started = time.perf_counter()
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(out_path, "a", encoding="utf-8") as out:
+        if out.tell() and not out_path.read_bytes().endswith(b"\n"):
+            out.write("\n")  # previous run died mid-line; keep the torn record on its own line
+        async def one(key: str, question: str) -> None:
+            nonlocal errors, finished
+            async with gate:
+                await limiter.acquire()
+                session = f"batch-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+                t0 = time.perf_counter()
+                rec: Dict[str, Any] = {"key": key, "question": question}
+                try:
+                    answer = await asyncio.wait_for(engine.aunified_answer(question, session), timeout_s or None)
+                    rec.update(status="ok", answer=answer)
+                except asyncio.TimeoutError:
+                    rec.update(status="error", error=f"timed out after {timeout_s:g}s")
+                except Exception as e:
+                    rec.update(status="error", error=f"{type(e).__name__}: {e}")
+                finally:
+                    await asyncio.to_thread(engine.memory.clear, session)
+                elapsed = time.perf_counter() - t0
+                rec["latency_ms"] = round(elapsed * 1000, 1)
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                out.flush()
+                finished += 1
+                if rec["status"] == "ok":
+                    latencies.append(elapsed * 1000)
+                else:
+                    errors += 1
+                if progress:
+                    progress(f"[{finished}/{len(todo)}] {rec['status']:5} {rec['latency_ms']:9.1f} ms  {question[:80]}")
+
+        await asyncio.gather(*(one(key, q) for key, q in todo))
+
+    latencies.sort()
+    return {
+        "questions": len(questions),
+        "unique": len(unique),
+        "resumed": len(unique) - len(todo),
+        "answered": len(todo) - errors,
+        "errors": errors,
+        "wall_s": round(time.perf_counter() - started, 2),
+        "p50_ms": round(Metrics._quantile(latencies, 0.50), 1) if latencies else None,
+        "p95_ms": round(Metrics._quantile(latencies, 0.95), 1) if latencies else None,
+        "out": str(out_path),
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m vic", description="Investment updates chat engine.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    batch = commands.add_parser("batch", help="answer a file of questions (one per line) concurrently")
+    batch.add_argument("questions", type=Path, help="text file, one question per line; '#' lines are comments")
+    batch.add_argument("--out", type=Path, help="JSONL checkpoint/results file (default: <questions>.answers.jsonl)")
+    batch.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="questions in flight")
+    batch.add_argument("--rate", type=float, default=BATCH_RATE_PER_MIN, help="question starts per minute (0 = unlimited)")
+    batch.add_argument("--timeout", type=float, default=BATCH_TIMEOUT_S, help="seconds per question (0 = none)")
+    batch.add_argument("--quiet", action="store_true", help="no per-question progress lines")
+    args = parser.parse_args(argv)
+
+    if args.command == "batch":
+        questions = read_questions(args.questions)
+        out_path = args.out or args.questions.with_suffix(".answers.jsonl")
+        log = None if args.quiet else (lambda line: print(line, file=sys.stderr, flush=True))
+        summary = asyncio.run(run_batch(questions, out_path, concurrency=args.concurrency,
+                                        rate_per_min=args.rate, timeout_s=args.timeout, progress=log))
+        print(json.dumps(summary, indent=2))
+        return 1 if summary["errors"] else 0
+    return 2
 
-print("all functions processed, waiting for UI")
+if __name__ == "__main__":
+    sys.exit(main())